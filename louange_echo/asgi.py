@@ -0,0 +1,21 @@
+"""
+ASGI config for louange_echo project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Under ASGI the live-state and control endpoints are served by the async views
+in lyrics/async_views.py, so idle screens do not hold a worker each.
+
+Run with an ASGI server, e.g.: uvicorn louange_echo.asgi:application
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'louange_echo.settings')
+os.environ.setdefault('ASYNC_LIVE_VIEWS', 'True')
+
+application = get_asgi_application()
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'lyrics.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,6 +65,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'louange_echo.wsgi.application'
+ASGI_APPLICATION = 'louange_echo.asgi.application'
+
+# Serve the live-state and control endpoints with the async views
+# (lyrics/async_views.py). Enabled automatically by louange_echo/asgi.py.
+ASYNC_LIVE_VIEWS = os.environ.get('ASYNC_LIVE_VIEWS', 'False') == 'True'
 
 
 # Database
@@ -73,6 +79,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file, not the shared in-memory database, so tests can write
+        # from several threads (SQLite then waits for the lock)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -128,6 +137,81 @@ CACHES = {
     }
 }
 
+# Live state snapshot (see lyrics/live.py): seconds between version checks
+# against the database, so changes made by other worker processes show up
+LIVE_STATE_SNAPSHOT_TTL = float(os.environ.get('LIVE_STATE_SNAPSHOT_TTL', '0.5'))
+
+# Server-Sent Events stream (/api/state/stream/): seconds between heartbeat
+# comments, and maximum stream duration before the browser reconnects
+LIVE_STATE_STREAM_HEARTBEAT = 15
+LIVE_STATE_STREAM_MAX_AGE = 300
+
+# Long-poll (/api/state/?since=<version>): seconds to wait before an empty 204
+LIVE_STATE_LONG_POLL_TIMEOUT = 25
+
+# Under WSGI each waiting long-poll or stream holds a worker thread: the sync
+# views hold one request for at most this many seconds
+LIVE_STATE_SYNC_MAX_HOLD = 10
+
+# How the projector screen follows the live state: 'sse', 'long-poll' or 'poll'
+# (every 800ms, answered with 304s); 'auto' uses SSE under ASGI, polling under WSGI
+LIVE_SCREEN_TRANSPORT = os.environ.get('LIVE_SCREEN_TRANSPORT', 'auto')
+
+# Seconds an operator command idempotency key is remembered (/control/commands/)
+CONTROL_COMMAND_KEY_TTL = 86400
+
+# Choir images manifest (see lyrics/images.py): seconds between checks of the
+# images folder for added or removed files
+IMAGE_MANIFEST_CHECK_INTERVAL = 5
+
+# Widths (px) of the resized image variants (build_image_variants)
+IMAGE_VARIANT_WIDTHS = [320, 640, 960, 1280, 1920]
+
+# Program download (/programme/download/): let the front proxy send the file
+# with 'x-sendfile' (Apache, lighttpd) or 'x-accel-redirect' (nginx, serving
+# the images folder as an internal location at PROGRAM_DOWNLOAD_ACCEL_PREFIX);
+# empty to send it from Django
+PROGRAM_DOWNLOAD_SENDFILE = os.environ.get('PROGRAM_DOWNLOAD_SENDFILE', '')
+PROGRAM_DOWNLOAD_ACCEL_PREFIX = '/protected/images/'
+
+# Program OCR (extract_program_text, see lyrics/ocr.py): default backend
+# ('tesseract', or 'stub' to run without Tesseract) and tile size in px for
+# large posters (0: OCR each image whole)
+OCR_BACKEND = 'tesseract'
+OCR_TILE_SIZE = 0
+
+# Parsed on-disk JSON assets (see lyrics/filecache.py): seconds between checks
+# of a cached file's mtime and size
+FILE_CACHE_CHECK_INTERVAL = 2
+
+# Rendered public pages (see lyrics/pagecache.py): seconds they are kept in the
+# cache. Changes made in this process invalidate them at once, changes made by
+# other processes after PAGE_CACHE_CHECK_INTERVAL. 0 disables the page cache
+PAGE_CACHE_TIMEOUT = 300
+
+# Seconds between checks of the songs table by the page cache, so edits
+# made by other processes show up within this delay whatever the backend
+PAGE_CACHE_CHECK_INTERVAL = 2
+
+# Lyrics search without FTS5 (see lyrics/search.py): seconds between checks of
+# the songs table, so songs changed by other processes are found
+SEARCH_INDEX_CHECK_INTERVAL = 2
+
+# Control page typeahead (/api/songs/suggest/, see lyrics/suggest.py): seconds
+# between checks of the songs table for changes made by other processes
+SONG_SUGGEST_CHECK_INTERVAL = 2
+
+# Offline songbook bundle (/api/songs/bundle/, see lyrics/bundle.py): seconds
+# between checks of the songs table for changes, and folder where
+# import_lyrics and build_song_bundle store it with its encodings
+SONG_BUNDLE_CHECK_INTERVAL = 2
+SONG_BUNDLE_DIR = BASE_DIR / 'bundles'
+
+# Response compression (see lyrics/middleware.py): memory for compressed bodies
+# reused across requests, and brotli quality (with the brotli package)
+COMPRESSION_CACHE_BYTES = 16 * 1024 * 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
 # Development optimizations
 if DEBUG:
     # Disable some middleware for faster development
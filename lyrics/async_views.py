@@ -0,0 +1,106 @@
+"""
+Async versions of the live-state and control views, served under ASGI
+(see louange_echo/asgi.py).
+
+Waiting screens park on the asyncio hub (lyrics.hub) instead of holding a
+worker thread each, so one process can keep thousands of idle connections.
+Database work is delegated to the sync helpers in lyrics.live.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, HttpResponseNotAllowed, Http404
+from django.utils.cache import get_conditional_response
+
+from .hub import hub
+from .models import Song
+from . import live
+from .views import (
+    state_response, state_event, stream_response, last_event_version,
+    navigation_response,
+)
+
+
+def _exempt(view):
+    """Mark an async view as CSRF exempt (csrf_exempt is sync-only in Django 4.2)."""
+    view.csrf_exempt = True
+    return view
+
+
+async def api_state_view(request):
+    """
+    Async counterpart of views.api_state_view: ETag/304, plus long-poll
+    with ?since=<version> parked on the hub.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    since = request.GET.get('since')
+    if since is None:
+        snapshot = await hub.get_snapshot()
+        not_modified = get_conditional_response(request, etag=snapshot.etag)
+        if not_modified is not None:
+            return not_modified
+        return state_response(snapshot)
+
+    try:
+        since = int(since)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Paramètre since invalide'}, status=400)
+    timeout = getattr(settings, 'LIVE_STATE_LONG_POLL_TIMEOUT', 25)
+    return state_response(await hub.wait_for_change(since, timeout))
+
+
+async def _state_events(last_version):
+    heartbeat = getattr(settings, 'LIVE_STATE_STREAM_HEARTBEAT', 15)
+    max_age = getattr(settings, 'LIVE_STATE_STREAM_MAX_AGE', 300)
+    deadline = time.monotonic() + max_age
+
+    yield 'retry: 1000\n\n'
+    while time.monotonic() < deadline:
+        timeout = min(heartbeat, max(0, deadline - time.monotonic()))
+        snapshot = await hub.wait_for_change(last_version, timeout)
+        if snapshot is None:
+            yield ': heartbeat\n\n'
+            continue
+        last_version = snapshot.version
+        yield state_event(snapshot)
+
+
+async def api_state_stream_view(request):
+    """Async Server-Sent Events stream of the live state."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    return stream_response(_state_events(last_event_version(request)))
+
+
+@_exempt
+async def control_set_song_view(request, song_id):
+    """Set the active song and reset index to 0."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        song = await Song.objects.aget(pk=song_id)
+    except Song.DoesNotExist:
+        raise Http404("Chant non trouvé")
+    await sync_to_async(live.set_active_song)(song)
+    return JsonResponse({'success': True, 'message': f'Chant "{song.title}" mis en direct'})
+
+
+@_exempt
+async def control_next_view(request):
+    """Advance to the next line."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    live_state, moved = await sync_to_async(live.move)(1)
+    return navigation_response(live_state, moved, 'Déjà à la dernière ligne')
+
+
+@_exempt
+async def control_prev_view(request):
+    """Go back to the previous slide."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    live_state, moved = await sync_to_async(live.move)(-1)
+    return navigation_response(live_state, moved, 'Déjà à la première ligne')
@@ -0,0 +1,193 @@
+"""
+The whole songbook (every song with its lines) as one JSON document, for
+phones to download once and browse offline.
+
+The bundle is served at a URL carrying its content hash, so it can be
+cached forever, with its gzip and (when the brotli package is installed)
+brotli encodings. Compressing a large library at the best settings is
+slow, so it is done off the request path: import_lyrics and the
+build_song_bundle command write the bundle and its encodings to
+SONG_BUNDLE_DIR, and every process serves those files.
+
+A one-query stamp of the songs table (count, max id, last update) is
+compared with the stored bundle's at most every SONG_BUNDLE_CHECK_INTERVAL
+seconds. When songs changed since (e.g. edited in the admin), the JSON is
+rebuilt and served uncompressed at once while a background thread
+compresses and stores it.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import LyricLine, Song, compute_lyrics_version
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Default seconds between checks of the songs table
+DEFAULT_CHECK_INTERVAL = 2.0
+
+# File suffix of each stored encoding
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+
+class Bundle(NamedTuple):
+    """A built songbook bundle and its encodings."""
+    hash: str
+    stamp: str  # songs_stamp() the bundle was built from
+    body: bytes
+    encodings: dict  # Content-Encoding -> compressed body
+
+
+def bundle_dir():
+    return Path(getattr(settings, 'SONG_BUNDLE_DIR', Path(settings.BASE_DIR) / 'bundles'))
+
+
+def songs_stamp():
+    """Stamp of the songs table; changes whenever a song is added, saved or deleted."""
+    stamp = Song.objects.aggregate(count=Count('id'), max_id=Max('id'), updated=Max('updated_at'))
+    return f"{stamp['count']}:{stamp['max_id']}:{stamp['updated']}"
+
+
+def serialize_songs():
+    """Every song with its lines, in setlist order, as the bundle's JSON body."""
+    lines = {}
+    for song_id, text in LyricLine.objects.order_by('song_id', 'order').values_list('song_id', 'text'):
+        lines.setdefault(song_id, []).append(text)
+    songs = [
+        {
+            'id': song_id,
+            'title': title,
+            'slug': slug,
+            'order': order,
+            'version': compute_lyrics_version(content_hash, title, slug),
+            'lines': lines.get(song_id, []),
+        }
+        for song_id, title, slug, order, content_hash in Song.objects.values_list(
+            'id', 'title', 'slug', 'order', 'content_hash'
+        )
+    ]
+    return json.dumps({'songs': songs}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def compress(body):
+    """The body's gzip and brotli encodings, at their best (slowest) settings."""
+    encodings = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encodings['br'] = brotli.compress(body, quality=11)
+    return encodings
+
+
+def build_bundle():
+    """Serialize and compress the songbook (slow on large libraries)."""
+    # Read first: a change made while serializing makes the bundle look stale
+    stamp = songs_stamp()
+    body = serialize_songs()
+    return Bundle(hashlib.sha1(body).hexdigest()[:16], stamp, body, compress(body))
+
+
+def _write_atomic(path, data):
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}.', delete=False) as f:
+        f.write(data)
+    os.replace(f.name, path)
+
+
+def save_bundle(songbook, directory=None):
+    """Store the bundle and its encodings, then point current.json at them."""
+    directory = Path(directory or bundle_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f'songbook.{songbook.hash}.json'
+    _write_atomic(directory / name, songbook.body)
+    for encoding, body in songbook.encodings.items():
+        _write_atomic(directory / (name + ENCODING_SUFFIXES[encoding]), body)
+    _write_atomic(directory / 'current.json', json.dumps({
+        'hash': songbook.hash,
+        'stamp': songbook.stamp,
+        'encodings': sorted(songbook.encodings),
+    }).encode('utf-8'))
+    # Older bundles are never served again (their URLs redirect)
+    for path in directory.glob('songbook.*.json*'):
+        if not path.name.startswith(name):
+            path.unlink(missing_ok=True)
+
+
+def load_bundle():
+    """The stored bundle, or None if missing or unreadable."""
+    directory = bundle_dir()
+    try:
+        with open(directory / 'current.json', 'r', encoding='utf-8') as f:
+            current = json.load(f)
+        name = f"songbook.{current['hash']}.json"
+        body = (directory / name).read_bytes()
+        encodings = {
+            encoding: (directory / (name + ENCODING_SUFFIXES[encoding])).read_bytes()
+            for encoding in current['encodings']
+        }
+        return Bundle(current['hash'], current['stamp'], body, encodings)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+_lock = threading.Lock()
+_bundle = None
+_checked_at = 0.0
+
+
+def refresh():
+    """Build and store the bundle now (import_lyrics, build_song_bundle); return it."""
+    global _bundle, _checked_at
+    songbook = build_bundle()
+    save_bundle(songbook)
+    with _lock:
+        _bundle = songbook
+        _checked_at = time.monotonic()
+    return songbook
+
+
+def _compress_and_save(songbook, directory):
+    global _bundle
+    songbook = songbook._replace(encodings=compress(songbook.body))
+    save_bundle(songbook, directory)
+    with _lock:
+        if _bundle is not None and _bundle.hash == songbook.hash:
+            _bundle = songbook
+
+
+def _load_or_rebuild(stamp):
+    """The stored bundle if it is up to date, else a fresh uncompressed one."""
+    stored = load_bundle()
+    if stored is not None and stored.stamp == stamp:
+        return stored
+    body = serialize_songs()
+    songbook = Bundle(hashlib.sha1(body).hexdigest()[:16], stamp, body, {})
+    threading.Thread(
+        target=_compress_and_save, args=(songbook, bundle_dir()), name='songbook-bundle', daemon=True
+    ).start()
+    return songbook
+
+
+def get_bundle():
+    """The current bundle, reloaded or rebuilt when the songs changed."""
+    global _bundle, _checked_at
+    interval = getattr(settings, 'SONG_BUNDLE_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+    if _bundle is not None and time.monotonic() - _checked_at < interval:
+        return _bundle
+
+    with _lock:
+        if _bundle is None or time.monotonic() - _checked_at >= interval:
+            stamp = songs_stamp()
+            if _bundle is None or stamp != _bundle.stamp:
+                _bundle = _load_or_rebuild(stamp)
+            _checked_at = time.monotonic()
+        return _bundle
@@ -0,0 +1,114 @@
+"""
+In-memory cache of parsed on-disk files (JSON assets such as
+program_text.json).
+
+A FileCache keeps, for each path, the value its loader built from the
+file, keyed on the file's mtime and size: the file is only read again when
+one of them changes. The file is stat()ed at most every
+FILE_CACHE_CHECK_INTERVAL seconds, so a warm cache does no file I/O at all.
+Each cache counts its hits, misses and load errors; the counters of every
+cache are served by /api/cache/stats/ for monitoring.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Default seconds between stat() checks of a cached file
+DEFAULT_CHECK_INTERVAL = 2.0
+
+# Cache name -> FileCache, for stats()
+REGISTRY = {}
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileCache:
+    """
+    Values built by `loader` (called with the open file) from files, reloaded
+    when a file's mtime or size changes. Missing or unreadable files give
+    `default`.
+    """
+
+    def __init__(self, name, loader, default=None):
+        self.name = name
+        self.loader = loader
+        self.default = default
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> (stamp, value, checked_at)
+        REGISTRY[name] = self
+
+    def get(self, path):
+        """The loaded value of the file at `path`."""
+        interval = getattr(settings, 'FILE_CACHE_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and time.monotonic() - entry[2] < interval:
+                self.hits += 1
+                return entry[1]
+
+            stamp = _file_stamp(path)
+            if entry is not None and entry[0] == stamp:
+                self.hits += 1
+                value = entry[1]
+            else:
+                self.misses += 1
+                value = self._load(path, stamp)
+            self._entries[path] = (stamp, value, time.monotonic())
+            return value
+
+    def _load(self, path, stamp):
+        if stamp is None:
+            return self.default
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return self.loader(f)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            logger.warning('Could not load %s: %s', path, e)
+            return self.default
+
+    def invalidate(self, path=None):
+        """Forget one file (or all of them), to reload it on the next get()."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def stats(self):
+        """Hit/miss/error counters and number of cached files."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'files': len(self._entries),
+            }
+
+
+def json_cache(name, transform=None, default=None):
+    """A FileCache of JSON files, optionally passed through `transform`."""
+    def load(f):
+        data = json.load(f)
+        return transform(data) if transform else data
+    return FileCache(name, load, default)
+
+
+def stats():
+    """Counters of every FileCache, by name."""
+    return {name: cache.stats() for name, cache in REGISTRY.items()}
@@ -0,0 +1,106 @@
+"""
+Asyncio broadcast hub for the live state, used by the ASGI views
+(see lyrics.async_views).
+
+Every connected screen or phone awaits the same future; publishing a new
+snapshot resolves it and swaps in a fresh one, so one slide change reaches all
+subscribers in a single pass of the event loop. Snapshots published by the
+sync code (lyrics.live.publish, from any thread) are forwarded to the loop,
+and a single watcher task re-checks the database version every
+LIVE_STATE_SNAPSHOT_TTL seconds to pick up changes made by other processes.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import live
+
+logger = logging.getLogger(__name__)
+
+
+class LiveStateHub:
+    """Fan-out of live-state snapshots to asyncio subscribers."""
+
+    def __init__(self):
+        self.snapshot = None
+        self.subscribers = 0
+        self._loop = None
+        self._changed = None
+        self._starting = None
+
+    def attach(self, snapshot):
+        """Bind the hub to the running event loop with an initial snapshot."""
+        self._loop = asyncio.get_running_loop()
+        self._changed = self._loop.create_future()
+        self.snapshot = snapshot
+
+    async def start(self):
+        """
+        Attach to the running loop on first use: load the current snapshot,
+        listen to sync publishes and start the database watcher.
+        """
+        if self._loop is not None:
+            return
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._starting)
+
+    async def _start(self):
+        self.attach(await sync_to_async(live.get_snapshot)())
+        live.add_listener(self._publish_threadsafe)
+        self._loop.create_task(self._watch())
+
+    def _publish_threadsafe(self, snapshot):
+        try:
+            self._loop.call_soon_threadsafe(self.publish, snapshot)
+        except RuntimeError:
+            pass  # Event loop already closed
+
+    def publish(self, snapshot):
+        """Wake every subscriber with a new snapshot (event loop thread only)."""
+        if self.snapshot is not None and snapshot.version == self.snapshot.version:
+            return
+        self.snapshot = snapshot
+        changed, self._changed = self._changed, self._loop.create_future()
+        changed.set_result(snapshot)
+
+    async def _watch(self):
+        # One version check per TTL for the whole process, whatever the
+        # number of subscribers
+        ttl = max(getattr(settings, 'LIVE_STATE_SNAPSHOT_TTL', live.DEFAULT_SNAPSHOT_TTL), 0.05)
+        while True:
+            await asyncio.sleep(ttl)
+            try:
+                self.publish(await sync_to_async(live.get_snapshot)())
+            except Exception:
+                logger.exception('Live state watcher failed')
+
+    async def get_snapshot(self):
+        """Return the current snapshot without touching the database."""
+        await self.start()
+        return self.snapshot
+
+    async def wait_for_change(self, version, timeout):
+        """
+        Wait until the snapshot version differs from `version` and return it,
+        or return None after `timeout` seconds.
+        """
+        await self.start()
+        deadline = self._loop.time() + timeout
+        self.subscribers += 1
+        try:
+            while self.snapshot.version == version:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    return None
+                done, _ = await asyncio.wait({self._changed}, timeout=remaining)
+                if not done:
+                    return None
+            return self.snapshot
+        finally:
+            self.subscribers -= 1
+
+
+hub = LiveStateHub()
@@ -0,0 +1,380 @@
+"""
+Manifest of the choir images in lyrics/static/lyrics/images.
+
+The manifest records each image's size, dimensions (when Pillow is
+installed), content hash and roles on the setlist page (program, hero,
+gallery, slider), and is stored as images_manifest.json next to the images
+folder. It is built by the build_image_manifest command, or lazily by
+get_manifest() when the folder's mtime changed (checked at most every
+IMAGE_MANIFEST_CHECK_INTERVAL seconds), so views never list the folder.
+
+The build_image_variants command renders resized JPEG/WebP copies of each
+image into lyrics/static/lyrics/variants/<hash>/, plus a tiny blurred
+placeholder, and records them by content hash in images_variants.json;
+ImageManifest.responsive() turns them into src/srcset for the templates.
+"""
+import base64
+import io
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from django.templatetags.static import static
+
+try:
+    from PIL import Image, ImageFilter, ImageOps, features
+except ImportError:
+    Image = None
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+
+# Static path prefix of the images (for {% static %})
+STATIC_PREFIX = 'lyrics/images/'
+
+MANIFEST_VERSION = 1
+
+# Default seconds between checks of the images folder mtime
+DEFAULT_CHECK_INTERVAL = 5.0
+
+# Program image filename hints, by priority
+PROGRAM_NAMES = ['program origina', 'program original']
+PROGRAM_FALLBACK_NAMES = ['whatsapp image 2026-01-02 at 11.31.38']
+PROGRAM_KEYWORDS = ['program', 'programme', 'poster', 'affiche', 'ft', 'gtt', 'gsrz', 'fghft']
+PHOTO_KEYWORDS = ['dsc_', 'photo', 'img_']
+
+GALLERY_SIZE = 4
+
+# Default widths (px) of the resized variants
+DEFAULT_VARIANT_WIDTHS = [320, 640, 960, 1280, 1920]
+VARIANTS_PREFIX = 'lyrics/variants/'
+PLACEHOLDER_WIDTH = 16
+
+
+def images_dir():
+    return os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'images')
+
+
+def manifest_path():
+    return os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'images_manifest.json')
+
+
+def variants_dir():
+    return os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'variants')
+
+
+def variants_path():
+    return os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'images_variants.json')
+
+
+def image_file(image):
+    """Absolute path of a manifest image."""
+    return os.path.join(images_dir(), image['name'])
+
+
+def find_program_image(names):
+    """Pick the concert program among image filenames (None if there are none)."""
+    lowered = [(name, name.lower()) for name in names]
+    for hints in (PROGRAM_NAMES, PROGRAM_FALLBACK_NAMES, PROGRAM_KEYWORDS):
+        for name, lower in lowered:
+            if any(hint in lower for hint in hints):
+                return name
+    # Otherwise the first image that is not obviously a photo, or the first one
+    for name, lower in lowered:
+        if not any(keyword in lower for keyword in PHOTO_KEYWORDS):
+            return name
+    return names[0] if names else None
+
+
+def assign_roles(names):
+    """
+    Setlist page roles of the images: one program, one hero (the first other
+    image), up to GALLERY_SIZE gallery images, and every non-program image
+    in the slider. Returns {filename: [roles]}.
+    """
+    roles = {name: [] for name in names}
+    program = find_program_image(names)
+    others = [name for name in names if name != program]
+    if program:
+        roles[program].append('program')
+    if others:
+        roles[others[0]].append('hero')
+    for name in others[1:1 + GALLERY_SIZE]:
+        roles[name].append('gallery')
+    for name in others:
+        roles[name].append('slider')
+    return roles
+
+
+def file_hash(path):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_dimensions(path):
+    """(width, height) of an image, or (None, None) without Pillow."""
+    if Image is None:
+        return None, None
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except OSError:
+        return None, None
+
+
+def build_manifest(previous=None):
+    """
+    Scan the images folder and return a new manifest. Hashes and
+    dimensions are reused from `previous` for files whose size and mtime
+    did not change.
+    """
+    directory = images_dir()
+    known = {image['name']: image for image in (previous or {}).get('images', [])}
+    images = []
+    dir_mtime = None
+    if os.path.isdir(directory):
+        dir_mtime = os.stat(directory).st_mtime_ns
+        names = sorted(
+            entry.name for entry in os.scandir(directory)
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        for name, roles in assign_roles(names).items():
+            path = os.path.join(directory, name)
+            stat = os.stat(path)
+            image = known.get(name)
+            if not image or image['size'] != stat.st_size or image['mtime'] != stat.st_mtime_ns:
+                width, height = image_dimensions(path)
+                image = {
+                    'name': name,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime_ns,
+                    'width': width,
+                    'height': height,
+                    'hash': file_hash(path),
+                    'content_type': mimetypes.guess_type(name)[0] or 'image/jpeg',
+                }
+            images.append({**image, 'path': STATIC_PREFIX + name, 'roles': roles})
+
+    return {
+        'version': MANIFEST_VERSION,
+        'dir_mtime': dir_mtime,
+        'images': images,
+    }
+
+
+def _write_json(path, data):
+    # A temporary file of its own per writer: processes rebuilding at the
+    # same time never interleave their writes, the last complete one wins
+    with tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.',
+        delete=False
+    ) as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+def write_manifest(manifest):
+    """Atomically write the manifest file."""
+    _write_json(manifest_path(), manifest)
+
+
+def read_manifest():
+    """The stored manifest, or None if missing, unreadable or outdated."""
+    try:
+        with open(manifest_path(), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def variant_widths(width, buckets):
+    """The bucket widths below the image width, plus the largest useful one."""
+    widths = [bucket for bucket in sorted(buckets) if bucket < width]
+    largest = min(width, max(buckets))
+    if largest not in widths:
+        widths.append(largest)
+    return widths
+
+
+def _save(image, path, image_format):
+    if image_format == 'webp':
+        image.save(path, 'WEBP', quality=75, method=4)
+    else:
+        if image.mode != 'RGB':
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+            image = background
+        image.save(path, 'JPEG', quality=80, optimize=True, progressive=True)
+
+
+def render_variants(source, output_dir, buckets, formats):
+    """
+    Write the resized variants of the image file `source` to `output_dir`
+    as <width>.jpg / <width>.webp, and return their description with a
+    base64 placeholder. Runs in build_image_variants worker processes.
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        width, height = image.size
+        widths = variant_widths(width, buckets)
+
+        os.makedirs(output_dir, exist_ok=True)
+        for variant_width in widths:
+            variant_height = max(1, round(height * variant_width / width))
+            resized = image.resize((variant_width, variant_height), Image.LANCZOS)
+            for image_format in formats:
+                extension = 'jpg' if image_format == 'jpeg' else image_format
+                _save(resized, os.path.join(output_dir, f'{variant_width}.{extension}'), image_format)
+
+        placeholder_height = max(1, round(height * PLACEHOLDER_WIDTH / width))
+        tiny = image.convert('RGB').resize((PLACEHOLDER_WIDTH, placeholder_height), Image.BILINEAR)
+        # WebP when possible: ~100 bytes instead of ~700 for a JPEG
+        placeholder_format = 'webp' if 'webp' in formats else 'jpeg'
+        buffer = io.BytesIO()
+        tiny.filter(ImageFilter.GaussianBlur(1)).save(buffer, placeholder_format.upper(), quality=50)
+
+    return {
+        'width': width,
+        'height': height,
+        'widths': widths,
+        'formats': list(formats),
+        'placeholder': (
+            f'data:image/{placeholder_format};base64,'
+            + base64.b64encode(buffer.getvalue()).decode('ascii')
+        ),
+    }
+
+
+def webp_supported():
+    return Image is not None and features.check('webp')
+
+
+def read_variants():
+    """Rendered variants by image hash (empty if none were built)."""
+    try:
+        with open(variants_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_variants(variants):
+    """Atomically write the variants index."""
+    _write_json(variants_path(), variants)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ImageManifest:
+    """A loaded manifest, with the images of each role and their variants."""
+
+    def __init__(self, data, variants=None):
+        self.data = data
+        self.variants = variants or {}
+        self.images = data['images']
+        self.by_role = {}
+        for image in self.images:
+            for role in image['roles']:
+                self.by_role.setdefault(role, []).append(image)
+        # Changes with the images, their roles or their variants (page cache keys)
+        self.version = hashlib.sha1(json.dumps([
+            [(image['name'], image['hash'], image['roles']) for image in self.images],
+            sorted(self.variants),
+        ]).encode('utf-8')).hexdigest()[:16]
+
+    def role(self, role):
+        """The images with `role`, in filename order."""
+        return self.by_role.get(role, [])
+
+    def first(self, role):
+        """The first image with `role`, or None."""
+        images = self.role(role)
+        return images[0] if images else None
+
+    def responsive(self, image):
+        """
+        Template data of an image: `src` plus, once build_image_variants has
+        rendered it, JPEG and WebP `srcset`s and a `placeholder` data URI.
+        """
+        variants = self.variants.get(image['hash'])
+        if not variants:
+            return {'path': image['path'], 'src': static(image['path']), 'srcset': '',
+                    'webp_srcset': '', 'placeholder': '',
+                    'width': image['width'], 'height': image['height']}
+
+        base = f"{VARIANTS_PREFIX}{image['hash'][:16]}/"
+        srcsets = {}
+        for image_format in variants['formats']:
+            extension = 'jpg' if image_format == 'jpeg' else image_format
+            srcsets[image_format] = ', '.join(
+                f'{static(f"{base}{width}.{extension}")} {width}w' for width in variants['widths']
+            )
+        # Fallback src for browsers without srcset: the largest JPEG
+        return {
+            'path': image['path'],
+            'src': static(f"{base}{variants['widths'][-1]}.jpg"),
+            'srcset': srcsets.get('jpeg', ''),
+            'webp_srcset': srcsets.get('webp', ''),
+            'placeholder': variants['placeholder'],
+            'width': variants['width'],
+            'height': variants['height'],
+        }
+
+
+_lock = threading.Lock()
+_manifest = None
+_stamp = None
+_checked_at = 0.0
+
+
+def get_manifest(rebuild=False):
+    """
+    The shared image manifest, loaded once per process. The images folder
+    and manifest file mtimes are checked at most every
+    IMAGE_MANIFEST_CHECK_INTERVAL seconds: a manifest or variants index
+    rewritten by the commands is reloaded, and a changed folder is rescanned
+    (and saved).
+    """
+    global _manifest, _stamp, _checked_at
+    interval = getattr(settings, 'IMAGE_MANIFEST_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+    if not rebuild and _manifest is not None and time.monotonic() - _checked_at < interval:
+        return _manifest
+
+    with _lock:
+        dir_mtime = _mtime(images_dir())
+        stamp = (dir_mtime, _mtime(manifest_path()), _mtime(variants_path()))
+        if rebuild or _manifest is None or stamp != _stamp:
+            data = read_manifest()
+            if rebuild or data is None or data.get('dir_mtime') != dir_mtime:
+                data = build_manifest(data)
+                try:
+                    write_manifest(data)
+                except OSError:
+                    pass  # Read-only deployment: keep it in memory
+            _manifest = ImageManifest(data, read_variants())
+            _stamp = (dir_mtime, _mtime(manifest_path()), _mtime(variants_path()))
+        _checked_at = time.monotonic()
+        return _manifest
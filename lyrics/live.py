@@ -0,0 +1,259 @@
+"""
+Versioned in-memory snapshot of the live state.
+
+The control views bump LiveState.version and publish the rendered JSON
+payload here; api_state_view serves the pre-serialized bytes from the
+snapshot. The database is only read on a cold start, or to re-check the
+version at most once every LIVE_STATE_SNAPSHOT_TTL seconds so that other
+worker processes (and admin edits) are picked up.
+
+Streaming clients block in wait_for_change(), which is woken in-process by
+publish() so no external message broker is needed.
+"""
+import json
+import threading
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import LiveState
+
+# Default seconds between version checks against the database
+DEFAULT_SNAPSHOT_TTL = 0.5
+
+_lock = threading.Lock()
+_changed = threading.Condition(_lock)
+_snapshot = None
+_checked_at = 0.0
+_listeners = []
+
+
+class Snapshot(NamedTuple):
+    """A published live state: its version, payload and serialized body."""
+    version: int
+    payload: dict
+    body: bytes
+
+    @property
+    def etag(self):
+        """Strong ETag for the snapshot body."""
+        return f'"state-{self.version}"'
+
+
+def build_state_payload(live_state):
+    """
+    Build the live-state JSON payload (what the projector screens display).
+    """
+    if not live_state.active_song:
+        return {
+            'active': False,
+            'song': None,
+            'index': 0,
+            'start': 0,
+            'lines': [],
+            'total': 0,
+            'version': live_state.version,
+            'updated_at': live_state.updated_at.isoformat()
+        }
+
+    song = live_state.active_song
+
+    # Slides are precomputed on the song (see lyrics.slides), so no line
+    # splitting happens here
+    virtual_slides = song.slide_deck
+    total_virtual_slides = song.slide_count
+
+    # Use the active_index as the virtual slide index, within bounds
+    current_virtual_index = live_state.active_index
+    if current_virtual_index < 0:
+        current_virtual_index = 0
+    if current_virtual_index >= total_virtual_slides:
+        current_virtual_index = max(0, total_virtual_slides - 1)
+
+    # Current slide plus the next one as a preview
+    current_slide = virtual_slides[current_virtual_index][0] if current_virtual_index < total_virtual_slides else ""
+    next_slide = ""
+    if current_virtual_index + 1 < total_virtual_slides:
+        next_slide = virtual_slides[current_virtual_index + 1][0]
+
+    window_lines = []
+    if current_slide.strip():
+        window_lines.append(current_slide)
+    if next_slide.strip():
+        window_lines.append(next_slide)
+
+    # Find which original line this virtual slide belongs to
+    original_line_index = virtual_slides[current_virtual_index][1] if total_virtual_slides else 0
+
+    return {
+        'active': True,
+        'song': {
+            'id': song.id,
+            'title': song.title,
+            'slug': song.slug,
+            # Immutable URL of the full lyrics, changes with every edit
+            'lyrics_version': song.lyrics_version,
+            'lyrics_url': reverse('api_song_lyrics_version', args=[song.id, song.lyrics_version])
+        },
+        'index': current_virtual_index,  # Virtual slide index
+        'original_line_index': original_line_index,  # Original line index
+        'lines': window_lines,
+        'current_line_index': 0,
+        'total': total_virtual_slides,  # Total virtual slides
+        'total_original_lines': song.line_count,  # Total original lines
+        'version': live_state.version,
+        'updated_at': live_state.updated_at.isoformat()
+    }
+
+
+def publish(live_state, force=False):
+    """
+    Render and publish a snapshot for the given LiveState.
+    Unless forced, an older version never replaces a newer one.
+    """
+    global _snapshot, _checked_at
+    payload = build_state_payload(live_state)
+    body = json.dumps(payload, cls=DjangoJSONEncoder).encode('utf-8')
+    snapshot = Snapshot(live_state.version, payload, body)
+    changed = False
+    with _lock:
+        if force or _snapshot is None or snapshot.version >= _snapshot.version:
+            changed = _snapshot is None or snapshot.version != _snapshot.version
+            if changed:
+                _changed.notify_all()
+            _snapshot = snapshot
+        _checked_at = time.monotonic()
+        current = _snapshot
+    if changed:
+        for listener in list(_listeners):
+            listener(current)
+    return current
+
+
+def add_listener(callback):
+    """
+    Call `callback(snapshot)` whenever a new version is published in this
+    process (e.g. to wake the asyncio hub, see lyrics.hub).
+    """
+    _listeners.append(callback)
+
+
+def get_snapshot():
+    """
+    Return the current snapshot, reading the database only on a cold start
+    or when the TTL has expired and another process moved the version on.
+    """
+    global _checked_at
+    snapshot = _snapshot
+    ttl = getattr(settings, 'LIVE_STATE_SNAPSHOT_TTL', DEFAULT_SNAPSHOT_TTL)
+    if snapshot is not None and time.monotonic() - _checked_at < ttl:
+        return snapshot
+
+    if snapshot is not None:
+        version = LiveState.objects.filter(pk=1).values_list('version', flat=True).first()
+        if version == snapshot.version:
+            _checked_at = time.monotonic()
+            return snapshot
+
+    return publish(LiveState.get_current(), force=True)
+
+
+def wait_for_change(version, timeout):
+    """
+    Block until the published version differs from `version` and return the
+    new snapshot, or return None once `timeout` seconds have passed.
+
+    Waiters are woken immediately by publish() in this process, and re-check
+    the database every TTL so changes made by other processes are seen too.
+    """
+    deadline = time.monotonic() + timeout
+    ttl = getattr(settings, 'LIVE_STATE_SNAPSHOT_TTL', DEFAULT_SNAPSHOT_TTL)
+    while True:
+        snapshot = get_snapshot()
+        if snapshot.version != version:
+            return snapshot
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        with _changed:
+            if _snapshot is snapshot:
+                _changed.wait(min(remaining, max(ttl, 0.05)))
+
+
+def _publish_on_commit(live_state):
+    # Inside a transaction (e.g. a command batch) only committed states are
+    # published; in autocommit mode this publishes straight away
+    transaction.on_commit(lambda: publish(live_state))
+
+
+def set_active_song(song):
+    """Put `song` live from its first slide and publish the new state."""
+    live_state = LiveState.get_current()
+    live_state.active_song = song
+    live_state.active_index = 0
+    live_state.save()
+    _publish_on_commit(live_state)
+    return live_state
+
+
+def _update_index(bounded, **changes):
+    """
+    Apply a conditional UPDATE to the LiveState row and read it back.
+    Returns (live_state, updated); live_state is None when no song is live.
+    """
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            # Lock the row first: the bounded UPDATE below then sees every
+            # committed move, even though its join to the song is a subquery.
+            # SQLite has no row locks and needs none (one writer at a time);
+            # a read here would only add a lock upgrade.
+            list(LiveState.objects.select_for_update().filter(pk=1).values_list('pk', flat=True))
+        updated = bounded.update(
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+            **changes
+        ) > 0
+        # Read back our own write (the row stays locked until commit)
+        live_state = LiveState.get_current()
+
+    if not live_state.active_song:
+        return None, False
+    if updated:
+        _publish_on_commit(live_state)
+    return live_state, updated
+
+
+def move(step):
+    """
+    Move the live slide by `step` (1 for next, -1 for previous) and publish.
+    Returns (live_state, moved); live_state is None when no song is live.
+
+    The move is a single conditional UPDATE bounded by the song's real slide
+    count, run under a lock of the LiveState row on databases with row locks
+    (SQLite serializes writers instead), so concurrent operators (or double
+    taps) can never lose a step or go past either end of the song.
+    """
+    bounded = LiveState.objects.filter(pk=1, active_song__isnull=False)
+    if step > 0:
+        bounded = bounded.filter(active_index__lt=F('active_song__slide_count') - step)
+    else:
+        bounded = bounded.filter(active_index__gte=-step)
+    return _update_index(bounded, active_index=F('active_index') + step)
+
+
+def goto(index):
+    """
+    Jump to slide `index` of the live song (same contract as move()).
+    """
+    bounded = LiveState.objects.filter(
+        pk=1, active_song__isnull=False, active_song__slide_count__gt=index
+    )
+    if index < 0:
+        bounded = bounded.none()
+    return _update_index(bounded, active_index=index)
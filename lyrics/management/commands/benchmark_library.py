@@ -0,0 +1,213 @@
+"""
+Management command timing the song pipeline on synthetic libraries
+(see lyrics.synthetic) of growing size: parsing lyrics.md, import_lyrics,
+slide deck building, the live-state payload and the songs pages.
+
+The data is written to a throwaway SQLite database (see
+lyrics.synthetic.throwaway_database), never to the configured one. With --baseline
+the results are compared with a stored run, and the command fails when a
+metric got slower by more than --threshold (and --min-change ms);
+--save-baseline stores the run.
+"""
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from lyrics import live, search, views
+from lyrics.management.commands.import_lyrics import Command as ImportCommand
+from lyrics.models import LiveState, Song
+from lyrics.slides import build_slide_deck
+from lyrics.synthetic import generate_songs, throwaway_database, write_lyrics_md
+
+# Default baseline file, relative to the project root
+DEFAULT_BASELINE = 'benchmarks/baseline.json'
+
+
+def best_of(func, repeat, setup=None):
+    """
+    Fastest of `repeat` calls of `func`, in milliseconds (least noisy).
+    `setup` is called untimed before each call.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(min(timings), 3)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark parsing, import, slides and song pages on synthetic libraries (10, 1k, 50k songs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--songs',
+            type=int,
+            nargs='+',
+            default=[10, 1000, 50000],
+            help='Library sizes to benchmark (default: 10 1000 50000)'
+        )
+        parser.add_argument(
+            '--lines',
+            type=int,
+            nargs=2,
+            default=[10, 30],
+            metavar=('MIN', 'MAX'),
+            help='Lines per synthetic song (default: 10 30)'
+        )
+        parser.add_argument(
+            '--accents',
+            type=float,
+            default=0.3,
+            help='Share of accented words (default: 0.3)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs of each measurement, the fastest is kept (default: 3)'
+        )
+        parser.add_argument(
+            '--baseline',
+            default=None,
+            nargs='?',
+            const=DEFAULT_BASELINE,
+            help=f'Compare with a stored run and fail on regressions (default file: {DEFAULT_BASELINE})'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Allowed slowdown against the baseline, as a fraction (default: 0.25)'
+        )
+        parser.add_argument(
+            '--min-change',
+            type=float,
+            default=1.0,
+            help='Slowdowns smaller than this (ms) are noise, not regressions (default: 1)'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            default=None,
+            nargs='?',
+            const=DEFAULT_BASELINE,
+            help=f'Store this run as the baseline (default file: {DEFAULT_BASELINE})'
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        for count in options['songs']:
+            self.stdout.write(f'{count} songs...')
+            results[str(count)] = self.benchmark_library(count, options)
+            for metric, value in results[str(count)].items():
+                self.stdout.write(f'  {metric:<20}{value:>12.3f} ms')
+
+        if options['save_baseline']:
+            path = os.path.join(settings.BASE_DIR, options['save_baseline'])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'date': datetime.now().isoformat(timespec='seconds'),
+                    'lines': options['lines'],
+                    'accents': options['accents'],
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {path}'))
+
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['threshold'], options['min_change'])
+
+    def benchmark_library(self, count, options):
+        """Time each stage on a library of `count` songs; return ms per metric."""
+        repeat = options['repeat']
+        songs = list(generate_songs(count, lines=options['lines'], accents=options['accents']))
+        with tempfile.NamedTemporaryFile('w', suffix='.md', encoding='utf-8', delete=False) as f:
+            write_lyrics_md(songs, f)
+        try:
+            with open(f.name, 'r', encoding='utf-8') as source:
+                content = source.read()
+            metrics = {'parse': best_of(lambda: ImportCommand().parse_lyrics_file(content), repeat)}
+            metrics['slide_decks'] = best_of(
+                lambda: [build_slide_deck(song['lines']) for song in songs], repeat
+            )
+
+            try:
+                with throwaway_database():
+                    metrics.update(self.benchmark_database(f.name, repeat))
+            except ValueError as exc:
+                raise CommandError(str(exc))
+        finally:
+            os.unlink(f.name)
+        return metrics
+
+    def benchmark_database(self, path, repeat):
+        """Time the import, the live payload and the songs pages (on a throwaway database)."""
+        def clear():
+            search.clear_index()
+            Song.objects.all().delete()
+
+        # Each import starts from an empty database
+        metrics = {'import': best_of(
+            lambda: call_command('import_lyrics', file=path, no_bundle=True, stdout=io.StringIO()),
+            repeat, setup=clear
+        )}
+
+        # The longest song, live on its middle slide
+        song = Song.objects.order_by('-slide_count').first()
+        LiveState.objects.update_or_create(
+            pk=1, defaults={'active_song': song, 'active_index': song.slide_count // 2}
+        )
+        metrics['state_payload'] = best_of(
+            lambda: live.build_state_payload(LiveState.objects.select_related('active_song').get(pk=1)),
+            repeat
+        )
+
+        # Rendered pages, not the page cache
+        factory = RequestFactory()
+        with override_settings(PAGE_CACHE_TIMEOUT=0):
+            songs_list = factory.get(reverse('songs_list'))
+            metrics['songs_list'] = best_of(lambda: views.songs_list_view(songs_list).content, repeat)
+            song_detail = factory.get(reverse('song_detail', args=[song.slug]))
+            metrics['song_detail'] = best_of(
+                lambda: views.song_detail_view(song_detail, slug=song.slug).content, repeat
+            )
+        return metrics
+
+    def compare(self, results, baseline_file, threshold, min_change):
+        path = os.path.join(settings.BASE_DIR, baseline_file)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)['results']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Cannot read the baseline {path}: {exc}')
+
+        self.stdout.write(f'\nCompared with {path} (threshold +{threshold:.0%}):')
+        regressions = []
+        for count, metrics in results.items():
+            for metric, value in metrics.items():
+                before = baseline.get(count, {}).get(metric)
+                if not before:
+                    continue
+                change = (value - before) / before
+                line = f'  {count:>6} songs {metric:<16}{before:>12.3f} -> {value:>12.3f} ms ({change:+.0%})'
+                if change > threshold and value - before > min_change:
+                    regressions.append(f'{count} songs {metric}')
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f'Performance regressions: {", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('No regression'))
@@ -0,0 +1,97 @@
+"""
+Management command comparing the per-poll cost of the live-state slides
+before (re-split every line on each poll) and after (precomputed slide deck).
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from lyrics.models import Song, LyricLine, LiveState
+from lyrics.signals import suspend_slide_deck_updates
+from lyrics.slides import build_slide_deck
+from lyrics.synthetic import WORDS
+
+
+class _Rollback(Exception):
+    """Raised to discard the benchmark data."""
+
+
+class Command(BaseCommand):
+    help = 'Benchmark live-state slide computation per poll (before/after slide decks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines',
+            type=int,
+            nargs='+',
+            default=[100, 500, 1000],
+            help='Line counts of the synthetic songs (default: 100 500 1000)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Number of simulated polls per measurement (default: 200)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        iterations = options['iterations']
+
+        try:
+            with transaction.atomic():
+                for line_count in options['lines']:
+                    self.benchmark_song(rng, line_count, iterations)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def benchmark_song(self, rng, line_count, iterations):
+        with suspend_slide_deck_updates():
+            song = Song.objects.create(
+                title=f'BENCHMARK {line_count}',
+                slug=f'benchmark-slides-{line_count}'
+            )
+            LyricLine.objects.bulk_create([
+                LyricLine(
+                    song=song,
+                    order=i,
+                    text=' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))
+                )
+                for i in range(line_count)
+            ])
+        song.rebuild_slide_deck()
+        LiveState.objects.update_or_create(
+            pk=1, defaults={'active_song': song, 'active_index': song.slide_count // 2}
+        )
+
+        def before():
+            # What api_state_view did on every poll: load and split every line
+            live_state = LiveState.objects.get(pk=1)
+            texts = [line.text for line in live_state.active_song.lines.all()]
+            deck = build_slide_deck(texts)
+            return deck[live_state.active_index]
+
+        def after():
+            # Single indexed lookup of the precomputed deck
+            live_state = LiveState.objects.select_related('active_song').get(pk=1)
+            return live_state.active_song.slide_deck[live_state.active_index]
+
+        assert before() == after()
+        before_ms = self.time_per_call(before, iterations)
+        after_ms = self.time_per_call(after, iterations)
+
+        self.stdout.write(
+            f'{line_count:>6} lines / {song.slide_count:>6} slides: '
+            f'before {before_ms:8.3f} ms/poll, after {after_ms:8.3f} ms/poll '
+            f'({before_ms / after_ms:6.1f}x)'
+        )
+
+    @staticmethod
+    def time_per_call(func, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - start) * 1000 / iterations
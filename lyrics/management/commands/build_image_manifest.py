@@ -0,0 +1,41 @@
+"""
+Management command to (re)build the choir images manifest (see lyrics.images).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from lyrics import images
+
+
+class Command(BaseCommand):
+    help = 'Build lyrics/static/lyrics/images_manifest.json (image roles, sizes, dimensions, hashes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-hash every image, even those whose size and mtime did not change'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        previous = None if options['force'] else images.read_manifest()
+        manifest = images.build_manifest(previous)
+        images.write_manifest(manifest)
+        elapsed = time.perf_counter() - start
+
+        for image in manifest['images']:
+            dimensions = f"{image['width']}x{image['height']}" if image['width'] else '?x?'
+            self.stdout.write(
+                f"  {image['name']}: {', '.join(image['roles']) or '-'} "
+                f"({image['size'] // 1024} KB, {dimensions}, {image['hash'][:12]})"
+            )
+        if images.Image is None:
+            self.stdout.write(self.style.WARNING('Pillow not installed: image dimensions not recorded'))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Manifest of {len(manifest['images'])} images written to "
+                f"{images.manifest_path()} ({elapsed:.2f}s)"
+            )
+        )
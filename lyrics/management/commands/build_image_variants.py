@@ -0,0 +1,110 @@
+"""
+Management command to render responsive variants of the choir images:
+resized JPEG/WebP copies per width bucket and a tiny blurred placeholder
+(see lyrics.images). Images whose content hash already has variants in
+the current formats and IMAGE_VARIANT_WIDTHS are skipped, so only new or
+changed photos (or all of them, after a settings change) are processed.
+"""
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lyrics import images
+
+
+def _render(job):
+    name, source, output_dir, widths, formats = job
+    try:
+        return name, images.render_variants(source, output_dir, widths, formats), None
+    except OSError as e:
+        return name, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Render resized JPEG/WebP variants and placeholders of the choir images (requires Pillow)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Image processes (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Render every image again, even if its variants exist'
+        )
+
+    def handle(self, *args, **options):
+        if images.Image is None:
+            self.stdout.write(
+                self.style.ERROR('Pillow not available. Install with: pip install Pillow')
+            )
+            return
+
+        start = time.perf_counter()
+        manifest = images.get_manifest(rebuild=True)
+        widths = getattr(settings, 'IMAGE_VARIANT_WIDTHS', images.DEFAULT_VARIANT_WIDTHS)
+        formats = ['jpeg', 'webp'] if images.webp_supported() else ['jpeg']
+        if 'webp' not in formats:
+            self.stdout.write(self.style.WARNING('Pillow has no WebP support: JPEG variants only'))
+
+        previous = {} if options['force'] else images.read_variants()
+        variants = {}
+        jobs = []
+        for image in manifest.images:
+            output_dir = os.path.join(images.variants_dir(), image['hash'][:16])
+            known = previous.get(image['hash'])
+            if (
+                known
+                and known['formats'] == formats
+                and known['widths'] == images.variant_widths(known['width'], widths)
+                and os.path.isdir(output_dir)
+            ):
+                variants[image['hash']] = known
+                self.stdout.write(f"  Unchanged: {image['name']}")
+                continue
+            # No stale sizes left behind
+            shutil.rmtree(output_dir, ignore_errors=True)
+            jobs.append((image['name'], images.image_file(image), output_dir, widths, formats))
+
+        hashes = {image['name']: image['hash'] for image in manifest.images}
+        workers = max(1, min(options['workers'] or os.cpu_count() or 1, len(jobs) or 1))
+        if workers == 1:
+            results = map(_render, jobs)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_render, jobs)
+        try:
+            for name, rendered, error in results:
+                if error:
+                    self.stdout.write(self.style.WARNING(f'  Skipped {name}: {error}'))
+                    continue
+                variants[hashes[name]] = rendered
+                self.stdout.write(
+                    f"  Rendered: {name} ({', '.join(str(w) for w in rendered['widths'])}px)"
+                )
+        finally:
+            if workers > 1:
+                executor.shutdown()
+
+        # Drop the variants of images that were removed or changed
+        kept = {image_hash[:16] for image_hash in variants}
+        if os.path.isdir(images.variants_dir()):
+            for entry in os.scandir(images.variants_dir()):
+                if entry.is_dir() and entry.name not in kept:
+                    shutil.rmtree(entry.path)
+
+        images.write_variants(variants)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Variants of {len(variants)} images ({len(jobs)} rendered) '
+                f'written to {images.variants_dir()} ({elapsed:.2f}s)'
+            )
+        )
@@ -0,0 +1,26 @@
+"""
+Management command to (re)build the offline songbook bundle (see lyrics.bundle).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from lyrics import bundle
+
+
+class Command(BaseCommand):
+    help = 'Build the offline songbook bundle and its gzip/brotli encodings in SONG_BUNDLE_DIR'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        songbook = bundle.refresh()
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f'  identity: {len(songbook.body) // 1024} KB')
+        for encoding, body in sorted(songbook.encodings.items()):
+            self.stdout.write(f'  {encoding}: {len(body) // 1024} KB')
+        if bundle.brotli is None:
+            self.stdout.write(self.style.WARNING('brotli not installed: gzip encoding only'))
+        self.stdout.write(
+            self.style.SUCCESS(f'Bundle {songbook.hash} written to {bundle.bundle_dir()} ({elapsed:.2f}s)')
+        )
@@ -0,0 +1,249 @@
+"""
+Management command to export the public songbook (setlist, songs list,
+song pages, program page and a JSON dump of the lyrics) as a static site
+that any plain file server or CDN can serve.
+
+Pages are rendered by the regular views (page cache disabled), without the
+features that need the server (search, service worker), with the
+static files collected into <output>/static/ under fingerprinted names
+(ManifestStaticFilesStorage), so they can be cached forever. Song pages
+are only re-rendered when the song's lyrics, the song page template or
+the static files changed, in a process pool.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.template.loader import get_template
+from django.templatetags.static import static
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import resolve, reverse
+
+from lyrics import images
+from lyrics.models import Song
+
+# Record of the exported songs, for incremental runs
+STATE_FILE = '.export.json'
+
+
+def export_settings(output_dir, host):
+    """Settings rendering the pages for the export (hashed static URLs, no page cache)."""
+    static_root = os.path.join(output_dir, 'static')
+    return {
+        'STORAGES': {
+            **settings.STORAGES,
+            'staticfiles': {
+                'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+                'OPTIONS': {'location': static_root},
+            },
+        },
+        'STATIC_ROOT': static_root,
+        'DEBUG': False,  # Hashed names are only used without DEBUG
+        'ALLOWED_HOSTS': [host],
+        'PAGE_CACHE_TIMEOUT': 0,
+    }
+
+
+def page_file(output_dir, path):
+    """Output file of a page URL path: /song/x/ -> song/x/index.html."""
+    parts = [part for part in path.split('/') if part]
+    return os.path.join(output_dir, *parts, 'index.html')
+
+
+def render_page(factory, path):
+    """
+    The HTML bytes of the page at `path`, rendered by its view. Templates
+    leave out what needs the server (search API, service worker, admin and
+    screen links) when request.static_export is set.
+    """
+    match = resolve(path)
+    request = factory.get(path)
+    request.static_export = True
+    response = match.func(request, *match.args, **match.kwargs)
+    if response.status_code != 200:
+        raise ValueError(f'{path} answered {response.status_code}')
+    return response.content
+
+
+def write_if_changed(path, content):
+    """Write `content` unless the file already holds it; return whether it was written."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return True
+
+
+_worker = {}
+
+
+def _init_worker(output_dir, host, secure, child=True):
+    if child:
+        import django
+        django.setup()
+        override_settings(**export_settings(output_dir, host)).enable()
+    _worker['factory'] = RequestFactory(HTTP_HOST=host, secure=secure)
+    _worker['output_dir'] = output_dir
+
+
+def _render_songs(paths):
+    # Runs in the worker processes: render and write a chunk of song pages
+    written = 0
+    for path in paths:
+        written += write_if_changed(page_file(_worker['output_dir'], path), render_page(_worker['factory'], path))
+    return len(paths), written
+
+
+class Command(BaseCommand):
+    help = 'Export the public songbook as a static site with fingerprinted assets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default='export',
+            help='Output directory, relative to the project root (default: export)'
+        )
+        parser.add_argument(
+            '--base-url',
+            default='http://localhost',
+            help='Public URL of the site root, used for absolute links (default: http://localhost)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Song page rendering processes (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-render every song page, even unchanged ones'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        output_dir = os.path.join(settings.BASE_DIR, options['output'])
+        base_url = urlsplit(options['base_url'])
+        host, secure = base_url.netloc or 'localhost', base_url.scheme == 'https'
+        os.makedirs(output_dir, exist_ok=True)
+
+        with override_settings(**export_settings(output_dir, host)):
+            # Fingerprinted static files (unchanged files are not copied again)
+            images.get_manifest()
+            call_command('collectstatic', interactive=False, verbosity=0)
+            self.stdout.write(f"Static files collected to {settings.STATIC_ROOT}")
+
+            factory = RequestFactory(HTTP_HOST=host, secure=secure)
+            written = 0
+            for name in ('setlist', 'songs_list', 'program'):
+                path = reverse(name)
+                written += write_if_changed(page_file(output_dir, path), render_page(factory, path))
+
+            # The download link points to the (fingerprinted) program image
+            program = images.get_manifest().first('program')
+            if program:
+                program_url = static(program['path'])
+                written += write_if_changed(
+                    page_file(output_dir, reverse('download_program')),
+                    (
+                        '<!DOCTYPE html><meta charset="utf-8">'
+                        f'<meta http-equiv="refresh" content="0; url={program_url}">'
+                        f'<a href="{program_url}">Programme</a>\n'
+                    ).encode('utf-8')
+                )
+
+            written += self.export_songs(output_dir, host, secure, options)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f'Exported the songbook to {output_dir} ({written} files written, {elapsed:.2f}s)')
+        )
+
+    def export_songs(self, output_dir, host, secure, options):
+        """Write lyrics.json and the song pages whose content changed; return the files written."""
+        songs = list(Song.objects.prefetch_related('lines'))
+        data = [
+            {
+                'id': song.id,
+                'title': song.title,
+                'slug': song.slug,
+                'order': song.order,
+                'lines': [line.text for line in song.lines.all()],
+            }
+            for song in songs
+        ]
+        written = write_if_changed(
+            os.path.join(output_dir, 'lyrics.json'),
+            json.dumps({'songs': data}, ensure_ascii=False).encode('utf-8')
+        )
+
+        # Song pages also change with their template and the static file names
+        with open(os.path.join(settings.STATIC_ROOT, 'staticfiles.json'), 'rb') as f:
+            static_manifest = f.read()
+        fingerprint = hashlib.sha1(
+            static_manifest + get_template('lyrics/song_detail.html').template.source.encode('utf-8')
+        ).hexdigest()
+
+        state_path = os.path.join(output_dir, STATE_FILE)
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+        exported = {} if options['force'] or previous.get('fingerprint') != fingerprint else previous.get('songs', {})
+
+        versions = {song.slug: song.lyrics_version for song in songs}
+        changed = [
+            reverse('song_detail', args=[slug]) for slug, version in versions.items()
+            if exported.get(slug) != version or not os.path.exists(
+                page_file(output_dir, reverse('song_detail', args=[slug]))
+            )
+        ]
+
+        # Pages of deleted songs
+        for slug in set(exported) - set(versions):
+            shutil.rmtree(os.path.dirname(page_file(output_dir, reverse('song_detail', args=[slug]))), ignore_errors=True)
+            self.stdout.write(f'  Removed: {slug}')
+
+        rendered = 0
+        if changed:
+            workers = max(1, min(options['workers'] or os.cpu_count() or 1, len(changed)))
+            chunks = [changed[i::workers] for i in range(workers)]
+            if workers == 1:
+                _init_worker(output_dir, host, secure, child=False)
+                results = map(_render_songs, chunks)
+            else:
+                # Forked workers must not share this process's connection
+                connections.close_all()
+                executor = ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_worker, initargs=(output_dir, host, secure)
+                )
+                results = executor.map(_render_songs, chunks)
+            try:
+                for count, chunk_written in results:
+                    rendered += count
+                    written += chunk_written
+            finally:
+                if workers > 1:
+                    executor.shutdown()
+
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fingerprint, 'songs': versions}, f, indent=2)
+        self.stdout.write(f'{len(songs)} songs: {rendered} pages rendered, {len(songs) - rendered} unchanged')
+        return written
@@ -1,85 +1,231 @@
 """
-Management command to extract text from program image using OCR.
+Management command to extract text from the program images using OCR.
+
+Results are saved in program_text.json as lines with bounding boxes (see
+lyrics.ocr), keyed by image content hash: re-running only OCRs new or
+changed images. Large posters can be cut into tiles OCRed in parallel.
+Placeholder backends (--backend stub) write to program_text.<backend>.json
+instead, so their text never reaches the program page.
 """
 from django.core.management.base import BaseCommand
 from django.conf import settings
 import os
 import json
-from pathlib import Path
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from lyrics import images, ocr
+
+OUTPUT_VERSION = 2
+
+
+def output_path(backend=None):
+    """program_text.json, or a separate file for placeholder backends."""
+    name = f'program_text.{backend}.json' if backend in ocr.PLACEHOLDER_BACKENDS else 'program_text.json'
+    return os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', name)
+
 
-try:
-    import pytesseract
-    from PIL import Image
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+def read_output(path):
+    """The previous output file (older versions have no 'images'), or {}."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != OUTPUT_VERSION:
+        data.pop('images', None)
+    return data
 
 
 class Command(BaseCommand):
-    help = 'Extract text from program image using OCR'
+    help = 'Extract text from program images using OCR'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help='Image filenames in lyrics/static/lyrics/images (default: the program image)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='OCR every image of the images folder'
+        )
+        parser.add_argument(
+            '--backend',
+            default=getattr(settings, 'OCR_BACKEND', 'tesseract'),
+            help=f"OCR backend ({', '.join(sorted(ocr.BACKENDS))}); 'stub' needs no OCR install"
+        )
+        parser.add_argument(
+            '--lang',
+            default='fra+eng',
+            help='Tesseract languages (default: fra+eng)'
+        )
+        parser.add_argument(
+            '--tile-size',
+            type=int,
+            default=getattr(settings, 'OCR_TILE_SIZE', 0),
+            help='Cut images larger than this (px) into tiles OCRed in parallel (0: no tiling)'
+        )
+        parser.add_argument(
+            '--tile-overlap',
+            type=int,
+            default=100,
+            help='Overlap between tiles in px (default: 100)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='OCR processes (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='OCR the images again, even if their text is cached'
+        )
 
     def handle(self, *args, **options):
-        if not OCR_AVAILABLE:
-            self.stdout.write(
-                self.style.ERROR(
-                    'OCR libraries not available. Install with: pip install pytesseract Pillow'
+        error = ocr.backend_error(options['backend'])
+        if error:
+            self.stdout.write(self.style.ERROR(error))
+            if options['backend'] == 'tesseract':
+                self.stdout.write(
+                    'Also install Tesseract OCR: https://github.com/tesseract-ocr/tesseract'
                 )
-            )
-            self.stdout.write(
-                'Also install Tesseract OCR: https://github.com/tesseract-ocr/tesseract'
-            )
             return
 
-        # Path to program image
-        static_images_dir = os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'images')
-        program_image_path = None
-        
-        # Find program image
-        if os.path.exists(static_images_dir):
-            for filename in os.listdir(static_images_dir):
-                filename_lower = filename.lower()
-                if filename_lower.endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                    if 'program origina' in filename_lower or 'program original' in filename_lower:
-                        program_image_path = os.path.join(static_images_dir, filename)
-                        break
-        
-        if not program_image_path or not os.path.exists(program_image_path):
+        if options['tile_size'] < 0:
+            self.stdout.write(self.style.ERROR('--tile-size must be 0 (no tiling) or a size in px'))
+            return
+        if options['tile_size'] and not 0 <= options['tile_overlap'] < options['tile_size']:
+            self.stdout.write(self.style.ERROR('--tile-overlap must be at least 0 and smaller than --tile-size'))
+            return
+
+        start = time.perf_counter()
+        manifest = images.get_manifest()
+        by_name = {image['name']: image for image in manifest.images}
+        program = manifest.first('program')
+
+        if options['all']:
+            selected = list(manifest.images)
+        elif options['names']:
+            missing = [name for name in options['names'] if name not in by_name]
+            for name in missing:
+                self.stdout.write(self.style.ERROR(f'Image not found: {name}'))
+            if missing:
+                return
+            selected = [by_name[name] for name in options['names']]
+        elif program:
+            selected = [program]
+        else:
             self.stdout.write(
                 self.style.ERROR('Program image not found!')
             )
             return
 
-        self.stdout.write(f'Extracting text from: {program_image_path}')
-        
+        # Cached results are reused when the image content and OCR settings match
+        settings_key = {
+            'backend': options['backend'],
+            'lang': options['lang'],
+            'tile_size': options['tile_size'],
+            # The overlap only matters for tiled images
+            'tile_overlap': options['tile_overlap'] if options['tile_size'] else 0,
+        }
+        output_file = output_path(options['backend'])
+        previous = read_output(output_file)
+        cached = {
+            result['hash']: result for result in previous.get('images', [])
+            if all(result.get(key) == value for key, value in settings_key.items())
+        }
+        # Results of other images stay, as long as the image is unchanged
+        results = {
+            result['name']: result for result in previous.get('images', [])
+            if result['name'] in by_name and by_name[result['name']]['hash'] == result['hash']
+        }
+
+        jobs = []
+        tiles = {}
+        for image in selected:
+            if not options['force'] and image['hash'] in cached:
+                results[image['name']] = {**cached[image['hash']], 'name': image['name'], 'path': image['path']}
+                self.stdout.write(f"  Cached: {image['name']}")
+                continue
+            path = images.image_file(image)
+            width, height = image['width'], image['height']
+            if width is None:
+                width, height = images.image_dimensions(path)
+            if width is None:
+                self.stdout.write(self.style.WARNING(f"  Skipped {image['name']}: cannot read its dimensions"))
+                continue
+            boxes = ocr.tile_boxes(width, height, options['tile_size'], options['tile_overlap'])
+            tiles[path] = (image, width, height, [])
+            jobs.extend((path, box, options['backend'], options['lang']) for box in boxes)
+            self.stdout.write(f"  OCR: {image['name']} ({len(boxes)} tile{'s' if len(boxes) > 1 else ''})")
+
+        workers = max(1, min(options['workers'] or os.cpu_count() or 1, len(jobs) or 1))
+        if workers == 1:
+            tile_results = map(ocr.ocr_tile, jobs)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            tile_results = executor.map(ocr.ocr_tile, jobs)
+        failed = set()
         try:
-            # Open and process image
-            image = Image.open(program_image_path)
-            
-            # Extract text using OCR
-            self.stdout.write('Processing image with OCR...')
-            extracted_text = pytesseract.image_to_string(image, lang='fra+eng')
-            
-            # Save extracted text to a JSON file
-            output_file = os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'program_text.json')
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            
-            data = {
-                'text': extracted_text,
-                'image_path': f'lyrics/images/{os.path.basename(program_image_path)}'
+            for path, box, lines, error in tile_results:
+                if error:
+                    failed.add(path)
+                    self.stdout.write(
+                        self.style.ERROR(f'Error extracting text from {os.path.basename(path)} {box}: {error}')
+                    )
+                    continue
+                tiles[path][3].extend(lines)
+        finally:
+            if workers > 1:
+                executor.shutdown()
+
+        for path, (image, width, height, lines) in tiles.items():
+            if path in failed:
+                continue  # Keep the previous result of a failed image, if any
+            lines = ocr.merge_lines(lines)
+            results[image['name']] = {
+                'name': image['name'],
+                'path': image['path'],
+                'hash': image['hash'],
+                'width': width,
+                'height': height,
+                **settings_key,
+                'text': ocr.lines_text(lines),
+                'lines': lines,
             }
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'Text extracted and saved to: {output_file}')
-            )
-            self.stdout.write(f'\nExtracted text preview:\n{extracted_text[:500]}...')
-            
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error extracting text: {str(e)}')
+
+        # 'text' and 'image_path' of the program image, as read by program_view
+        # (the previous ones are kept until the program is OCRed)
+        ordered = [results[image['name']] for image in manifest.images if image['name'] in results]
+        program_result = results.get(program['name']) if program else None
+        data = {
+            'version': OUTPUT_VERSION,
+            'text': program_result['text'] if program_result else previous.get('text', ''),
+            'image_path': program_result['path'] if program_result else previous.get('image_path'),
+            'images': ordered,
+        }
+
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        tmp_file = f'{output_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, output_file)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Text of {len(ordered)} images ({len(tiles) - len(failed)} OCRed, {len(jobs)} tiles) '
+                f'saved to: {output_file} ({elapsed:.2f}s)'
             )
+        )
+        if failed and options['backend'] == 'tesseract':
             self.stdout.write(
                 'Make sure Tesseract OCR is installed: https://github.com/tesseract-ocr/tesseract'
             )
+        program_file = images.image_file(program) if program else None
+        if program_result and program_file in tiles and program_file not in failed:
+            self.stdout.write(f"\nExtracted text preview:\n{program_result['text'][:500]}...")
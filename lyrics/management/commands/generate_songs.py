@@ -0,0 +1,71 @@
+"""
+Management command writing a synthetic song library in the lyrics.md
+format (see lyrics.synthetic), to try the app with many songs.
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lyrics.synthetic import generate_songs, write_lyrics_md
+
+
+class Command(BaseCommand):
+    help = 'Write a synthetic song library (lyrics.md format) for benchmarks and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--songs',
+            type=int,
+            default=1000,
+            help='Number of songs (default: 1000)'
+        )
+        parser.add_argument(
+            '--lines',
+            type=int,
+            nargs=2,
+            default=[10, 30],
+            metavar=('MIN', 'MAX'),
+            help='Lines per song (default: 10 30)'
+        )
+        parser.add_argument(
+            '--line-length',
+            type=int,
+            nargs=2,
+            default=[3, 12],
+            metavar=('MIN', 'MAX'),
+            help='Words per line (default: 3 12)'
+        )
+        parser.add_argument(
+            '--accents',
+            type=float,
+            default=0.3,
+            help='Share of accented words, 0 to 1 (default: 0.3)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed (default: 42)'
+        )
+        parser.add_argument(
+            '--output',
+            default='synthetic_lyrics.md',
+            help='Output file, relative to the project root (default: synthetic_lyrics.md)'
+        )
+
+    def handle(self, *args, **options):
+        output = Path(settings.BASE_DIR) / options['output']
+        songs = generate_songs(
+            options['songs'],
+            lines=options['lines'],
+            line_length=options['line_length'],
+            accents=options['accents'],
+            seed=options['seed'],
+        )
+        with open(output, 'w', encoding='utf-8') as f:
+            write_lyrics_md(songs, f)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['songs']} songs to {output} "
+            f"(import with: python manage.py import_lyrics --file {options['output']} --clear)"
+        ))
@@ -1,15 +1,26 @@
 """
-Management command to import songs and lyrics from lyrics.md file.
+Management command to import songs and lyrics from lyrics.md file,
+or from a folder of ChordPro / OpenLyrics / plain text files (see lyrics.parsers).
 """
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from django.utils.text import slugify
-from lyrics.models import Song, LyricLine
+from lyrics.models import Song, LyricLine, LiveState, compute_content_hash
+from lyrics.parsers import PARSERS, iter_lyrics_md, find_song_files, try_parse_file
+from lyrics.signals import suspend_slide_deck_updates
+from lyrics import bundle, pagecache, search
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import islice
 import os
+import time
 from pathlib import Path
 
 
 class Command(BaseCommand):
-    help = 'Import songs and lyrics from lyrics.md file'
+    help = 'Import songs and lyrics from lyrics.md, or from a folder of song files (--dir)'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -18,146 +29,217 @@ class Command(BaseCommand):
             default='lyrics.md',
             help='Path to the lyrics markdown file (default: lyrics.md)'
         )
+        parser.add_argument(
+            '--format',
+            choices=sorted(extension.lstrip('.') for extension in PARSERS),
+            default=None,
+            help='Format of --file, e.g. txt for a single plain text song '
+                 '(default: md, the lyrics.md format, whatever the extension)'
+        )
+        parser.add_argument(
+            '--dir',
+            type=str,
+            default=None,
+            help='Import every supported song file in this folder '
+                 f'({", ".join(sorted(PARSERS))}) instead of --file'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Parser processes for --dir (default: number of CPUs)'
+        )
         parser.add_argument(
             '--clear',
             action='store_true',
             help='Clear all existing songs before importing'
         )
+        parser.add_argument(
+            '--no-bundle',
+            action='store_true',
+            help='Do not rebuild the offline songbook bundle after the import'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of songs parsed and written at a time (default: 500)'
+        )
 
     def handle(self, *args, **options):
-        file_path = options['file']
-        
         # Get the base directory (project root)
         base_dir = Path(__file__).resolve().parent.parent.parent.parent
-        lyrics_file = base_dir / file_path
         
-        if not lyrics_file.exists():
-            self.stdout.write(
-                self.style.ERROR(f'File not found: {lyrics_file}')
-            )
-            return
+        start = time.perf_counter()
+        inserted = updated = unchanged = 0
         
-        # Clear existing songs if requested
-        if options['clear']:
-            self.stdout.write('Clearing existing songs...')
-            Song.objects.all().delete()
-            self.stdout.write(self.style.SUCCESS('Cleared all songs'))
-        
-        # Read and parse the file
-        self.stdout.write(f'Reading lyrics from {lyrics_file}...')
-        
-        with open(lyrics_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Parse songs
-        songs_data = self.parse_lyrics_file(content)
-        
-        self.stdout.write(f'Found {len(songs_data)} songs')
-        
-        # Import songs
-        imported_count = 0
-        updated_count = 0
-        
-        for order, song_data in enumerate(songs_data, start=1):
-            title = song_data['title']
-            lines = song_data['lines']
-            
-            # Get or create song
-            song, created = Song.objects.get_or_create(
-                slug=slugify(title),
-                defaults={
-                    'title': title,
-                    'order': order
-                }
-            )
-            
-            if not created:
-                # Update order if song already exists
-                song.order = order
-                song.save()
-                updated_count += 1
+        with ExitStack() as stack:
+            if options['dir']:
+                songs_dir = base_dir / options['dir']
+                if not songs_dir.is_dir():
+                    self.stdout.write(
+                        self.style.ERROR(f'Directory not found: {songs_dir}')
+                    )
+                    return
+                songs = self.iter_directory_songs(songs_dir, options['workers'], stack)
             else:
-                imported_count += 1
+                lyrics_file = base_dir / options['file']
+                if not lyrics_file.exists():
+                    self.stdout.write(
+                        self.style.ERROR(f'File not found: {lyrics_file}')
+                    )
+                    return
+                
+                # Read and parse the file incrementally
+                # lyrics.md format unless --format says otherwise, whatever the extension
+                parser = PARSERS['.' + options['format']] if options['format'] else iter_lyrics_md
+                self.stdout.write(f'Reading lyrics from {lyrics_file} ({parser.__name__})...')
+                f = stack.enter_context(open(lyrics_file, 'r', encoding='utf-8'))
+                songs = parser(f)
             
-            # Clear existing lines and add new ones
-            song.lines.all().delete()
+            # Slide decks are computed in bulk by import_songs, not once per line
+            stack.enter_context(transaction.atomic())
+            stack.enter_context(suspend_slide_deck_updates())
             
-            # Add lyric lines
-            for line_order, line_text in enumerate(lines, start=0):
-                if line_text.strip():  # Skip empty lines
-                    LyricLine.objects.create(
-                        song=song,
-                        order=line_order,
-                        text=line_text.strip()
-                    )
+            # Clear existing songs if requested (rolled back if the import fails)
+            if options['clear']:
+                self.stdout.write('Clearing existing songs...')
+                search.clear_index()
+                Song.objects.all().delete()
+                self.stdout.write(self.style.SUCCESS('Cleared all songs'))
             
-            self.stdout.write(
-                f'  {"Updated" if not created else "Imported"}: {title} ({len(lines)} lines)'
-            )
+            # Import songs in batches as they are parsed
+            order = 1
+            while True:
+                batch = list(islice(songs, options['batch_size']))
+                if not batch:
+                    break
+                counts = self.import_songs(batch, order, options['verbosity'])
+                inserted += len(counts[0])
+                updated += len(counts[1])
+                unchanged += len(counts[2])
+                order += len(batch)
+        
+        # Cached public pages (bulk writes send no signals)
+        if inserted or updated or options['clear']:
+            pagecache.bump('songs')
+        elapsed = time.perf_counter() - start
         
+        # Compressed here rather than by the first phone asking for it
+        if (inserted or updated or options['clear']) and not options['no_bundle']:
+            songbook = bundle.refresh()
+            self.stdout.write(f'Built the offline songbook bundle {songbook.hash}')
+        
+        self.stdout.write(f'Found {order - 1} songs')
         self.stdout.write(
             self.style.SUCCESS(
-                f'\nSuccessfully imported {imported_count} new songs, '
-                f'updated {updated_count} existing songs'
+                f'\nImported {inserted} new songs, updated {updated}, '
+                f'{unchanged} unchanged ({elapsed:.2f}s)'
             )
         )
 
-    def parse_lyrics_file(self, content):
+    def iter_directory_songs(self, songs_dir, workers, stack):
         """
-        Parse the lyrics.md file format.
-        Songs are separated by multiple blank lines, with titles in all caps.
+        Parse every supported file under `songs_dir` in a process pool and
+        yield the songs in file order; this process stays the single writer.
         """
-        songs = []
-        lines = content.split('\n')
+        paths = find_song_files(songs_dir)
+        workers = max(1, workers or os.cpu_count() or 1)
+        self.stdout.write(f'Parsing {len(paths)} files from {songs_dir} with {workers} worker(s)...')
         
-        current_song = None
-        current_lines = []
-        blank_line_count = 0
+        if workers == 1:
+            results = map(try_parse_file, paths)
+        else:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            results = executor.map(try_parse_file, paths, chunksize=max(1, len(paths) // (workers * 8)))
         
-        for line in lines:
-            original_line = line
-            line = line.rstrip()
-            
-            # Track consecutive blank lines
-            if not line:
-                blank_line_count += 1
+        for songs, error in results:
+            if error:
+                self.stdout.write(self.style.WARNING(f'  Skipped {error}'))
+            yield from songs
+
+    def import_songs(self, songs_data, start_order=1, verbosity=1):
+        """
+        Bulk-load parsed songs, numbered from `start_order`, skipping songs
+        whose content hash, title and order are unchanged. Must run inside a
+        transaction, with slide deck signal updates suspended.
+        Returns the lists of inserted, updated and unchanged songs.
+        """
+        # Later songs win when two titles share a slug
+        parsed = {}
+        for order, song_data in enumerate(songs_data, start=start_order):
+            title = song_data['title']
+            lines = [
+                (line_order, line_text.strip())
+                for line_order, line_text in enumerate(song_data['lines'])
+                if line_text.strip()  # Skip empty lines
+            ]
+            parsed[slugify(title)] = (order, title, lines)
+        
+        existing = Song.objects.filter(slug__in=parsed).only('id', 'slug', 'title', 'order', 'content_hash')
+        existing = {song.slug: song for song in existing}
+        
+        inserted, updated, unchanged = [], [], []
+        new_lines = {}  # slug -> (order, text) pairs to (re)write
+        now = timezone.now()
+        
+        for slug, (order, title, lines) in parsed.items():
+            song = existing.get(slug)
+            if song is None:
+                song = Song(title=title, slug=slug, order=order)
+                song.set_lyrics_data(lines)
+                inserted.append(song)
+                new_lines[slug] = lines
                 continue
-            else:
-                # If we had 2+ blank lines, we might be starting a new song
-                if blank_line_count >= 2 and current_song:
-                    # Save previous song
-                    songs.append({
-                        'title': current_song,
-                        'lines': current_lines
-                    })
-                    current_song = None
-                    current_lines = []
-                blank_line_count = 0
             
-            # Check if this line is a song title
-            # Titles are: all uppercase, reasonable length, no leading spaces
-            is_title = (
-                line and
-                line.isupper() and
-                len(line.split()) <= 15 and  # Reasonable title length
-                not line.startswith(' ') and
-                not line.startswith('(') and  # Not a parenthetical note
-                current_song is None  # We're not already in a song
-            )
+            content_changed = song.content_hash != compute_content_hash(lines)
+            if not content_changed and song.title == title and song.order == order:
+                unchanged.append(song)
+                if verbosity >= 2:
+                    self.stdout.write(f'  Unchanged: {title}')
+                continue
             
-            if is_title:
-                # Start new song
-                current_song = line
-                current_lines = []
-            elif current_song:
-                # Add line to current song (even if it's empty, we'll filter later)
-                current_lines.append(original_line)
+            song.title = title
+            song.order = order
+            song.updated_at = now
+            if content_changed:
+                song.set_lyrics_data(lines)
+                new_lines[slug] = lines
+            updated.append(song)
+        
+        Song.objects.bulk_create(inserted, batch_size=500)
+        Song.objects.bulk_update(
+            updated, ['title', 'order', 'updated_at', *Song.LYRICS_DATA_FIELDS], batch_size=500
+        )
+        
+        # Rewrite the lines of new and changed songs only
+        song_ids = dict(Song.objects.filter(slug__in=new_lines).values_list('slug', 'id'))
+        search.unindex_songs(song_ids.values())
+        LyricLine.objects.filter(song_id__in=song_ids.values()).delete()
+        LyricLine.objects.bulk_create(
+            [
+                LyricLine(song_id=song_ids[slug], order=line_order, text=text)
+                for slug, lines in new_lines.items()
+                for line_order, text in lines
+            ],
+            batch_size=1000
+        )
+        # Renamed songs are reindexed too, the title is searchable
+        search.index_songs({*song_ids.values(), *(song.pk for song in updated)})
         
-        # Don't forget the last song
-        if current_song:
-            songs.append({
-                'title': current_song,
-                'lines': current_lines
-            })
+        # The live payload embeds slides, so a live song's edit is a state change
+        LiveState.objects.filter(active_song_id__in=song_ids.values()).update(version=F('version') + 1)
         
-        return songs
+        for song in inserted:
+            self.stdout.write(f'  Imported: {song.title} ({song.line_count} lines)')
+        for song in updated:
+            self.stdout.write(f'  Updated: {song.title} ({song.line_count} lines)')
+        
+        return inserted, updated, unchanged
+
+    def parse_lyrics_file(self, content):
+        """
+        Parse the lyrics.md file format from a string.
+        Songs are separated by multiple blank lines, with titles in all caps.
+        """
+        return list(iter_lyrics_md(content.split('\n')))
@@ -0,0 +1,427 @@
+"""
+Management command simulating a live concert against a running server
+(runserver, gunicorn or uvicorn on localhost).
+
+Screens poll /api/state/ (with If-None-Match, like the browser), phones
+browse the songs list, song pages and program page, and an operator moves
+to the next slide at a steady pace. Reports throughput, p50/p95/p99 latency
+per endpoint and how long each slide change takes to reach the screens,
+and writes the results to a JSON file so runs can be compared.
+"""
+import asyncio
+import gzip
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+
+def song_links(html):
+    """Song page paths linked from a page."""
+    prefix = reverse('song_detail', args=['SLUG']).replace('SLUG/', '')
+    return re.findall(r'href="(%s[^"#/]+/)"' % re.escape(prefix), html)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def summarize(latencies):
+    """Latency percentiles in milliseconds."""
+    if not latencies:
+        return {}
+    return {
+        'p50': round(statistics.median(latencies) * 1000, 2),
+        'p95': round(percentile(latencies, 95) * 1000, 2),
+        'p99': round(percentile(latencies, 99) * 1000, 2),
+        'max': round(max(latencies) * 1000, 2),
+    }
+
+
+class Stats:
+    """Latencies and outcomes of the requests, per endpoint."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.not_modified = {}
+        self.bytes = {}
+
+    def record(self, endpoint, latency, status, size):
+        self.latencies.setdefault(endpoint, []).append(latency)
+        self.bytes[endpoint] = self.bytes.get(endpoint, 0) + size
+        if status == 304:
+            self.not_modified[endpoint] = self.not_modified.get(endpoint, 0) + 1
+
+    def error(self, endpoint):
+        self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def endpoints(self, duration):
+        return {
+            endpoint: {
+                'requests': len(latencies),
+                'errors': self.errors.get(endpoint, 0),
+                'not_modified': self.not_modified.get(endpoint, 0),
+                'per_second': round(len(latencies) / duration, 2),
+                'bytes': self.bytes.get(endpoint, 0),
+                'latency_ms': summarize(latencies),
+            }
+            for endpoint, latencies in sorted(self.latencies.items())
+        }
+
+
+class Client:
+    """Minimal asyncio HTTP/1.1 client (one connection per request)."""
+
+    def __init__(self, base_url, stats, timeout):
+        url = urlsplit(base_url)
+        self.host, self.port, self.netloc = url.hostname, url.port or 80, url.netloc
+        self.stats = stats
+        self.timeout = timeout
+
+    async def request(self, endpoint, method, path, headers=None):
+        """Send a request and return (status, headers, body); None on failure."""
+        started = time.perf_counter()
+        try:
+            status, response_headers, body = await asyncio.wait_for(
+                self._exchange(method, path, headers or {}), self.timeout
+            )
+        except (OSError, asyncio.TimeoutError, ValueError):
+            self.stats.error(endpoint)
+            return None
+        self.stats.record(endpoint, time.perf_counter() - started, status, len(body))
+        if status >= 500:
+            self.stats.error(endpoint)
+        if response_headers.get('content-encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return status, response_headers, body
+
+    def json(self, endpoint, response):
+        """The JSON body of a response, or None (counted as an error) if it has none."""
+        status, response_headers, body = response
+        try:
+            if not response_headers.get('content-type', '').startswith('application/json'):
+                raise ValueError('not JSON')
+            return json.loads(body)
+        except ValueError:
+            if status < 500:  # 5xx are already counted by request()
+                self.stats.error(endpoint)
+            return None
+
+    async def _exchange(self, method, path, headers):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            lines = [f'{method} {path} HTTP/1.1', f'Host: {self.netloc}', 'Connection: close']
+            lines += [f'{name}: {value}' for name, value in headers.items()]
+            if method == 'POST':
+                lines.append('Content-Length: 0')
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+            response = await reader.read()
+        finally:
+            writer.close()
+
+        head, _, body = response.partition(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        if response_headers.get('transfer-encoding') == 'chunked':
+            body = self._dechunk(body)
+        return status, response_headers, body
+
+    @staticmethod
+    def _dechunk(body):
+        chunks = []
+        while body:
+            size, _, body = body.partition(b'\r\n')
+            size = int(size.split(b';')[0], 16)
+            if size == 0:
+                break
+            chunks.append(body[:size])
+            body = body[size + 2:]
+        return b''.join(chunks)
+
+
+class Command(BaseCommand):
+    help = 'Load-test a running server with screens, phones and an operator (simulated concert)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Base URL of the running server (default: http://127.0.0.1:8000)'
+        )
+        parser.add_argument(
+            '--screens',
+            type=int,
+            default=20,
+            help='Projector screens polling /api/state/ (default: 20)'
+        )
+        parser.add_argument(
+            '--phones',
+            type=int,
+            default=50,
+            help='Phones browsing the songs and program pages (default: 50)'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=60,
+            help='Seconds to run (default: 60)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=0.8,
+            help='Seconds between state polls of a screen (default: 0.8)'
+        )
+        parser.add_argument(
+            '--slide-interval',
+            type=float,
+            default=4.0,
+            help='Seconds between slide changes by the operator (default: 4)'
+        )
+        parser.add_argument(
+            '--think-time',
+            type=float,
+            default=3.0,
+            help='Mean seconds a phone user spends on a page (default: 3)'
+        )
+        parser.add_argument(
+            '--song-id',
+            type=int,
+            default=None,
+            help='Song the operator puts live (default: first song)'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=10,
+            help='Seconds before a request counts as failed (default: 10)'
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='JSON result file (default: loadtests/concert-<date>.json)'
+        )
+        parser.add_argument(
+            '--compare',
+            default=None,
+            help='Previous JSON result file to compare the latencies with'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed of the phone users'
+        )
+
+    def handle(self, *args, **options):
+        song_id = options['song_id'] or self.first_song_id()
+        self.rng = random.Random(options['seed'])
+        stats = Stats()
+        client = Client(options['url'], stats, options['timeout'])
+
+        self.stdout.write(
+            f"{options['screens']} screens, {options['phones']} phones and an operator "
+            f"for {options['duration']:.0f}s against {options['url']}..."
+        )
+        started = time.perf_counter()
+        changes, observations = asyncio.run(self.run(client, song_id, options))
+        duration = time.perf_counter() - started
+
+        result = {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': self.git_commit(),
+            'url': options['url'],
+            'screens': options['screens'],
+            'phones': options['phones'],
+            'duration': round(duration, 2),
+            'poll_interval': options['poll_interval'],
+            'slide_interval': options['slide_interval'],
+            'requests': sum(len(latencies) for latencies in stats.latencies.values()),
+            'errors': sum(stats.errors.values()),
+            'per_second': round(sum(len(latencies) for latencies in stats.latencies.values()) / duration, 2),
+            'endpoints': stats.endpoints(duration),
+            'propagation': self.propagation(changes, observations),
+        }
+        self.report(result)
+
+        if options['compare']:
+            with open(options['compare'], 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            self.compare(result, previous)
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'loadtests', f"concert-{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+    @staticmethod
+    def first_song_id():
+        from lyrics.models import Song
+        song = Song.objects.first()
+        if song is None:
+            raise CommandError('No songs found: run import_lyrics first')
+        return song.pk
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    async def run(self, client, song_id, options):
+        stop = asyncio.Event()
+        changes = {}  # state version -> time the operator asked for it
+        observations = [[] for _ in range(options['screens'])]  # per screen: (time, version)
+
+        # A live song is needed for the screens to follow
+        if await client.request('control_set_song', 'POST', reverse('control_set_song', args=[song_id])) is None:
+            raise CommandError(f"Could not reach {options['url']}")
+
+        tasks = [asyncio.ensure_future(self.screen(client, stop, options, seen)) for seen in observations]
+        tasks += [asyncio.ensure_future(self.phone(client, stop, options)) for _ in range(options['phones'])]
+        tasks.append(asyncio.ensure_future(self.operator(client, stop, options, song_id, changes)))
+
+        await asyncio.sleep(options['duration'])
+        stop.set()
+        await asyncio.gather(*tasks)
+        return changes, observations
+
+    async def screen(self, client, stop, options, seen):
+        """Poll the state like screen.html, recording when each version shows up."""
+        interval = options['poll_interval']
+        etag, version = None, None
+        await asyncio.sleep(self.rng.uniform(0, interval))
+        next_poll = time.perf_counter()
+        while not stop.is_set():
+            headers = {'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
+            if etag:
+                headers['If-None-Match'] = etag
+            response = await client.request('state', 'GET', reverse('api_state'), headers)
+            data = client.json('state', response) if response is not None and response[0] == 200 else None
+            if data is not None:
+                etag = response[1].get('etag')
+                state_version = data.get('version')
+                if state_version != version:
+                    version = state_version
+                    seen.append((time.perf_counter(), version))
+            next_poll += interval
+            await asyncio.sleep(max(0, next_poll - time.perf_counter()))
+
+    async def phone(self, client, stop, options):
+        """Browse the songs list, a few songs and sometimes the program."""
+        headers = {'Accept': 'text/html', 'Accept-Encoding': 'gzip'}
+        song_paths = []
+        await asyncio.sleep(self.rng.uniform(0, options['think_time']))
+        while not stop.is_set():
+            roll = self.rng.random()
+            if not song_paths or roll < 0.2:
+                response = await client.request('songs_list', 'GET', reverse('songs_list'), headers)
+                if response is not None and response[0] == 200:
+                    song_paths = song_links(response[2].decode('utf-8', 'replace')) or song_paths
+            elif roll < 0.3:
+                await client.request('programme', 'GET', reverse('program'), headers)
+            else:
+                await client.request('song_detail', 'GET', self.rng.choice(song_paths), headers)
+            await self.think(stop, options['think_time'])
+
+    async def think(self, stop, mean):
+        try:
+            await asyncio.wait_for(stop.wait(), self.rng.expovariate(1 / mean) if mean > 0 else 0)
+        except asyncio.TimeoutError:
+            pass
+
+    async def operator(self, client, stop, options, song_id, changes):
+        """Move to the next slide every --slide-interval, restarting the song at its end."""
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), options['slide_interval'])
+                return
+            except asyncio.TimeoutError:
+                pass
+            started = time.perf_counter()
+            response = await client.request('control_next', 'POST', reverse('control_next'))
+            # A failed move (e.g. a 500 page) is counted, not fatal to the run
+            result = client.json('control_next', response) if response is not None else None
+            if result is None:
+                continue
+            if not result.get('success'):
+                await client.request('control_set_song', 'POST', reverse('control_set_song', args=[song_id]))
+            # The new version, to match it with what the screens see
+            state = await client.request('control_state', 'GET', reverse('api_state'), {'Accept': 'application/json'})
+            data = client.json('control_state', state) if state is not None and state[0] == 200 else None
+            if data is not None and 'version' in data:
+                changes[data['version']] = started
+
+    @staticmethod
+    def propagation(changes, observations):
+        """Delay between each slide change and each screen showing it (or a later one)."""
+        delays, missed = [], 0
+        for version, started in changes.items():
+            for seen in observations:
+                shown = next((at for at, seen_version in seen if seen_version >= version), None)
+                if shown is None:
+                    missed += 1
+                else:
+                    delays.append(max(0.0, shown - started))
+        return {'changes': len(changes), 'missed': missed, 'delay_ms': summarize(delays)}
+
+    def report(self, result):
+        self.stdout.write(
+            f"\n{result['requests']} requests in {result['duration']:.1f}s "
+            f"({result['per_second']:.1f}/s), {result['errors']} errors\n"
+        )
+        self.stdout.write(f"{'endpoint':<18}{'req':>7}{'req/s':>8}{'err':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for endpoint, data in result['endpoints'].items():
+            latency = data['latency_ms']
+            self.stdout.write(
+                f"{endpoint:<18}{data['requests']:>7}{data['per_second']:>8.1f}{data['errors']:>6}"
+                f"{latency.get('p50', 0):>8.1f}ms{latency.get('p95', 0):>8.1f}ms{latency.get('p99', 0):>8.1f}ms"
+            )
+        propagation = result['propagation']
+        delay = propagation['delay_ms']
+        if delay:
+            self.stdout.write(
+                f"\nSlide changes: {propagation['changes']}, reached the screens in "
+                f"p50 {delay['p50']:.0f} ms, p95 {delay['p95']:.0f} ms, p99 {delay['p99']:.0f} ms, "
+                f"max {delay['max']:.0f} ms ({propagation['missed']} missed)"
+            )
+        else:
+            self.stdout.write(self.style.WARNING('\nNo slide change reached the screens'))
+
+    def compare(self, result, previous):
+        self.stdout.write(f"\nCompared with {previous.get('commit') or previous.get('date')} (p95):")
+        rows = [
+            (endpoint, data['latency_ms'].get('p95'), previous.get('endpoints', {}).get(endpoint, {}).get('latency_ms', {}).get('p95'))
+            for endpoint, data in result['endpoints'].items()
+        ]
+        rows.append((
+            'propagation', result['propagation']['delay_ms'].get('p95'),
+            previous.get('propagation', {}).get('delay_ms', {}).get('p95')
+        ))
+        for name, now, before in rows:
+            if now is None or not before:
+                continue
+            change = (now - before) / before * 100
+            self.stdout.write(f'  {name:<18}{before:>8.1f}ms -> {now:>8.1f}ms ({change:+.0f}%)')
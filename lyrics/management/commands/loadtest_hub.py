@@ -0,0 +1,167 @@
+"""
+Management command measuring live-state fan-out to many subscribers.
+
+In-process mode (default) drives the asyncio hub directly with N waiting
+subscribers. With --url it opens N Server-Sent Events connections to a
+running ASGI server (e.g. uvicorn louange_echo.asgi:application) and times
+how long a slide change takes to reach all of them.
+"""
+import asyncio
+import re
+import statistics
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lyrics.hub import LiveStateHub
+from lyrics.live import Snapshot
+
+EVENT_ID = re.compile(rb'id: (\d+)\n')
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Measure live-state broadcast latency to many subscribers (asyncio hub / SSE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subscribers',
+            type=int,
+            nargs='+',
+            default=[1000, 5000],
+            help='Subscriber counts to test (default: 1000 5000)'
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=10,
+            help='Slide changes broadcast per run (default: 10)'
+        )
+        parser.add_argument(
+            '--url',
+            type=str,
+            default=None,
+            help='Base URL of a running ASGI server to test over HTTP instead of in-process'
+        )
+        parser.add_argument(
+            '--song-id',
+            type=int,
+            default=None,
+            help='Song to put live for each change in --url mode (default: first song)'
+        )
+
+    def handle(self, *args, **options):
+        for count in options['subscribers']:
+            if options['url']:
+                song_id = options['song_id'] or self.first_song_id()
+                result = asyncio.run(self.run_http(options['url'], song_id, count, options['rounds']))
+            else:
+                result = asyncio.run(self.run_in_process(count, options['rounds']))
+            self.report(count, *result)
+
+    @staticmethod
+    def first_song_id():
+        from lyrics.models import Song
+        song = Song.objects.first()
+        if song is None:
+            raise CommandError('No songs found: run import_lyrics first')
+        return song.pk
+
+    def report(self, count, connected, latencies):
+        if not latencies:
+            self.stdout.write(self.style.ERROR(f'{count} subscribers: no broadcast received'))
+            return
+        # Latency of a round = time until the *last* subscriber got the change
+        self.stdout.write(
+            f'{count:>6} subscribers ({connected} connected): '
+            f'p50 {statistics.median(latencies) * 1000:8.2f} ms, '
+            f'p99 {percentile(latencies, 99) * 1000:8.2f} ms, '
+            f'max {max(latencies) * 1000:8.2f} ms per broadcast'
+        )
+
+    async def run_in_process(self, count, rounds):
+        hub = LiveStateHub()
+        hub.attach(Snapshot(0, {}, b'{}'))
+        received = [0] * (rounds + 1)
+        all_received = {version: asyncio.Event() for version in range(1, rounds + 1)}
+
+        async def subscriber():
+            version = 0
+            while version < rounds:
+                snapshot = await hub.wait_for_change(version, timeout=30)
+                version = snapshot.version
+                received[version] += 1
+                if received[version] == count:
+                    all_received[version].set()
+
+        tasks = [asyncio.ensure_future(subscriber()) for _ in range(count)]
+        await asyncio.sleep(0.1)
+        connected = hub.subscribers
+
+        latencies = []
+        for version in range(1, rounds + 1):
+            started = time.perf_counter()
+            hub.publish(Snapshot(version, {}, b'{}'))
+            await all_received[version].wait()
+            latencies.append(time.perf_counter() - started)
+        await asyncio.gather(*tasks)
+        return connected, latencies
+
+    async def run_http(self, base_url, song_id, count, rounds):
+        url = urlsplit(base_url)
+        host, port = url.hostname, url.port or 80
+        connections = []
+        for _ in range(count):
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError as exc:
+                self.stderr.write(f'Stopped opening connections: {exc}')
+                break
+            writer.write(
+                f'GET /api/state/stream/ HTTP/1.1\r\nHost: {url.netloc}\r\n'
+                f'Accept: text/event-stream\r\n\r\n'.encode()
+            )
+            connections.append((reader, writer))
+
+        async def read_version(reader, after):
+            buffer = b''
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return None
+                buffer += chunk
+                versions = [int(v) for v in EVENT_ID.findall(buffer)]
+                if versions and versions[-1] != after:
+                    return versions[-1]
+
+        # Every stream first receives the current state
+        current = await asyncio.gather(*(read_version(r, None) for r, _ in connections))
+        readers = [(r, v) for (r, _), v in zip(connections, current) if v is not None]
+        connected = len(readers)
+
+        latencies = []
+        loop = asyncio.get_running_loop()
+        for _ in range(rounds):
+            waiting = [asyncio.ensure_future(read_version(r, v)) for r, v in readers]
+            started = time.perf_counter()
+            await loop.run_in_executor(None, self.set_song, base_url, song_id)
+            versions = await asyncio.gather(*waiting)
+            latencies.append(time.perf_counter() - started)
+            readers = [(r, v) for (r, _), v in zip(readers, versions) if v is not None]
+
+        for _, writer in connections:
+            writer.close()
+        return connected, latencies
+
+    @staticmethod
+    def set_song(base_url, song_id):
+        request = urllib.request.Request(
+            f'{base_url.rstrip("/")}/control/set-song/{song_id}/', method='POST', data=b''
+        )
+        urllib.request.urlopen(request).read()
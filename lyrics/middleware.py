@@ -0,0 +1,171 @@
+"""
+Response compression (gzip, or brotli when the brotli package is
+installed), negotiated on Accept-Encoding.
+
+Compressed bodies of responses with an ETag are kept in a bounded in-memory
+LRU keyed by the response's URL and ETag, so hot payloads (the live-state
+snapshot, cached pages) are compressed once and then served from memory.
+Responses without an ETag are compressed each time: keying them on a hash
+of the body would cost about as much as compressing it. Streaming responses, already encoded responses and responses
+that vary on cookies (personalized pages) are left alone.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this (bytes) are not worth compressing
+MIN_SIZE = 200
+
+# Default bytes of compressed bodies kept in memory
+DEFAULT_CACHE_BYTES = 16 * 1024 * 1024
+
+# Bytes each cached entry is charged on top of its body, so entries for
+# incompressible responses (no body kept) still count towards the bound
+ENTRY_OVERHEAD = 256
+
+# Default brotli quality: 11 is ~100x slower for a few % gain on JSON/HTML
+DEFAULT_BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+ENCODING = _lazy_re_compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def accepted_encodings(request):
+    """Content codings accepted by the client (Accept-Encoding, without q=0)."""
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        match = ENCODING.match(part)
+        if not match:
+            continue
+        try:
+            if match.group(2) is not None and float(match.group(2)) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(match.group(1).lower())
+    return accepted
+
+
+def compress(content, encoding):
+    """`content` compressed with gzip or br."""
+    if encoding == 'br':
+        quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY)
+        return brotli.compress(content, quality=quality)
+    return gzip.compress(content, compresslevel=6, mtime=0)
+
+
+def compress_if_smaller(content, encoding):
+    """`content` compressed, or None when compressing does not help."""
+    body = compress(content, encoding)
+    return body if len(body) < len(content) else None
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies by (encoding, key), bounded in bytes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bodies = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compress(self, key, content, encoding):
+        """The compressed body (None when compressing does not help)."""
+        cache_key = (encoding, key)
+        with self._lock:
+            if cache_key in self._bodies:
+                self._bodies.move_to_end(cache_key)
+                self.hits += 1
+                return self._bodies[cache_key]
+            self.misses += 1
+
+        body = compress_if_smaller(content, encoding)
+
+        max_bytes = getattr(settings, 'COMPRESSION_CACHE_BYTES', DEFAULT_CACHE_BYTES)
+        with self._lock:
+            if cache_key not in self._bodies:
+                self._bodies[cache_key] = body
+                self.size += ENTRY_OVERHEAD + len(body or b'')
+                while self.size > max_bytes and self._bodies:
+                    _, evicted = self._bodies.popitem(last=False)
+                    self.size -= ENTRY_OVERHEAD + len(evicted or b'')
+        return body
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'bodies': len(self._bodies), 'bytes': self.size}
+
+
+body_cache = CompressedBodyCache()
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with brotli or gzip, reusing the compressed body of
+    responses already seen with the same URL and ETag.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Stay async under ASGI, so the async live views are not run in a thread
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < MIN_SIZE or response.cookies or 'cookie' in response.get('Vary', '').lower():
+            return response
+
+        accepted = accepted_encodings(request)
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        # An ETag identifies a representation of one URL only
+        etag = response.get('ETag')
+        if etag:
+            key = f"{request.get_full_path()}\n{etag.removeprefix('W/')}"
+            body = body_cache.get_or_compress(key, response.content, encoding)
+        else:
+            body = compress_if_smaller(response.content, encoding)
+        if body is None:
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        # The compressed body is another representation (like GZipMiddleware)
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
+        return response
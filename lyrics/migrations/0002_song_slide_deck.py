@@ -0,0 +1,85 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:51
+
+from django.db import migrations, models
+
+# Frozen copy of lyrics.slides as of this migration, so replaying it does not
+# depend on the current app code
+MAX_CHARS_PER_SLIDE = 80
+
+
+def split_long_line(line, max_chars=MAX_CHARS_PER_SLIDE):
+    line = line.strip()
+    if not line:
+        return [""]
+    if len(line) <= max_chars:
+        return [line]
+
+    parts = []
+    current_part = ""
+    segments = line.replace(',', ' ,').replace('.', ' .').replace(';', ' ;').split()
+    for segment in segments:
+        if len(current_part) + len(segment) + 1 <= max_chars:
+            current_part += (" " if current_part else "") + segment
+        else:
+            if current_part:
+                parts.append(current_part.strip())
+            current_part = segment
+    if current_part:
+        parts.append(current_part.strip())
+
+    if not parts or any(len(p) > max_chars * 1.5 for p in parts):
+        parts = []
+        for i in range(0, len(line), max_chars):
+            parts.append(line[i:i+max_chars].strip())
+    return parts
+
+
+def build_slide_deck(texts):
+    deck = []
+    for line_idx, text in enumerate(texts):
+        text = text.strip()
+        if not text:
+            deck.append(["", line_idx])
+            continue
+        for part in split_long_line(text):
+            deck.append([part, line_idx])
+    return deck
+
+
+def build_slide_decks(apps, schema_editor):
+    Song = apps.get_model('lyrics', 'Song')
+    LyricLine = apps.get_model('lyrics', 'LyricLine')
+    for song in Song.objects.all():
+        texts = list(
+            LyricLine.objects.filter(song=song).order_by('order').values_list('text', flat=True)
+        )
+        song.slide_deck = build_slide_deck(texts)
+        song.slide_count = len(song.slide_deck)
+        song.line_count = len(texts)
+        song.save(update_fields=['slide_deck', 'slide_count', 'line_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lyrics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='line_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='slide_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='slide_deck',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Virtual slides as [text, original line index] pairs'),
+        ),
+        migrations.RunPython(build_slide_decks, migrations.RunPython.noop),
+    ]
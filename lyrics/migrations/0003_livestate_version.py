@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lyrics', '0002_song_slide_deck'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livestate',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Monotonic counter bumped on every change (see lyrics.live)'),
+        ),
+    ]
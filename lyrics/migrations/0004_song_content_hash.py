@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:53
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def compute_content_hash(lines):
+    # Frozen copy of lyrics.models.compute_content_hash as of this migration
+    data = json.dumps([[order, text] for order, text in lines], ensure_ascii=False)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def fill_content_hashes(apps, schema_editor):
+    Song = apps.get_model('lyrics', 'Song')
+    LyricLine = apps.get_model('lyrics', 'LyricLine')
+    for song in Song.objects.all():
+        lines = LyricLine.objects.filter(song=song).order_by('order').values_list('order', 'text')
+        song.content_hash = compute_content_hash(lines)
+        song.save(update_fields=['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lyrics', '0003_livestate_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the lyric lines, used for HTTP validators', max_length=40),
+        ),
+        migrations.RunPython(fill_content_hashes, migrations.RunPython.noop),
+    ]
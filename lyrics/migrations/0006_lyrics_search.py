@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:20
+
+import unicodedata
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# Frozen copy of lyrics.search as of this migration, so replaying it does not
+# depend on the current app code
+FTS_TABLE = 'lyrics_search'
+
+FOLDED_LETTERS = str.maketrans({
+    'ɔ': 'o', 'Ɔ': 'o', 'ɛ': 'e', 'Ɛ': 'e', 'ŋ': 'n', 'Ŋ': 'n',
+    'ɖ': 'd', 'Ɖ': 'd', 'ƒ': 'f', 'Ƒ': 'f', 'ʋ': 'v', 'Ʋ': 'v',
+    'ɣ': 'g', 'Ɣ': 'g', 'χ': 'x', 'œ': 'oe', 'Œ': 'oe', 'æ': 'ae',
+    'Æ': 'ae', 'ß': 'ss',
+})
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text.translate(FOLDED_LETTERS))
+    return ''.join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def create_search_index(apps, schema_editor):
+    # SQLite only, and only when built with FTS5: otherwise lyrics.search
+    # falls back to an in-process index. Prefix indexes keep short
+    # search-as-you-type prefixes fast.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    LyricLine = apps.get_model('lyrics', 'LyricLine')
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+                f'text, title, song_id UNINDEXED, prefix=\'2 3 4\', '
+                f'tokenize="unicode61 remove_diacritics 2")'
+            )
+        except OperationalError:
+            return
+        lines = LyricLine.objects.values_list('id', 'song_id', 'text', 'song__title')
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, title, song_id) VALUES (%s, %s, %s, %s)',
+            [
+                (line_id, normalize(text), normalize(title), song_id)
+                for line_id, song_id, text, title in lines.iterator()
+            ]
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lyrics', '0005_controlcommand'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,9 +1,29 @@
 """
 Models for the lyrics system.
 """
+import hashlib
+import json
+
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .slides import build_slide_deck
+
+
+def compute_content_hash(lines):
+    """
+    Hash of a song's lyrics, given as (order, text) pairs in display order.
+    """
+    data = json.dumps([[order, text] for order, text in lines], ensure_ascii=False)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def compute_lyrics_version(content_hash, title, slug):
+    """Short hash of everything the lyrics API returns for a song."""
+    data = f'{content_hash}\n{title}\n{slug}'
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
 
 class Song(models.Model):
     """
@@ -15,6 +35,22 @@ class Song(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Materialized projector slides, rebuilt whenever the lyrics change
+    slide_deck = models.JSONField(
+        default=list,
+        blank=True,
+        editable=False,
+        help_text="Virtual slides as [text, original line index] pairs"
+    )
+    slide_count = models.IntegerField(default=0, editable=False)
+    line_count = models.IntegerField(default=0, editable=False)
+    content_hash = models.CharField(
+        max_length=40,
+        blank=True,
+        editable=False,
+        help_text="Hash of the lyric lines, used for HTTP validators"
+    )
+
     class Meta:
         ordering = ['order', 'title']
 
@@ -27,6 +63,44 @@ class Song(models.Model):
             self.slug = slugify(self.title)
         super().save(*args, **kwargs)
 
+    @property
+    def lyrics_version(self):
+        """Short hash of everything the lyrics API returns for this song."""
+        return compute_lyrics_version(self.content_hash, self.title, self.slug)
+
+    # Fields derived from the lyric lines (see set_lyrics_data)
+    LYRICS_DATA_FIELDS = ['slide_deck', 'slide_count', 'line_count', 'content_hash']
+
+    def set_lyrics_data(self, lines):
+        """
+        Set the slide deck, counts and content hash from the song's lines,
+        given as (order, text) pairs in display order. Does not save.
+        """
+        lines = list(lines)
+        self.slide_deck = build_slide_deck([text for order, text in lines])
+        self.slide_count = len(self.slide_deck)
+        self.line_count = len(lines)
+        self.content_hash = compute_content_hash(lines)
+
+    def rebuild_slide_deck(self):
+        """
+        Rebuild and persist the slide deck and content hash from the song's
+        lyric lines. Uses a queryset update so no save signals are fired.
+        updated_at changes too, so other processes see the edit (see
+        lyrics.pagecache.songs_stamp).
+        """
+        self.set_lyrics_data(self.lines.values_list('order', 'text'))
+        self.updated_at = timezone.now()
+        Song.objects.filter(pk=self.pk).update(
+            updated_at=self.updated_at,
+            slide_deck=self.slide_deck,
+            slide_count=self.slide_count,
+            line_count=self.line_count,
+            content_hash=self.content_hash
+        )
+        # The live payload embeds slides, so a live song's edit is a state change
+        LiveState.objects.filter(active_song=self).update(version=models.F('version') + 1)
+
 
 class LyricLine(models.Model):
     """
@@ -60,6 +134,11 @@ class LiveState(models.Model):
         default=0,
         help_text="Current lyric line index (0-based)"
     )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        help_text="Monotonic counter bumped on every change (see lyrics.live)"
+    )
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -71,11 +150,40 @@ class LiveState(models.Model):
             return f"Live: {self.active_song.title} (line {self.active_index})"
         return "No active song"
 
+    def save(self, *args, **kwargs):
+        """
+        Bump the version so cached snapshots of the state are refreshed.
+        Existing rows are bumped in SQL so concurrent writers never reuse a version.
+        """
+        if self._state.adding:
+            self.version = (self.version or 0) + 1
+        else:
+            self.version = models.F('version') + 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+        if isinstance(self.version, models.Expression):
+            self.refresh_from_db(fields=['version'])
+
     @classmethod
     def get_current(cls):
         """
         Get or create the single LiveState instance.
         There should only ever be one row in this table.
         """
-        obj, created = cls.objects.get_or_create(pk=1)
+        obj, created = cls.objects.select_related('active_song').get_or_create(pk=1)
         return obj
+
+
+class ControlCommand(models.Model):
+    """
+    An operator command applied through /control/commands/, remembered by its
+    client idempotency key so that a retried request is not applied twice.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    result = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.result.get('type', 'command')} ({self.key})"
@@ -0,0 +1,161 @@
+"""
+OCR of the program images into lines of text with bounding boxes.
+
+OCR backends are registered by name with @register_backend and take a
+PIL image and a Tesseract language string, returning lines as
+{'text': ..., 'box': [left, top, width, height], 'confidence': ...}.
+'tesseract' needs pytesseract and the Tesseract binary; 'stub' needs
+neither and returns one placeholder line per tile, to exercise the
+pipeline (tiling, caching, output) without OCR. Placeholder backends
+like 'stub' are listed in PLACEHOLDER_BACKENDS: their text is never shown.
+
+Large posters can be cut into overlapping tiles (tile_boxes()), each
+OCRed by ocr_tile() in a worker process, then stitched back with
+merge_lines(). extract_program_text runs ocr_tile() in worker processes
+that never set Django up, so nothing here may read settings or models.
+"""
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+# Backend name -> function(image, lang) returning lines
+BACKENDS = {}
+
+# Backends returning placeholder text instead of OCR (for tests)
+PLACEHOLDER_BACKENDS = set()
+
+
+def register_backend(name, placeholder=False):
+    """Register an OCR backend function under `name`."""
+    def decorator(func):
+        BACKENDS[name] = func
+        if placeholder:
+            PLACEHOLDER_BACKENDS.add(name)
+        return func
+    return decorator
+
+
+def backend_error(name):
+    """Why backend `name` cannot run here, or None if it can."""
+    if name not in BACKENDS:
+        return f"Unknown OCR backend '{name}' (available: {', '.join(sorted(BACKENDS))})"
+    if Image is None:
+        return 'Pillow not available. Install with: pip install Pillow'
+    if name == 'tesseract' and pytesseract is None:
+        return 'pytesseract not available. Install with: pip install pytesseract'
+    return None
+
+
+@register_backend('tesseract')
+def tesseract_lines(image, lang):
+    """Tesseract words grouped into its text lines."""
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    lines = {}
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        left, top = data['left'][i], data['top'][i]
+        right, bottom = left + data['width'][i], top + data['height'][i]
+        line = lines.setdefault(key, {'words': [], 'box': [left, top, right, bottom], 'confidences': []})
+        line['words'].append(word)
+        box = line['box']
+        line['box'] = [min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)]
+        if float(data['conf'][i]) >= 0:
+            line['confidences'].append(float(data['conf'][i]))
+
+    return [
+        {
+            'text': ' '.join(line['words']),
+            'box': [line['box'][0], line['box'][1], line['box'][2] - line['box'][0], line['box'][3] - line['box'][1]],
+            'confidence': (
+                round(sum(line['confidences']) / len(line['confidences']), 1) if line['confidences'] else None
+            ),
+        }
+        for line in lines.values()
+    ]
+
+
+@register_backend('stub', placeholder=True)
+def stub_lines(image, lang):
+    """One placeholder line covering the image (no OCR)."""
+    width, height = image.size
+    return [{'text': f'[{width}x{height}]', 'box': [0, 0, width, height], 'confidence': None}]
+
+
+def tile_boxes(width, height, tile_size=0, overlap=0):
+    """
+    Crop boxes (left, top, right, bottom) covering a width x height image
+    with tiles of at most tile_size px, overlapping by `overlap` px so that
+    a line cut by one tile is whole in its neighbour. No tile_size (or a
+    smaller image) gives a single box. Raises ValueError unless
+    0 <= overlap < tile_size.
+    """
+    if tile_size and not 0 <= overlap < tile_size:
+        raise ValueError(f'Tile overlap ({overlap}px) must be smaller than the tile size ({tile_size}px)')
+    if not tile_size or (width <= tile_size and height <= tile_size):
+        return [(0, 0, width, height)]
+    step = tile_size - overlap
+    boxes = []
+    for top in range(0, max(1, height - overlap), step):
+        for left in range(0, max(1, width - overlap), step):
+            boxes.append((left, top, min(width, left + tile_size), min(height, top + tile_size)))
+    return boxes
+
+
+def ocr_tile(job):
+    """
+    OCR one tile: job is (image path, crop box, backend name, lang).
+    Returns (path, box, lines in image coordinates, error message or None).
+    """
+    path, box, backend, lang = job
+    try:
+        with Image.open(path) as image:
+            lines = BACKENDS[backend](image.crop(box).convert('RGB'), lang)
+    except Exception as e:  # The backend failing (e.g. no Tesseract binary)
+        return path, box, [], str(e)
+    for line in lines:
+        line['box'] = [line['box'][0] + box[0], line['box'][1] + box[1], *line['box'][2:]]
+    return path, box, lines, None
+
+
+def _overlap_ratio(a, b):
+    # Intersection of two [left, top, width, height] boxes over the smaller one
+    width = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    height = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    return width * height / max(1, min(a[2] * a[3], b[2] * b[3]))
+
+
+def merge_lines(lines, threshold=0.5):
+    """
+    Lines of all the tiles of an image in reading order, dropping those
+    mostly covered by a longer line (read twice in overlapping tiles).
+    """
+    kept = []
+    for line in sorted(lines, key=lambda line: (-len(line['text']), line['box'][1], line['box'][0])):
+        if not any(_overlap_ratio(line['box'], other['box']) > threshold for other in kept):
+            kept.append(line)
+    return sorted(kept, key=lambda line: (line['box'][1], line['box'][0]))
+
+
+def lines_text(lines):
+    """Plain text of the lines, with a blank line at large vertical gaps."""
+    parts = []
+    previous = None
+    for line in lines:
+        if previous is not None:
+            gap = line['box'][1] - (previous['box'][1] + previous['box'][3])
+            if gap > max(line['box'][3], previous['box'][3]):
+                parts.append('')
+        parts.append(line['text'])
+        previous = line
+    return '\n'.join(parts)
@@ -0,0 +1,123 @@
+"""
+Rendered public pages (setlist, songs list, song lyrics) cached in the
+Django cache.
+
+Cache keys embed version tokens, so a change never has to find and delete
+the pages it affects: lyrics.signals bumps the 'songs' version when a song
+is saved or deleted (songs list and every song page) and a song's own
+version when one of its lines changes, import_lyrics bumps 'songs' after
+an import, and the setlist key embeds the image manifest version.
+
+Version tokens only reach other processes through a shared cache backend,
+so the songs pages' keys also embed songs_stamp(): a one-query stamp of the
+songs table (count, max id, last update), re-read at most every
+PAGE_CACHE_CHECK_INTERVAL seconds. Changes made by another process are then
+picked up within that delay even with the per-process LocMemCache.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+
+from .models import Song
+
+# Default seconds a rendered page is kept
+DEFAULT_TIMEOUT = 300
+
+# Default seconds between checks of the songs table
+DEFAULT_CHECK_INTERVAL = 2.0
+
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+_stamp = None
+_checked_at = 0.0
+
+
+def songs_stamp():
+    """
+    Short stamp of the songs table, shared by every process through the
+    database: changes whenever a song is added, saved, deleted or has its
+    lyrics rebuilt (which sets updated_at).
+    """
+    global _stamp, _checked_at
+    interval = getattr(settings, 'PAGE_CACHE_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+    if _stamp is not None and time.monotonic() - _checked_at < interval:
+        return _stamp
+    stamp = Song.objects.aggregate(count=Count('id'), max_id=Max('id'), updated=Max('updated_at'))
+    data = f"{stamp['count']}:{stamp['max_id']}:{stamp['updated']}"
+    _stamp = hashlib.sha1(data.encode('utf-8')).hexdigest()[:12]
+    _checked_at = time.monotonic()
+    return _stamp
+
+
+def _version_key(scope):
+    return f'pages:version:{scope}'
+
+
+def versions(*scopes):
+    """Current version tokens of the given scopes, created when missing."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # A random token, so an evicted version never reuses an old key
+            cache.add(key, uuid.uuid4().hex[:12], timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """Invalidate every cached page keyed on one of the scopes."""
+    global _stamp
+    cache.set_many({_version_key(scope): uuid.uuid4().hex[:12] for scope in scopes}, timeout=None)
+    _stamp = None  # Re-read the songs stamp, it changed too
+
+
+def song_scope(slug):
+    return f'song:{slug}'
+
+
+def cached_page(key_func):
+    """
+    Cache a view's successful GET responses under key_func(request, *args,
+    **kwargs), which embeds the version tokens of what the page shows (or
+    returns None to skip the cache).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            global _hits, _misses
+            timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+            key = key_func(request, *args, **kwargs) if request.method == 'GET' and timeout else None
+            if key is None:
+                return view(request, *args, **kwargs)
+
+            key = f'pages:{key}'
+            cached = cache.get(key)
+            if cached is not None:
+                with _lock:
+                    _hits += 1
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            with _lock:
+                _misses += 1
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    """Page cache hit/miss counters of this process."""
+    with _lock:
+        return {'hits': _hits, 'misses': _misses}
@@ -0,0 +1,225 @@
+"""
+Parsers turning song files into {'title': ..., 'lines': [...]} dicts.
+
+Parsers are generators over lines, so even very large song archives are read
+incrementally and never held in memory as a whole. Each parser is registered
+for one or more file extensions with @register_parser, and parse_file()
+picks the right one (it is also what import_lyrics --dir runs in its worker
+processes, so this module must not depend on Django).
+"""
+import os
+import re
+import xml.etree.ElementTree as ET
+
+# File extension (lowercase, with dot) -> parser function
+PARSERS = {}
+
+
+def register_parser(*extensions):
+    """Register a parser function for the given file extensions."""
+    def decorator(func):
+        for extension in extensions:
+            PARSERS[extension.lower()] = func
+        return func
+    return decorator
+
+
+def get_parser(path, default=None):
+    """Return the parser registered for the file's extension (or `default`)."""
+    return PARSERS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def parse_file(path):
+    """Parse a whole song file with its registered parser; return the songs."""
+    parser = get_parser(path)
+    if parser is None:
+        raise ValueError(f'No parser registered for {path}')
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return list(parser(f))
+
+
+def try_parse_file(path):
+    """
+    parse_file() for worker processes: returns (songs, None), or
+    ([], error message) when the file cannot be read or parsed.
+    """
+    try:
+        return parse_file(path), None
+    except (OSError, UnicodeDecodeError, ValueError, ET.ParseError) as e:
+        return [], f'{path}: {e}'
+
+
+def find_song_files(directory):
+    """All files under `directory` with a registered parser, in sorted order."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            if get_parser(filename):
+                paths.append(os.path.join(root, filename))
+    return paths
+
+
+@register_parser('.md')
+def iter_lyrics_md(lines):
+    """
+    Parse the lyrics.md format from an iterable of lines (e.g. an open file),
+    yielding one song at a time.
+    Songs are separated by multiple blank lines, with titles in all caps.
+    """
+    current_song = None
+    current_lines = []
+    blank_line_count = 0
+
+    for line in lines:
+        if line.endswith('\n'):
+            line = line[:-1]
+        original_line = line
+        line = line.rstrip()
+
+        # Track consecutive blank lines
+        if not line:
+            blank_line_count += 1
+            continue
+        else:
+            # If we had 2+ blank lines, we might be starting a new song
+            if blank_line_count >= 2 and current_song:
+                # Emit previous song
+                yield {
+                    'title': current_song,
+                    'lines': current_lines
+                }
+                current_song = None
+                current_lines = []
+            blank_line_count = 0
+
+        # Check if this line is a song title
+        # Titles are: all uppercase, reasonable length, no leading spaces
+        is_title = (
+            line and
+            line.isupper() and
+            len(line.split()) <= 15 and  # Reasonable title length
+            not line.startswith(' ') and
+            not line.startswith('(') and  # Not a parenthetical note
+            current_song is None  # We're not already in a song
+        )
+
+        if is_title:
+            # Start new song
+            current_song = line
+            current_lines = []
+        elif current_song:
+            # Add line to current song (even if it's empty, we'll filter later)
+            current_lines.append(original_line)
+
+    # Don't forget the last song
+    if current_song:
+        yield {
+            'title': current_song,
+            'lines': current_lines
+        }
+
+
+CHORDPRO_DIRECTIVE = re.compile(r'^\{\s*([\w-]+)\s*(?::\s*(.*?))?\s*\}$')
+CHORDPRO_CHORD = re.compile(r'\[[^\]]*\]')
+
+
+@register_parser('.cho', '.chordpro', '.chopro', '.crd')
+def iter_chordpro(lines):
+    """
+    Parse ChordPro files: {title: ...} (or {t: ...}) starts a song,
+    {new_song} separates songs, chords in [brackets] and other directives
+    are dropped.
+    """
+    title = None
+    song_lines = []
+
+    for line in lines:
+        line = line.rstrip('\n').rstrip()
+        if line.startswith('#'):
+            continue  # Comment
+        directive = CHORDPRO_DIRECTIVE.match(line.strip())
+        if directive:
+            name, value = directive.group(1).lower(), directive.group(2)
+            if name in ('title', 't') and value:
+                if title and song_lines:
+                    yield {'title': title, 'lines': song_lines}
+                    song_lines = []
+                title = value
+            elif name in ('new_song', 'ns'):
+                if title:
+                    yield {'title': title, 'lines': song_lines}
+                title = None
+                song_lines = []
+            continue
+        if title:
+            song_lines.append(CHORDPRO_CHORD.sub('', line).strip())
+
+    if title:
+        yield {'title': title, 'lines': song_lines}
+
+
+def _openlyrics_text(element):
+    """Text of an OpenLyrics <lines> element, with <br/> as line breaks."""
+    parts = [element.text or '']
+    for child in element:
+        tag = child.tag.rsplit('}', 1)[-1]
+        if tag == 'br':
+            parts.append('\n')
+        elif tag != 'comment':
+            parts.append(_openlyrics_text(child))  # <chord>, <tag>... keep text
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+@register_parser('.xml')
+def iter_openlyrics(lines):
+    """
+    Parse an OpenLyrics XML song (one song per file). Verses follow the
+    verseOrder property when present, and are separated by a blank line.
+    """
+    root = ET.fromstring(''.join(lines))
+    ns = {'ol': root.tag[1:].split('}')[0]} if root.tag.startswith('{') else {'ol': ''}
+    prefix = 'ol:' if ns['ol'] else ''
+
+    title = root.find(f'.//{prefix}titles/{prefix}title', ns)
+    if title is None or not (title.text or '').strip():
+        return
+
+    verses = {}
+    for verse in root.findall(f'.//{prefix}lyrics/{prefix}verse', ns):
+        text = '\n'.join(_openlyrics_text(el) for el in verse.findall(f'{prefix}lines', ns))
+        verses.setdefault(verse.get('name'), []).append(text)
+
+    verse_order = root.find(f'.//{prefix}verseOrder', ns)
+    if verse_order is not None and verse_order.text:
+        names = verse_order.text.split()
+    else:
+        names = list(verses)
+
+    song_lines = []
+    for name in names:
+        for text in verses.get(name, []):
+            if song_lines:
+                song_lines.append('')
+            song_lines.extend(line.strip() for line in text.split('\n'))
+
+    yield {'title': title.text.strip(), 'lines': song_lines}
+
+
+@register_parser('.txt')
+def iter_plain_text(lines):
+    """
+    Parse a plain text song (one song per file): the first non-empty line is
+    the title, the rest are the lyrics.
+    """
+    title = None
+    song_lines = []
+    for line in lines:
+        line = line.rstrip('\n').rstrip()
+        if title is None:
+            title = line.strip() or None
+        else:
+            song_lines.append(line)
+    if title:
+        yield {'title': title, 'lines': song_lines}
@@ -0,0 +1,360 @@
+"""
+Accent-insensitive full-text search over the lyric lines.
+
+Lines are indexed in normalized form (see normalize()) in an SQLite FTS5
+table, lyrics_search, created by migration 0006: its rowid is the LyricLine
+id and it holds the line text, the song title and the song id. When FTS5 is not
+available (another database, or SQLite built without it) an in-process
+inverted index is built on the first search instead.
+
+Both are kept in sync by lyrics.signals for single edits and by
+import_lyrics for bulk imports. The in-process index is also rebuilt when
+the songs table changed in another process, which is checked at most every
+SEARCH_INDEX_CHECK_INTERVAL seconds.
+"""
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.utils.html import escape
+
+from .models import LyricLine, Song
+
+FTS_TABLE = 'lyrics_search'
+
+# Letters that Unicode does not decompose into a base letter + accent,
+# notably the Ewe/Gbe alphabet
+FOLDED_LETTERS = str.maketrans({
+    'ɔ': 'o', 'Ɔ': 'o', 'ɛ': 'e', 'Ɛ': 'e', 'ŋ': 'n', 'Ŋ': 'n',
+    'ɖ': 'd', 'Ɖ': 'd', 'ƒ': 'f', 'Ƒ': 'f', 'ʋ': 'v', 'Ʋ': 'v',
+    'ɣ': 'g', 'Ɣ': 'g', 'χ': 'x', 'œ': 'oe', 'Œ': 'oe', 'æ': 'ae',
+    'Æ': 'ae', 'ß': 'ss',
+})
+
+WORD = re.compile(r'\w+')
+# A word in display text, with any combining accents (e.g. ɔ́)
+DISPLAY_WORD = re.compile(r'\w[\w\u0300-\u036f]*')
+
+# Default and maximum number of results per query
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+# Default seconds between checks of the songs table by the in-process index
+DEFAULT_CHECK_INTERVAL = 2.0
+
+# Best-ranked matching lines grouped by song per FTS query: bounds the
+# cost of very common words
+MAX_CANDIDATES = 2000
+
+
+def normalize(text):
+    """Lowercase `text` and strip its accents (é -> e, ɔ̃ -> o, ɛ -> e...)."""
+    text = unicodedata.normalize('NFKD', text.translate(FOLDED_LETTERS))
+    return ''.join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def query_terms(query):
+    """
+    Normalized words of a search query. The last word is matched as a
+    prefix (it may still be being typed), the others as whole words.
+    """
+    return WORD.findall(normalize(query))
+
+
+def word_matches(word, terms):
+    """Whether a normalized `word` matches one of the query `terms`."""
+    return word in terms[:-1] or word.startswith(terms[-1])
+
+
+def highlight(text, terms):
+    """
+    HTML-escaped `text` with the words matching one of the query `terms`
+    wrapped in <mark>.
+    """
+    text = unicodedata.normalize('NFC', text)
+    parts = []
+    position = 0
+    for word in DISPLAY_WORD.finditer(text):
+        if word_matches(normalize(word.group()), terms):
+            parts.append(escape(text[position:word.start()]))
+            parts.append(f'<mark>{escape(word.group())}</mark>')
+            position = word.end()
+    parts.append(escape(text[position:]))
+    return ''.join(parts)
+
+
+_fts_available = None
+
+
+def fts_available():
+    """Whether the lyrics_search FTS5 table exists in the database."""
+    global _fts_available
+    if _fts_available is None:
+        if connection.vendor != 'sqlite':
+            _fts_available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+                )
+                _fts_available = cursor.fetchone() is not None
+    return _fts_available
+
+
+def _line_rows(song_ids):
+    lines = LyricLine.objects.filter(song_id__in=list(song_ids))
+    return lines.values_list('id', 'song_id', 'text', 'song__title')
+
+
+def _line_ids_sql(song_ids):
+    placeholders = ', '.join(['%s'] * len(song_ids))
+    return f'SELECT id FROM lyrics_lyricline WHERE song_id IN ({placeholders})'
+
+
+def index_songs(song_ids):
+    """(Re)index all the current lines of the given songs."""
+    song_ids = list(song_ids)
+    if not song_ids:
+        return
+    if not fts_available():
+        _fallback.index_songs(song_ids)
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({_line_ids_sql(song_ids)})', song_ids)
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, title, song_id) VALUES (%s, %s, %s, %s)',
+            [
+                (line_id, normalize(text), normalize(title), song_id)
+                for line_id, song_id, text, title in _line_rows(song_ids)
+            ]
+        )
+
+
+def unindex_songs(song_ids):
+    """Drop the current lines of the given songs (call before deleting them)."""
+    song_ids = list(song_ids)
+    if not song_ids:
+        return
+    if not fts_available():
+        _fallback.unindex_songs(song_ids)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({_line_ids_sql(song_ids)})', song_ids)
+
+
+def unindex_lines(line_ids):
+    """Drop the given lyric lines from the index."""
+    line_ids = list(line_ids)
+    if not line_ids:
+        return
+    if not fts_available():
+        _fallback.unindex_lines(line_ids)
+        return
+    placeholders = ', '.join(['%s'] * len(line_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', line_ids)
+
+
+def clear_index():
+    """Empty the index."""
+    if not fts_available():
+        _fallback.clear()
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    """
+    Search the lyrics for `query` (every word in the line or the song title,
+    see query_terms()). Returns the best matching line of up to `limit` songs,
+    best first, as dicts with the song, the line and its highlighted text.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    # Both backends return the best matching line id of each song
+    if fts_available():
+        ranked = _fts_search(terms, limit)
+    else:
+        ranked = _fallback.search(terms, limit)
+
+    lines = LyricLine.objects.select_related('song').in_bulk(ranked)
+    results = []
+    for line_id in ranked:
+        line = lines.get(line_id)
+        if line is None:
+            continue
+        results.append({
+            'song': {
+                'id': line.song.id,
+                'title': line.song.title,
+                'slug': line.song.slug
+            },
+            'line': {'order': line.order, 'text': line.text},
+            'highlight': highlight(line.text, terms),
+            'title_highlight': highlight(line.song.title, terms)
+        })
+    return results
+
+
+def _fts_search(terms, limit):
+    # Terms are \w+ words, so quoting them is enough to escape FTS5 syntax
+    match = ' '.join([*(f'"{term}"' for term in terms[:-1]), f'"{terms[-1]}"*'])
+    with connection.cursor() as cursor:
+        # SQLite returns the line_id of the min() row with a bare column;
+        # the inner ORDER BY/LIMIT keeps the best-ranked candidates and also
+        # keeps the subquery from being flattened (bm25 only works directly
+        # on a MATCH query)
+        cursor.execute(
+            f'SELECT line_id, min(score) FROM ('
+            f'  SELECT rowid AS line_id, song_id, bm25({FTS_TABLE}, 1.0, 2.0, 0.0) AS score'
+            f'  FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY score LIMIT %s'
+            f') GROUP BY song_id ORDER BY min(score), line_id LIMIT %s',
+            [match, MAX_CANDIDATES, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class InvertedIndex:
+    """
+    In-process fallback index: normalized word -> line ids (and song ids for
+    title words), with a sorted vocabulary for prefix lookups. Built from the
+    database on the first search, rebuilt when the songs changed elsewhere.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.built = False
+        self.stamp = None
+        self.checked_at = 0.0
+        self.clear()
+
+    @staticmethod
+    def _db_stamp():
+        # Changes whenever a song is added, deleted or has its lines rebuilt
+        stamp = Song.objects.aggregate(count=Count('id'), max_id=Max('id'), updated=Max('updated_at'))
+        return stamp['count'], stamp['max_id'], stamp['updated']
+
+    def clear(self):
+        self.lines = {}  # line id -> (song id, normalized words)
+        self.song_lines = defaultdict(set)
+        self.song_titles = {}  # song id -> normalized title words
+        self.words = defaultdict(set)  # word -> line ids
+        self.title_words = defaultdict(set)  # word -> song ids
+        self.vocabulary = None  # Sorted words, rebuilt lazily
+
+    def _add(self, line_id, song_id, text, title):
+        words = WORD.findall(normalize(text))
+        self.lines[line_id] = (song_id, words)
+        self.song_lines[song_id].add(line_id)
+        for word in words:
+            self.words[word].add(line_id)
+        if song_id not in self.song_titles:
+            self.song_titles[song_id] = WORD.findall(normalize(title))
+            for word in self.song_titles[song_id]:
+                self.title_words[word].add(song_id)
+
+    def _remove_line(self, line_id):
+        song_id, words = self.lines.pop(line_id, (None, ()))
+        for word in words:
+            self.words[word].discard(line_id)
+        if song_id is not None:
+            self.song_lines[song_id].discard(line_id)
+
+    def _remove_song(self, song_id):
+        for line_id in list(self.song_lines.pop(song_id, ())):
+            self._remove_line(line_id)
+        for word in self.song_titles.pop(song_id, ()):
+            self.title_words[word].discard(song_id)
+
+    def _build(self):
+        self.stamp = self._db_stamp()
+        self.clear()
+        for line_id, song_id, text, title in LyricLine.objects.values_list(
+            'id', 'song_id', 'text', 'song__title'
+        ).iterator():
+            self._add(line_id, song_id, text, title)
+        self.built = True
+        self.checked_at = time.monotonic()
+
+    def _ensure_built(self):
+        if not self.built:
+            self._build()
+            return
+        interval = getattr(settings, 'SEARCH_INDEX_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        if time.monotonic() - self.checked_at >= interval:
+            if self._db_stamp() != self.stamp:
+                self._build()
+            self.checked_at = time.monotonic()
+
+    def index_songs(self, song_ids):
+        with self._lock:
+            if not self.built:
+                return  # Built from the database on the first search
+            for song_id in song_ids:
+                self._remove_song(song_id)
+            for line_id, song_id, text, title in _line_rows(song_ids):
+                self._add(line_id, song_id, text, title)
+            self.vocabulary = None
+            self.stamp = self._db_stamp()
+
+    def unindex_songs(self, song_ids):
+        with self._lock:
+            if not self.built:
+                return
+            for song_id in song_ids:
+                self._remove_song(song_id)
+            self.stamp = self._db_stamp()
+
+    def unindex_lines(self, line_ids):
+        with self._lock:
+            for line_id in line_ids:
+                self._remove_line(line_id)
+
+    def _expand(self, index, term, prefix):
+        # All ids indexed under `term`, or under a word starting with it
+        if not prefix:
+            return set(index.get(term, ()))
+        if self.vocabulary is None:
+            self.vocabulary = sorted(set(self.words) | set(self.title_words))
+        ids = set()
+        position = bisect_left(self.vocabulary, term)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(term):
+            ids.update(index.get(self.vocabulary[position], ()))
+            position += 1
+        return ids
+
+    def search(self, terms, limit):
+        with self._lock:
+            self._ensure_built()
+            matches = None
+            for position, term in enumerate(terms):
+                prefix = position == len(terms) - 1
+                line_ids = self._expand(self.words, term, prefix)
+                for song_id in self._expand(self.title_words, term, prefix):
+                    line_ids.update(self.song_lines.get(song_id, ()))
+                matches = line_ids if matches is None else matches & line_ids
+                if not matches:
+                    return []
+
+            # Words matched in the line itself first, then shorter lines;
+            # keep the best line of each song
+            best = {}
+            for line_id in matches:
+                song_id, words = self.lines[line_id]
+                in_text = sum(word_matches(word, terms) for word in words)
+                score = (-in_text, len(words), line_id)
+                if song_id not in best or score < best[song_id]:
+                    best[song_id] = score
+            return [score[2] for score in sorted(best.values())[:limit]]
+
+
+_fallback = InvertedIndex()
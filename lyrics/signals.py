@@ -0,0 +1,102 @@
+"""
+Signal handlers keeping derived song data (slide decks, search and title
+indexes, cached pages) in sync with the lyrics.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Song, LyricLine
+from . import pagecache, search, suggest
+
+_state = threading.local()
+
+
+@contextmanager
+def suspend_slide_deck_updates():
+    """
+    Skip per-line slide deck rebuilds and search indexing inside the block.
+    Bulk writers (e.g. import_lyrics) update each song once at the end instead.
+    """
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def _suspended():
+    return getattr(_state, 'suspended', False)
+
+
+class _PendingRebuilds:
+    """
+    Songs whose lines changed in the current transaction, rebuilt once each
+    when it commits: {song_id: line count changed}.
+    """
+
+    def __init__(self):
+        self.songs = {}
+
+    def __call__(self):
+        # Songs deleted in the same transaction (cascades) are gone by now
+        songs = list(Song.objects.filter(pk__in=self.songs))
+        for song in songs:
+            song.rebuild_slide_deck()
+        search.index_songs([song.pk for song in songs])
+        scopes = [pagecache.song_scope(song.slug) for song in songs]
+        # The songs list shows line counts
+        if any(self.songs[song.pk] for song in songs):
+            scopes.append('songs')
+        if scopes:
+            pagecache.bump(*scopes)
+
+
+def _schedule_rebuild(song_id, count_changed):
+    """Rebuild the song once the transaction commits (at once outside one)."""
+    connection = transaction.get_connection()
+    pending = getattr(_state, 'pending', None)
+    # A rolled-back transaction drops its callback: start a new batch then
+    if pending is None or not any(pending in entry for entry in connection.run_on_commit):
+        pending = _state.pending = _PendingRebuilds()
+        pending.songs[song_id] = count_changed
+        transaction.on_commit(pending)
+        return
+    pending.songs[song_id] = pending.songs.get(song_id, False) or count_changed
+
+
+@receiver(post_save, sender=LyricLine)
+def lyric_line_saved(sender, instance, created=False, raw=False, **kwargs):
+    """Rebuild the song's slide deck, search entries and pages when one of its lines is saved."""
+    if not raw and not _suspended():
+        _schedule_rebuild(instance.song_id, count_changed=created)
+
+
+@receiver(post_delete, sender=LyricLine)
+def lyric_line_deleted(sender, instance, **kwargs):
+    """Rebuild the song's slide deck and pages when one of its lines is deleted."""
+    if not _suspended():
+        search.unindex_lines([instance.pk])
+        _schedule_rebuild(instance.song_id, count_changed=True)
+
+
+@receiver(post_save, sender=Song)
+def song_saved(sender, instance, created=False, raw=False, **kwargs):
+    """Reindex a song's title and lines when its title may have changed."""
+    if raw:
+        return
+    suggest.index.update_song(instance)
+    pagecache.bump('songs')
+    if not created and not _suspended():
+        search.index_songs([instance.pk])
+
+
+@receiver(post_delete, sender=Song)
+def song_deleted(sender, instance, **kwargs):
+    """Drop a deleted song from the title index and cached pages."""
+    suggest.index.remove_song(instance.pk)
+    pagecache.bump('songs')
@@ -0,0 +1,64 @@
+"""
+Slide deck construction for the projector screen.
+
+A song's lyric lines are expanded into "virtual slides": long lines are split
+into several slides so they fit on the projector. The resulting deck is stored
+on the Song (see Song.slide_deck) so the live-state API never has to re-split
+lines on each poll.
+"""
+
+# Maximum number of characters shown on a single slide
+MAX_CHARS_PER_SLIDE = 80
+
+
+def split_long_line(line, max_chars=MAX_CHARS_PER_SLIDE):
+    """Split a long line into multiple parts for better display."""
+    line = line.strip()
+    if not line:
+        return [""]
+    if len(line) <= max_chars:
+        return [line]
+
+    # Try to split at natural break points (commas, spaces, etc.)
+    parts = []
+    current_part = ""
+
+    # Split by common separators first
+    segments = line.replace(',', ' ,').replace('.', ' .').replace(';', ' ;').split()
+
+    for segment in segments:
+        if len(current_part) + len(segment) + 1 <= max_chars:
+            current_part += (" " if current_part else "") + segment
+        else:
+            if current_part:
+                parts.append(current_part.strip())
+            current_part = segment
+
+    if current_part:
+        parts.append(current_part.strip())
+
+    # If still too long, force split
+    if not parts or any(len(p) > max_chars * 1.5 for p in parts):
+        parts = []
+        for i in range(0, len(line), max_chars):
+            parts.append(line[i:i+max_chars].strip())
+
+    return parts
+
+
+def build_slide_deck(texts, max_chars=MAX_CHARS_PER_SLIDE):
+    """
+    Expand lyric line texts into virtual slides.
+
+    Returns a compact list of [slide_text, original_line_index] pairs, in
+    display order. Empty lines become one empty slide.
+    """
+    deck = []
+    for line_idx, text in enumerate(texts):
+        text = text.strip()
+        if not text:
+            deck.append(["", line_idx])
+            continue
+        for part in split_long_line(text, max_chars):
+            deck.append([part, line_idx])
+    return deck
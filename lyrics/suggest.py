@@ -0,0 +1,150 @@
+"""
+In-memory prefix index of song titles for the control page typeahead.
+
+Titles and slugs are normalized like the lyrics search (see
+lyrics.search.normalize) and kept in sorted arrays, so a prefix lookup is
+a bisect plus a short scan. The index is loaded on first use, patched by
+lyrics.signals when a song is saved or deleted in this process, and
+reloaded when the songs table changed elsewhere (e.g. import_lyrics),
+which is checked at most every SONG_SUGGEST_CHECK_INTERVAL seconds.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Song
+from .search import WORD, normalize
+
+# Default seconds between checks for songs changed by other processes
+DEFAULT_CHECK_INTERVAL = 2.0
+
+# Default and maximum number of suggestions
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def title_keys(title, slug):
+    """
+    Index keys of a song: its whole title and slug first, then the title
+    from each later word on (so "mawu" finds "Kafu Mawu").
+    """
+    words = WORD.findall(normalize(title))
+    primary = {' '.join(words), ' '.join(slug.split('-'))}
+    secondary = {' '.join(words[i:]) for i in range(1, len(words))}
+    return primary, secondary - primary
+
+
+class TitleIndex:
+    """Sorted arrays of (key, order, song id), with the songs they point to."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.stamp = None
+        self.checked_at = 0.0
+        self.primary = []
+        self.secondary = []
+        self.songs = {}  # song id -> (title, slug, order)
+        self.setlist = None  # Song ids in setlist order, rebuilt lazily
+
+    @staticmethod
+    def _db_stamp():
+        # Changes whenever a song is added, saved or deleted
+        stamp = Song.objects.aggregate(count=Count('id'), max_id=Max('id'), updated=Max('updated_at'))
+        return stamp['count'], stamp['max_id'], stamp['updated']
+
+    def _load(self):
+        self.stamp = self._db_stamp()
+        self.primary, self.secondary, self.songs = [], [], {}
+        self.setlist = None
+        for song_id, title, slug, order in Song.objects.values_list('id', 'title', 'slug', 'order'):
+            primary, secondary = title_keys(title, slug)
+            self.songs[song_id] = (title, slug, order)
+            self.primary.extend((key, order, song_id) for key in primary)
+            self.secondary.extend((key, order, song_id) for key in secondary)
+        self.primary.sort()
+        self.secondary.sort()
+        self.loaded = True
+        self.checked_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if not self.loaded:
+            self._load()
+            return
+        interval = getattr(settings, 'SONG_SUGGEST_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        if time.monotonic() - self.checked_at >= interval:
+            if self._db_stamp() != self.stamp:
+                self._load()
+            self.checked_at = time.monotonic()
+
+    def _remove(self, song_id):
+        self.setlist = None
+        song = self.songs.pop(song_id, None)
+        if song is None:
+            return
+        title, slug, order = song
+        primary, secondary = title_keys(title, slug)
+        for array, keys in ((self.primary, primary), (self.secondary, secondary)):
+            for key in keys:
+                position = bisect_left(array, (key, order, song_id))
+                if position < len(array) and array[position] == (key, order, song_id):
+                    del array[position]
+
+    def update_song(self, song):
+        """Add or re-index a saved song."""
+        with self._lock:
+            if not self.loaded:
+                return  # Loaded from the database on first use
+            self._remove(song.pk)
+            primary, secondary = title_keys(song.title, song.slug)
+            self.songs[song.pk] = (song.title, song.slug, song.order)
+            for key in primary:
+                insort(self.primary, (key, song.order, song.pk))
+            for key in secondary:
+                insort(self.secondary, (key, song.order, song.pk))
+            self.stamp = self._db_stamp()
+
+    def remove_song(self, song_id):
+        """Drop a deleted song."""
+        with self._lock:
+            if not self.loaded:
+                return
+            self._remove(song_id)
+            self.stamp = self._db_stamp()
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        """
+        Songs whose title (or slug) starts with `prefix`, then songs with a
+        title word starting with it; an empty prefix lists the setlist.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            prefix = ' '.join(WORD.findall(normalize(prefix)))
+            if not prefix:
+                if self.setlist is None:
+                    self.setlist = sorted(self.songs, key=lambda song_id: (self.songs[song_id][2], song_id))
+                return [self._result(song_id) for song_id in self.setlist[:limit]]
+
+            results = []
+            seen = set()
+            for array in (self.primary, self.secondary):
+                position = bisect_left(array, (prefix,))
+                while position < len(array) and len(results) < limit:
+                    key, order, song_id = array[position]
+                    if not key.startswith(prefix):
+                        break
+                    if song_id not in seen:
+                        seen.add(song_id)
+                        results.append(self._result(song_id))
+                    position += 1
+            return results
+
+    def _result(self, song_id):
+        title, slug, order = self.songs[song_id]
+        return {'id': song_id, 'title': title, 'slug': slug, 'order': order}
+
+
+index = TitleIndex()
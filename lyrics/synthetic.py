@@ -0,0 +1,81 @@
+"""
+Synthetic song libraries for benchmarks and load tests.
+
+Songs are made of French/Ewe-like words, with a configurable share of
+accented words, and are written in the lyrics.md format (titles in capitals,
+stanzas separated by one blank line, songs by three) so import_lyrics can
+load them like the real file. throwaway_database() gives benchmarks a
+database of their own to write them to.
+"""
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.db import connections
+
+WORDS = [
+    'Seigneur', 'gloire', 'louange', 'Mawu', 'kokoé', 'alléluia', 'amour',
+    'saint', 'grâce', 'nuséto', 'bonheur', 'lumière', 'Jésus', 'roi', 'paix',
+    'cœur', 'chanter', 'éternel', 'fidèle', 'miéva', 'élevé', 'prends', 'tout',
+    'oui', 'entre', 'tes', 'mains', 'nous', 'ton', 'nom', 'célébrons', 'à',
+]
+PLAIN_WORDS = [word for word in WORDS if word.isascii()]
+ACCENTED_WORDS = [word for word in WORDS if not word.isascii()]
+
+
+def generate_songs(count, lines=(10, 30), line_length=(3, 12), accents=0.3, stanza=4, seed=42):
+    """
+    Yield `count` songs as {'title', 'lines'} dicts (the parsers' format).
+
+    `lines` and `line_length` are (min, max) line counts per song and words
+    per line; `accents` is the share of accented words; a blank line ends
+    every `stanza` lines.
+    """
+    rng = random.Random(seed)
+
+    def word():
+        return rng.choice(ACCENTED_WORDS if rng.random() < accents else PLAIN_WORDS)
+
+    for number in range(1, count + 1):
+        title = ' '.join(word() for _ in range(rng.randint(1, 4))).upper()
+        song_lines = []
+        for index in range(rng.randint(*lines)):
+            if stanza and index and index % stanza == 0:
+                song_lines.append('')
+            text = ' '.join(word() for _ in range(rng.randint(*line_length)))
+            song_lines.append(text[0].upper() + text[1:])
+        # The number keeps titles (and slugs) unique
+        yield {'title': f'{title} {number}', 'lines': song_lines}
+
+
+def write_lyrics_md(songs, f):
+    """Write songs to an open text file in the lyrics.md format."""
+    for index, song in enumerate(songs):
+        if index:
+            f.write('\n\n\n')
+        f.write(song['title'] + '\n')
+        for line in song['lines']:
+            f.write(line + '\n')
+
+
+@contextmanager
+def throwaway_database(alias='default'):
+    """
+    Point the `alias` connection at a freshly migrated temporary SQLite file
+    for the block, so benchmarks never lock or change the real database.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        raise ValueError('Benchmarks need an SQLite database')
+    saved = connection.settings_dict
+    with tempfile.TemporaryDirectory() as directory:
+        connection.close()
+        connection.settings_dict = {**saved, 'NAME': os.path.join(directory, 'benchmark.sqlite3')}
+        try:
+            call_command('migrate', database=alias, verbosity=0, interactive=False)
+            yield
+        finally:
+            connection.close()
+            connection.settings_dict = saved
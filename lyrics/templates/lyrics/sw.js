@@ -0,0 +1,101 @@
+// Service worker for offline lyrics (registered by the songs pages).
+// Keeps the songbook bundle at its content-hashed URL, refreshed when the
+// worker activates and on every songs page load; song pages are fetched
+// from the network when possible, else from the cache, else built from
+// the bundle.
+const CACHE = 'louange-echo-v1';
+const BUNDLE_URL = '{% url "api_song_bundle" %}';
+const SONGS_URL = '{% url "songs_list" %}';
+const SONG_PREFIX = '{% url "song_detail" "SLUG" %}'.replace('SLUG/', '');
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE).then(cache => cache.add(SONGS_URL))
+    );
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(Promise.all([self.clients.claim(), refreshBundle()]));
+});
+
+self.addEventListener('message', event => {
+    if (event.data === 'refresh-bundle') event.waitUntil(refreshBundle());
+});
+
+function isBundle(url) {
+    return new URL(url).pathname.startsWith(BUNDLE_URL);
+}
+
+// The unversioned URL redirects to the current hashed one; an unchanged
+// bundle comes from the HTTP cache (immutable), so this costs one redirect.
+// A new hash replaces the previous bundle.
+async function refreshBundle() {
+    try {
+        const cache = await caches.open(CACHE);
+        const response = await fetch(BUNDLE_URL, {cache: 'no-cache'});
+        if (!response.ok || !response.redirected || await cache.match(response.url)) return;
+        await cache.put(response.url, response);
+        for (const request of await cache.keys()) {
+            if (isBundle(request.url) && request.url !== response.url) await cache.delete(request);
+        }
+    } catch (error) {
+        // Offline: keep the cached bundle
+    }
+}
+
+async function cachedBundle(cache) {
+    const request = (await cache.keys()).find(request => isBundle(request.url));
+    return request ? cache.match(request) : null;
+}
+
+function escapeHtml(text) {
+    return text.replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+}
+
+async function songFromBundle(slug) {
+    const cache = await caches.open(CACHE);
+    const response = await cachedBundle(cache);
+    if (!response) return null;
+    const bundle = await response.json();
+    const song = bundle.songs.find(song => song.slug === slug);
+    if (!song) return null;
+    const lines = song.lines.map(line => `<p>${escapeHtml(line) || '&nbsp;'}</p>`).join('');
+    return new Response(
+        `<!DOCTYPE html><html lang="fr"><head><meta charset="UTF-8">` +
+        `<meta name="viewport" content="width=device-width, initial-scale=1.0">` +
+        `<title>${escapeHtml(song.title)} - Louange Echo</title>` +
+        `<style>body{font-family:system-ui,sans-serif;max-width:640px;margin:0 auto;padding:20px;line-height:1.6}` +
+        `p{margin:0 0 8px}a{color:#2563eb}</style></head><body>` +
+        `<a href="${SONGS_URL}">← Liste des Chants</a><h1>${escapeHtml(song.title)}</h1>${lines}</body></html>`,
+        {headers: {'Content-Type': 'text/html; charset=utf-8'}}
+    );
+}
+
+async function networkFirst(request) {
+    const cache = await caches.open(CACHE);
+    try {
+        const response = await fetch(request);
+        if (response.ok) cache.put(request, response.clone());
+        return response;
+    } catch (error) {
+        const cached = await cache.match(request);
+        if (cached) return cached;
+        const path = new URL(request.url).pathname;
+        if (path.startsWith(SONG_PREFIX)) {
+            const page = await songFromBundle(decodeURIComponent(path.slice(SONG_PREFIX.length).replace(/\/$/, '')));
+            if (page) return page;
+        }
+        throw error;
+    }
+}
+
+self.addEventListener('fetch', event => {
+    const url = new URL(event.request.url);
+    if (event.request.method !== 'GET' || url.origin !== self.location.origin) return;
+    if (url.pathname === SONGS_URL || url.pathname.startsWith(SONG_PREFIX)) {
+        event.respondWith(networkFirst(event.request));
+    }
+});
@@ -0,0 +1,877 @@
+"""
+Tests of the lyrics app: python manage.py test lyrics
+"""
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from lyrics import bundle, filecache, images, live, middleware, ocr, search, suggest, views
+from lyrics.management.commands import export_static, loadtest_concert
+from lyrics.models import ControlCommand, LiveState, LyricLine, Song, compute_content_hash
+from lyrics.parsers import iter_lyrics_md
+from lyrics.signals import suspend_slide_deck_updates
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def create_song(title, lines, order=1):
+    """A song with its lyric lines, slide deck and search entries (like import_lyrics)."""
+    song = Song.objects.create(title=title, order=order)
+    with suspend_slide_deck_updates():
+        for index, text in enumerate(lines):
+            LyricLine.objects.create(song=song, order=index, text=text)
+    song.rebuild_slide_deck()
+    search.index_songs([song.pk])
+    return song
+
+
+class LiveStateMixin:
+    """Start each test without the live snapshot of a previous test's database."""
+
+    def setUp(self):
+        super().setUp()
+        live._snapshot = None
+        self.addCleanup(setattr, live, '_snapshot', None)
+
+
+class OcrHelpersTests(SimpleTestCase):
+
+    def test_tile_boxes_cover_the_image(self):
+        boxes = ocr.tile_boxes(250, 120, tile_size=100, overlap=20)
+        self.assertGreater(len(boxes), 1)
+        self.assertEqual(max(box[2] for box in boxes), 250)
+        self.assertEqual(max(box[3] for box in boxes), 120)
+        self.assertTrue(all(box[2] - box[0] <= 100 and box[3] - box[1] <= 100 for box in boxes))
+
+    def test_small_image_is_one_tile(self):
+        self.assertEqual(ocr.tile_boxes(80, 60, tile_size=100, overlap=20), [(0, 0, 80, 60)])
+        self.assertEqual(ocr.tile_boxes(800, 600), [(0, 0, 800, 600)])
+
+    def test_tile_overlap_must_be_smaller_than_tiles(self):
+        for overlap in (100, 150, -1):
+            with self.assertRaises(ValueError):
+                ocr.tile_boxes(5000, 5000, tile_size=100, overlap=overlap)
+
+    def test_merge_lines_drops_lines_read_twice(self):
+        lines = [
+            {'text': 'Grand concert', 'box': [10, 10, 200, 20], 'confidence': 90},
+            {'text': 'Grand conce', 'box': [10, 10, 180, 20], 'confidence': 80},  # Cut by a tile
+            {'text': 'Entrée libre', 'box': [10, 80, 150, 20], 'confidence': 90},
+        ]
+        merged = ocr.merge_lines(lines)
+        self.assertEqual([line['text'] for line in merged], ['Grand concert', 'Entrée libre'])
+        self.assertEqual(ocr.lines_text(merged), 'Grand concert\n\nEntrée libre')
+
+
+class ImagesFolderMixin:
+    """Run each test on a temporary project folder with a 240x120 poster."""
+
+    def setUp(self):
+        super().setUp()
+        if Image is None:
+            self.skipTest('Pillow is not installed')
+        self.base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base_dir.cleanup)
+        self.static_dir = os.path.join(self.base_dir.name, 'lyrics', 'static', 'lyrics')
+        os.makedirs(os.path.join(self.static_dir, 'images'))
+        Image.new('RGB', (240, 120), 'white').save(os.path.join(self.static_dir, 'images', 'poster.png'))
+        self.program_text = {'text': 'Programme du concert', 'image_path': 'lyrics/images/poster.png'}
+        with open(os.path.join(self.static_dir, 'program_text.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.program_text, f)
+
+        settings_override = override_settings(BASE_DIR=self.base_dir.name, IMAGE_MANIFEST_CHECK_INTERVAL=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # The manifest is a per-process singleton: reload it from the test folder, and after the test
+        images.get_manifest(rebuild=True)
+        self.addCleanup(setattr, images, '_manifest', None)
+
+
+class ExtractProgramTextTests(ImagesFolderMixin, SimpleTestCase):
+    """The extract_program_text pipeline with the 'stub' backend (no Tesseract)."""
+
+    def extract(self, *args):
+        out = io.StringIO()
+        call_command('extract_program_text', '--backend', 'stub', '--workers', '1', *args, stdout=out)
+        with open(os.path.join(self.static_dir, 'program_text.stub.json'), encoding='utf-8') as f:
+            return out.getvalue(), json.load(f)
+
+    def test_stub_output_never_replaces_the_program_text(self):
+        output, data = self.extract()
+        self.assertIn('OCR: poster.png (1 tile)', output)
+        [result] = data['images']
+        self.assertEqual(result['lines'], [{'text': '[240x120]', 'box': [0, 0, 240, 120], 'confidence': None}])
+        with open(os.path.join(self.static_dir, 'program_text.json'), encoding='utf-8') as f:
+            self.assertEqual(json.load(f), self.program_text)
+
+    def test_results_are_cached_by_content_and_settings(self):
+        self.extract()
+        output, _ = self.extract()
+        self.assertIn('Cached: poster.png', output)
+
+        output, data = self.extract('--tile-size', '100', '--tile-overlap', '20')
+        self.assertIn('OCR: poster.png (', output)
+        self.assertEqual(len(data['images'][0]['lines']), len(ocr.tile_boxes(240, 120, 100, 20)))
+
+        # A different overlap gives different tiles: not a cache hit
+        output, data = self.extract('--tile-size', '100', '--tile-overlap', '40')
+        self.assertNotIn('Cached', output)
+        self.assertEqual(data['images'][0]['tile_overlap'], 40)
+
+    def test_invalid_tiling_is_refused(self):
+        out = io.StringIO()
+        call_command('extract_program_text', '--backend', 'stub', '--tile-size', '100',
+                     '--tile-overlap', '100', stdout=out)
+        self.assertIn('--tile-overlap must be', out.getvalue())
+        self.assertFalse(os.path.exists(os.path.join(self.static_dir, 'program_text.stub.json')))
+
+    def test_unreadable_image_is_skipped(self):
+        with open(os.path.join(self.static_dir, 'images', 'broken.png'), 'wb') as f:
+            f.write(b'not an image')
+        images.get_manifest(rebuild=True)
+        output, data = self.extract('--all')
+        self.assertIn('Skipped broken.png', output)
+        self.assertEqual([result['name'] for result in data['images']], ['poster.png'])
+
+
+@override_settings(LIVE_STATE_SNAPSHOT_TTL=0)
+class ControlCommandsTests(LiveStateMixin, TestCase):
+    """The /control/commands/ batch endpoint."""
+
+    def setUp(self):
+        super().setUp()
+        self.song = create_song('GLOIRE', ['Gloire à Dieu', 'Alléluia', 'Amen'])
+
+    def post(self, *commands):
+        return self.client.post(
+            reverse('control_commands'), json.dumps({'commands': list(commands)}), content_type='application/json'
+        )
+
+    def test_batch_is_applied_in_order(self):
+        response = self.post(
+            {'type': 'set_song', 'song_id': self.song.pk, 'key': 'a'},
+            {'type': 'next', 'key': 'b'},
+            {'type': 'goto', 'index': 2, 'key': 'c'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['success'] for result in response.json()['results']], [True, True, True])
+        self.assertEqual(LiveState.get_current().active_index, 2)
+
+    def test_retried_keys_are_not_applied_twice(self):
+        self.post({'type': 'set_song', 'song_id': self.song.pk, 'key': 'a'})
+        self.post({'type': 'next', 'key': 'b'})
+        response = self.post({'type': 'next', 'key': 'b'})
+        self.assertTrue(response.json()['results'][0]['replayed'])
+        self.assertEqual(LiveState.get_current().active_index, 1)
+
+    def test_invalid_commands_reject_the_batch(self):
+        self.post({'type': 'set_song', 'song_id': self.song.pk})
+        for command in [
+            {'type': 'set_song', 'song_id': 'abc'},
+            {'type': 'set_song', 'song_id': [1]},
+            {'type': 'set_song', 'song_id': True},
+            {'type': 'goto', 'index': 10 ** 30},
+            {'type': 'goto', 'index': -1},
+            {'type': 'goto', 'index': '1'},
+            {'type': 'next', 'key': 5},
+            {'type': 'next', 'key': 'k' * 101},
+            {'type': 'dance'},
+            'next',
+        ]:
+            with self.subTest(command=command):
+                response = self.post({'type': 'next', 'key': 'first'}, command)
+                self.assertEqual(response.status_code, 400)
+                # Nothing of the batch was applied
+                self.assertEqual(LiveState.get_current().active_index, 0)
+                self.assertFalse(ControlCommand.objects.exists())
+
+
+class SearchRankingTests(TestCase):
+    """The best matches are found even when many lines match the query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        filler = Song.objects.create(title='REMPLISSAGE', order=1)
+        LyricLine.objects.bulk_create([
+            LyricLine(song=filler, order=i, text=f'Ton amour est grand, ton amour est fidèle, refrain {i}')
+            for i in range(search.MAX_CANDIDATES + 100)
+        ])
+        cls.best = create_song('AMOUR AMOUR', ['Amour'], order=2)
+        search.clear_index()
+        search.index_songs([filler.pk, cls.best.pk])
+
+    def test_fts_ranks_all_matches(self):
+        if not search.fts_available():
+            self.skipTest('SQLite FTS5 is not available')
+        results = search.search('amour')
+        self.assertEqual(results[0]['song']['id'], self.best.pk)
+
+    def test_fallback_ranks_all_matches(self):
+        index = search.InvertedIndex()
+        results = index.search(search.query_terms('amour'), search.DEFAULT_LIMIT)
+        self.assertIn(self.best.lines.get().pk, results)
+
+    @override_settings(SEARCH_INDEX_CHECK_INTERVAL=0)
+    def test_fallback_sees_songs_imported_elsewhere(self):
+        index = search.InvertedIndex()
+        self.assertEqual(index.search(search.query_terms('kokoé'), search.DEFAULT_LIMIT), [])
+        # Written like another process would: no signal reaches this index
+        song = Song.objects.create(title='KOKOE', order=3)
+        line = LyricLine.objects.bulk_create([LyricLine(song=song, order=0, text='Kokoé na Mawu')])[0]
+        song.rebuild_slide_deck()
+        self.assertEqual(index.search(search.query_terms('kokoé'), search.DEFAULT_LIMIT), [line.pk])
+
+
+class ConcurrentNavigationTests(LiveStateMixin, TransactionTestCase):
+    """Parallel next/prev moves never lose a step nor leave the song."""
+
+    def move_concurrently(self, steps):
+        def move(step):
+            try:
+                return live.move(step)[1]
+            finally:
+                connection.close()  # Each thread has its own connection
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            return list(executor.map(move, steps))
+
+    def put_live(self, slide_count, index):
+        song = create_song('LONGUE', [f'Ligne {i}' for i in range(slide_count)])
+        self.assertEqual(song.slide_count, slide_count)
+        live.set_active_song(song)
+        LiveState.objects.filter(pk=1).update(active_index=index)
+        return song
+
+    def test_no_step_is_lost(self):
+        self.put_live(400, 150)
+        moved = self.move_concurrently([1, 1, -1] * 100)  # 200 next, 100 prev
+        self.assertTrue(all(moved))
+        self.assertEqual(LiveState.get_current().active_index, 250)
+
+    def test_moves_stop_at_the_last_slide(self):
+        self.put_live(10, 0)
+        moved = self.move_concurrently([1] * 200)
+        self.assertEqual(moved.count(True), 9)
+        self.assertEqual(LiveState.get_current().active_index, 9)
+
+    def test_moves_stop_at_the_first_slide(self):
+        self.put_live(10, 5)
+        moved = self.move_concurrently([-1] * 200)
+        self.assertEqual(moved.count(True), 5)
+        self.assertEqual(LiveState.get_current().active_index, 0)
+
+
+def legacy_parse_lyrics_md(content):
+    """The whole-file lyrics.md parser that iter_lyrics_md replaced (reference)."""
+    songs = []
+    current_song = None
+    current_lines = []
+    blank_line_count = 0
+    for line in content.split('\n'):
+        original_line = line
+        line = line.rstrip()
+        if not line:
+            blank_line_count += 1
+            continue
+        if blank_line_count >= 2 and current_song:
+            songs.append({'title': current_song, 'lines': current_lines})
+            current_song = None
+            current_lines = []
+        blank_line_count = 0
+        is_title = (
+            line and
+            line.isupper() and
+            len(line.split()) <= 15 and
+            not line.startswith(' ') and
+            not line.startswith('(') and
+            current_song is None
+        )
+        if is_title:
+            current_song = line
+            current_lines = []
+        elif current_song:
+            current_lines.append(original_line)
+    if current_song:
+        songs.append({'title': current_song, 'lines': current_lines})
+    return songs
+
+
+class LyricsMdParserTests(SimpleTestCase):
+    """The streaming parser gives the same songs as the old whole-file parser."""
+
+    def assertSameAsLegacy(self, path):
+        # Both read the file like import_lyrics does (universal newlines)
+        with open(path, 'r', encoding='utf-8') as f:
+            expected = legacy_parse_lyrics_md(f.read())
+        with open(path, 'r', encoding='utf-8') as f:
+            self.assertEqual(list(iter_lyrics_md(f)), expected)
+        return expected
+
+    def assertContentSameAsLegacy(self, content):
+        with tempfile.NamedTemporaryFile('wb', suffix='.md', delete=False) as f:
+            f.write(content.encode('utf-8'))
+        self.addCleanup(os.unlink, f.name)
+        return self.assertSameAsLegacy(f.name)
+
+    def test_lyrics_md(self):
+        songs = self.assertSameAsLegacy(os.path.join(settings.BASE_DIR, 'lyrics.md'))
+        self.assertTrue(songs)
+
+    def test_edge_cases(self):
+        song = 'HOLY\nKokoé kokoé, Mawu nuséto\n\nSecond couplet  \n  (bis)\n'
+        cases = {
+            'crlf': (song + '\n\n\nI SURRENDER ALL\nEntre tes mains\n').replace('\n', '\r\n'),
+            'trailing blank lines': song + '\n\n\n\n',
+            'no final newline': song + '\n\n\nI SURRENDER ALL\nEntre tes mains',
+            'two blank lines': song + '\n\nAMEN\nAmen amen',
+            'uppercase line in a song': 'HOLY\nALLÉLUIA\nAmen\n',
+            'empty': '',
+            'no title': 'Des paroles sans titre\n',
+        }
+        for name, content in cases.items():
+            with self.subTest(name):
+                self.assertContentSameAsLegacy(content)
+
+    def test_lines_are_streamed(self):
+        # Songs are yielded before the input is exhausted
+        lines = iter(['HOLY\n', 'Amen\n', '\n', '\n', 'AMEN\n', 'Alléluia\n'])
+        songs = iter_lyrics_md(lines)
+        self.assertEqual(next(songs), {'title': 'HOLY', 'lines': ['Amen']})
+        self.assertEqual(next(lines), 'Alléluia\n')
+
+
+class SongLyricsApiTests(TestCase):
+    """The content-addressed /api/song/<id>/lyrics/<version>/ URLs."""
+
+    def setUp(self):
+        self.song = create_song('GLOIRE', ['Gloire à Dieu', 'Alléluia'])
+        self.url = reverse('api_song_lyrics_version', args=[self.song.pk, self.song.lyrics_version])
+
+    def test_unversioned_url_redirects_to_the_current_version(self):
+        response = self.client.get(reverse('api_song_lyrics', args=[self.song.pk]))
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+
+    def test_versioned_url_is_immutable_and_revalidated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual([line['text'] for line in response.json()['lines']], ['Gloire à Dieu', 'Alléluia'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_version_is_checked_against_the_lines_served(self):
+        # An edit whose content hash is not stored yet (no signals)
+        LyricLine.objects.filter(song=self.song, order=1).update(text='Amen')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(response['Location'])
+        self.assertEqual([line['text'] for line in response.json()['lines']], ['Gloire à Dieu', 'Amen'])
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)  # As export_static renders
+class StaticExportPagesTests(TestCase):
+    """Exported pages do not use what a plain file server cannot serve."""
+
+    def test_exported_pages_have_no_server_features(self):
+        song = create_song('GLOIRE', ['Gloire à Dieu'])
+        server_only = [reverse('service_worker'), reverse('api_search'), '/admin/', reverse('screen')]
+        factory = RequestFactory()
+        for path in [reverse('songs_list'), reverse('song_detail', args=[song.slug]), reverse('program')]:
+            with self.subTest(path):
+                exported = export_static.render_page(factory, path).decode('utf-8')
+                for reference in server_only:
+                    self.assertNotIn(reference, exported)
+
+        # Served by Django, the pages keep them
+        served = self.client.get(reverse('songs_list')).content.decode('utf-8')
+        self.assertIn(reverse('service_worker'), served)
+        self.assertIn(reverse('api_search'), served)
+
+
+@override_settings(PAGE_CACHE_CHECK_INTERVAL=0)
+class PageCacheTests(TestCase):
+    """Cached songs pages follow edits, including those of other processes."""
+
+    def setUp(self):
+        cache.clear()
+        self.song = create_song('GLOIRE', ['Gloire à Dieu'])
+        self.url = reverse('song_detail', args=[self.song.slug])
+
+    def test_edit_in_this_process(self):
+        self.assertContains(self.client.get(self.url), 'Gloire à Dieu')
+        line = self.song.lines.get()
+        line.text = 'Alléluia'
+        with self.captureOnCommitCallbacks(execute=True):
+            line.save()
+        self.assertContains(self.client.get(self.url), 'Alléluia')
+
+    def test_edit_in_another_process(self):
+        self.assertContains(self.client.get(self.url), 'Gloire à Dieu')
+        self.assertContains(self.client.get(reverse('songs_list')), 'GLOIRE')
+        # What another process does: no signal reaches this one's page cache
+        LyricLine.objects.filter(song=self.song).update(text='Alléluia')
+        self.song.rebuild_slide_deck()
+        Song.objects.create(title='AMEN', order=2)
+        self.assertContains(self.client.get(self.url), 'Alléluia')
+        self.assertContains(self.client.get(reverse('songs_list')), 'AMEN')
+
+
+class ScreenTransportTests(LiveStateMixin, TestCase):
+    """Under WSGI the projector screen does not hold a worker per screen."""
+
+    def test_polls_under_wsgi(self):
+        response = self.client.get(reverse('screen'))
+        self.assertEqual(response.context['transport'], 'poll')
+
+    @override_settings(ASYNC_LIVE_VIEWS=True)
+    def test_streams_under_asgi(self):
+        response = self.client.get(reverse('screen'))
+        self.assertEqual(response.context['transport'], 'sse')
+
+    @override_settings(LIVE_SCREEN_TRANSPORT='long-poll')
+    def test_explicit_transport(self):
+        response = self.client.get(reverse('screen'))
+        self.assertEqual(response.context['transport'], 'long-poll')
+
+    @override_settings(LIVE_STATE_LONG_POLL_TIMEOUT=25, LIVE_STATE_SYNC_MAX_HOLD=0.2)
+    def test_sync_long_poll_is_capped(self):
+        version = live.get_snapshot().version
+        response = self.client.get(reverse('api_state'), {'since': version})
+        self.assertEqual(response.status_code, 204)
+
+
+class ImportFormatTests(TestCase):
+    """--file reads the lyrics.md format whatever the extension, unless --format is given."""
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', encoding='utf-8', delete=False) as f:
+            f.write('GLOIRE\nGloire à Dieu\n\n\n\nAMEN\nAmen amen\n')
+        self.addCleanup(os.unlink, f.name)
+        self.path = f.name
+
+    def test_txt_file_is_lyrics_md_by_default(self):
+        call_command('import_lyrics', file=self.path, no_bundle=True, stdout=io.StringIO())
+        self.assertEqual(list(Song.objects.order_by('order').values_list('title', flat=True)), ['GLOIRE', 'AMEN'])
+
+    def test_format_txt(self):
+        call_command('import_lyrics', file=self.path, format='txt', no_bundle=True, stdout=io.StringIO())
+        self.assertEqual(Song.objects.count(), 1)
+
+
+class SlideDeckSignalTests(LiveStateMixin, TestCase):
+    """Line edits rebuild each song's deck once, when the transaction commits."""
+
+    def setUp(self):
+        super().setUp()
+        self.song = create_song('GLOIRE', ['Un', 'Deux', 'Trois'])
+        live.set_active_song(self.song)
+
+    def test_one_rebuild_per_transaction(self):
+        version = LiveState.get_current().version
+        with self.captureOnCommitCallbacks(execute=True):
+            for line in self.song.lines.all():
+                line.text = line.text.upper()
+                line.save()
+            self.assertEqual(LiveState.get_current().version, version)
+        self.song.refresh_from_db()
+        self.assertEqual([text for text, index in self.song.slide_deck], ['UN', 'DEUX', 'TROIS'])
+        self.assertEqual(LiveState.get_current().version, version + 1)
+
+    def test_deleted_song_is_not_rebuilt(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.song.delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Song.objects.exists())
+
+
+@override_settings(SONG_BUNDLE_CHECK_INTERVAL=0)
+class SongBundleTests(TestCase):
+    """The offline songbook: hashed URL, one body and ETag per encoding."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(SONG_BUNDLE_DIR=directory.name))
+        bundle._bundle = None
+        self.addCleanup(setattr, bundle, '_bundle', None)
+        self.song = create_song('GLOIRE', ['Gloire à Dieu'])
+
+    def bundle_url(self):
+        response = self.client.get(reverse('api_song_bundle'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('no-cache', response['Cache-Control'])
+        return response['Location']
+
+    def test_hashed_url_per_encoding(self):
+        songbook = bundle.refresh()
+        url = self.bundle_url()
+        self.assertEqual(url, reverse('api_song_bundle_version', args=[songbook.hash]))
+
+        identity = self.client.get(url, HTTP_ACCEPT_ENCODING='identity')
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(json.loads(identity.content)['songs'][0]['lines'], ['Gloire à Dieu'])
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), identity.content)
+        self.assertNotEqual(identity['ETag'], compressed['ETag'])
+        for response in (identity, compressed):
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_outdated_hash_redirects(self):
+        response = self.client.get(reverse('api_song_bundle_version', args=['0' * 16]))
+        self.assertEqual(response.status_code, 302)
+
+    def test_stored_bundle_is_served(self):
+        songbook = bundle.refresh()
+        bundle._bundle = None
+        self.assertEqual(bundle.get_bundle(), songbook)
+
+    def test_edit_is_served_then_compressed_in_background(self):
+        first = bundle.refresh()
+        Song.objects.filter(pk=self.song.pk).update(title='GLOIRE À DIEU', updated_at=timezone.now())
+        songbook = bundle.get_bundle()
+        self.assertNotEqual(songbook.hash, first.hash)
+        for thread in threading.enumerate():
+            if thread.name == 'songbook-bundle':
+                thread.join()
+        self.assertEqual(bundle.load_bundle().hash, songbook.hash)
+        self.assertIn('gzip', bundle.get_bundle().encodings)
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Encoding negotiation, weakened ETags and the compressed bodies LRU."""
+
+    body = json.dumps({'lines': ['Gloire à Dieu'] * 50}).encode('utf-8')
+
+    def setUp(self):
+        self.cache = middleware.CompressedBodyCache()
+        self.enterContext(mock.patch.object(middleware, 'body_cache', self.cache))
+
+    def respond(self, accept_encoding, etag='"v1"', body=None, path='/api/state/'):
+        def get_response(request):
+            response = HttpResponse(body or self.body, content_type='application/json')
+            if etag:
+                response['ETag'] = etag
+            return response
+
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING=accept_encoding)
+        return middleware.CompressionMiddleware(get_response)(request)
+
+    @unittest.skipIf(middleware.brotli is None, 'brotli not installed')
+    def test_prefers_brotli(self):
+        self.assertEqual(self.respond('gzip, br')['Content-Encoding'], 'br')
+
+    def test_gzip(self):
+        response = self.respond('gzip, br;q=0' if middleware.brotli else 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['ETag'], 'W/"v1"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_identity(self):
+        response = self.respond('identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.body)
+        self.assertEqual(response['ETag'], '"v1"')
+
+    def test_same_etag_is_compressed_once(self):
+        self.respond('gzip')
+        self.respond('gzip')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_responses_without_etag_are_not_cached(self):
+        response = self.respond('gzip', etag=None)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(self.cache.stats()['bodies'], 0)
+
+    @override_settings(COMPRESSION_CACHE_BYTES=3 * middleware.ENTRY_OVERHEAD)
+    def test_lru_eviction_counts_incompressible_entries(self):
+        incompressible = os.urandom(1000)
+        for version in range(10):
+            response = self.respond('gzip', etag=f'"v{version}"', body=incompressible)
+            self.assertFalse(response.has_header('Content-Encoding'))
+        stats = self.cache.stats()
+        self.assertLessEqual(stats['bytes'], 3 * middleware.ENTRY_OVERHEAD)
+        self.assertEqual(stats['bodies'], 3)
+        # The oldest entries were evicted, the last one is a hit
+        self.respond('gzip', etag='"v9"', body=incompressible)
+        self.assertEqual(self.cache.hits, 1)
+        self.respond('gzip', etag='"v0"', body=incompressible)
+        self.assertEqual(self.cache.hits, 1)
+
+
+class LiveStateEtagTests(LiveStateMixin, TestCase):
+    """/api/state/ answers 304 until the live state moves on."""
+
+    def setUp(self):
+        super().setUp()
+        live.set_active_song(create_song('GLOIRE', ['Un', 'Deux', 'Trois']))
+
+    def test_not_modified_until_moved(self):
+        url = reverse('api_state')
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            live.move(1)
+        moved = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(moved.status_code, 200)
+        self.assertNotEqual(moved['ETag'], etag)
+        self.assertEqual(json.loads(moved.content)['index'], 1)
+
+
+@override_settings(FILE_CACHE_CHECK_INTERVAL=0)
+class FileCacheTests(SimpleTestCase):
+    """Parsed files are served from memory until their mtime or size changes."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'program_text.json')
+        self.cache = filecache.json_cache('test_program_text', views._parse_program_text, default='défaut')
+        self.addCleanup(filecache.REGISTRY.pop, 'test_program_text')
+
+    def write(self, data, mtime):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.utime(self.path, ns=(mtime, mtime))
+
+    def test_hit_then_miss_after_change(self):
+        self.write({'text': 'Un\nDeux'}, mtime=10**18)
+        self.assertEqual(self.cache.get(self.path)['lines'], ['Un', 'Deux'])
+        self.assertEqual(self.cache.get(self.path)['lines'], ['Un', 'Deux'])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        # Same size, new mtime
+        self.write({'text': 'Un\nTro'}, mtime=2 * 10**18)
+        self.assertEqual(self.cache.get(self.path)['lines'], ['Un', 'Tro'])
+        # Same mtime, new size
+        self.write({'text': 'Un\nTrois'}, mtime=2 * 10**18)
+        self.assertEqual(self.cache.get(self.path)['lines'], ['Un', 'Trois'])
+        self.assertEqual(self.cache.misses, 3)
+
+    def test_text_of_the_wrong_type_gives_the_default(self):
+        for text in (None, ['Un'], 3):
+            self.cache.invalidate()
+            self.write({'text': text}, mtime=10**18)
+            expected = {'text': None, 'lines': None} if text is None else 'défaut'
+            self.assertEqual(self.cache.get(self.path), expected)
+        self.assertEqual(self.cache.errors, 2)
+
+
+class ImageVariantsTests(ImagesFolderMixin, SimpleTestCase):
+    """build_image_variants renders again when the configured widths change."""
+
+    def build(self, widths):
+        out = io.StringIO()
+        with override_settings(IMAGE_VARIANT_WIDTHS=widths):
+            call_command('build_image_variants', '--workers', '1', stdout=out)
+        [variants] = images.read_variants().values()
+        return out.getvalue(), variants
+
+    def test_widths_change_renders_again(self):
+        self.build([100])
+        output, variants = self.build([100])
+        self.assertIn('Unchanged: poster.png', output)
+
+        output, variants = self.build([100, 200])
+        self.assertIn('Rendered: poster.png (100, 200px)', output)
+        self.assertEqual(variants['widths'], [100, 200])
+
+        output, variants = self.build([200])
+        self.assertEqual(variants['widths'], [200])
+        [output_dir] = os.listdir(images.variants_dir())
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(images.variants_dir(), output_dir))),
+            ['200.jpg', '200.webp'] if 'webp' in variants['formats'] else ['200.jpg']
+        )
+
+
+class ImageManifestTests(ImagesFolderMixin, SimpleTestCase):
+    """Image roles, and a manifest rebuilt when the images folder changes."""
+
+    def test_roles(self):
+        roles = images.assign_roles(['affiche.png', 'dsc_1.jpg', 'dsc_2.jpg', 'photo.jpg'])
+        self.assertEqual(roles, {
+            'affiche.png': ['program'],
+            'dsc_1.jpg': ['hero', 'slider'],
+            'dsc_2.jpg': ['gallery', 'slider'],
+            'photo.jpg': ['gallery', 'slider'],
+        })
+
+    def test_rebuilt_when_the_folder_changes(self):
+        self.assertEqual([image['name'] for image in images.get_manifest().images], ['poster.png'])
+        images_folder = os.path.join(self.static_dir, 'images')
+        Image.new('RGB', (60, 40), 'black').save(os.path.join(images_folder, 'dsc_1.jpg'))
+        os.utime(images_folder, ns=(10**18, 10**18))
+
+        manifest = images.get_manifest()
+        self.assertEqual(manifest.first('program')['name'], 'poster.png')
+        self.assertEqual(manifest.first('hero')['name'], 'dsc_1.jpg')
+        self.assertEqual((manifest.first('hero')['width'], manifest.first('hero')['height']), (60, 40))
+        # Saved for the other processes, without leftover temporary files
+        self.assertEqual(len(images.read_manifest()['images']), 2)
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.static_dir) if name.startswith('.')), []
+        )
+
+
+class LoadtestClientTests(SimpleTestCase):
+    """Load test responses without a JSON body are counted as errors, not fatal."""
+
+    def test_json_body(self):
+        stats = loadtest_concert.Stats()
+        client = loadtest_concert.Client('http://localhost:8000', stats, timeout=1)
+        headers = {'content-type': 'application/json'}
+        self.assertEqual(client.json('control_next', (400, headers, b'{"success": false}')), {'success': False})
+        self.assertIsNone(client.json('control_next', (200, {'content-type': 'text/html'}, b'<html>')))
+        self.assertIsNone(client.json('control_next', (200, headers, b'{"success"')))
+        # 5xx were already counted by Client.request()
+        self.assertIsNone(client.json('control_next', (500, {'content-type': 'text/html'}, b'<html>')))
+        self.assertEqual(stats.errors, {'control_next': 2})
+
+
+class ProgramDownloadTests(ImagesFolderMixin, SimpleTestCase):
+    """/programme/download/: validators, byte ranges and proxy sendfile."""
+
+    def setUp(self):
+        super().setUp()
+        with open(os.path.join(self.static_dir, 'images', 'poster.png'), 'rb') as f:
+            self.content = f.read()
+        self.url = reverse('download_program')
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file_and_not_modified(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        response, _ = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        size = len(self.content)
+        response, body = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{size}')
+        self.assertEqual(body, self.content[:10])
+
+        response, body = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response['Content-Range'], f'bytes {size - 5}-{size - 1}/{size}')
+        self.assertEqual(body, self.content[-5:])
+
+        response, _ = self.get(HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_if_range(self):
+        etag = self.get()[0]['ETag']
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, body), (206, self.content[:10]))
+        # A stale validator gets the whole (new) file
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"ancien"')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_sendfile_headers(self):
+        with override_settings(PROGRAM_DOWNLOAD_SENDFILE='x-sendfile'):
+            response, body = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.static_dir, 'images', 'poster.png'))
+        self.assertEqual(body, b'')
+
+        with override_settings(PROGRAM_DOWNLOAD_SENDFILE='x-accel-redirect'):
+            response, _ = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/images/poster.png')
+
+
+class ImportLyricsTests(TestCase):
+    """import_lyrics inserts, updates and skips songs by content hash."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'lyrics.md')
+
+    def import_songs(self, songs):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('\n\n\n'.join(f'{title}\n' + '\n'.join(lines) for title, lines in songs) + '\n')
+        out = io.StringIO()
+        call_command('import_lyrics', file=self.path, no_bundle=True, stdout=out)
+        return out.getvalue()
+
+    def test_counts_and_content_hash_skip(self):
+        output = self.import_songs([('GLOIRE', ['Gloire à Dieu']), ('AMEN', ['Amen'])])
+        self.assertIn('Imported 2 new songs, updated 0, 0 unchanged', output)
+        gloire_lines = list(LyricLine.objects.filter(song__title='GLOIRE').values_list('pk', flat=True))
+
+        output = self.import_songs([('GLOIRE', ['Gloire à Dieu']), ('AMEN', ['Amen, amen'])])
+        self.assertIn('Imported 0 new songs, updated 1, 1 unchanged', output)
+        # Unchanged lyrics are not rewritten
+        self.assertEqual(list(LyricLine.objects.filter(song__title='GLOIRE').values_list('pk', flat=True)), gloire_lines)
+        amen = Song.objects.get(title='AMEN')
+        self.assertEqual([text for text, index in amen.slide_deck], ['Amen, amen'])
+        self.assertEqual(amen.content_hash, compute_content_hash([(0, 'Amen, amen')]))
+
+        output = self.import_songs([('GLOIRE', ['Gloire à Dieu']), ('AMEN', ['Amen, amen']), ('KOKOE', ['Kokoé'])])
+        self.assertIn('Imported 1 new songs, updated 0, 2 unchanged', output)
+
+
+class SongSuggestTests(TestCase):
+    """The control page typeahead: prefix matches and a fresh title index."""
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(suggest, 'index', suggest.TitleIndex()))
+        Song.objects.create(title='KAFU MAWU', order=1)
+        Song.objects.create(title='MAWU NA', order=2)
+        Song.objects.create(title='AMEN', order=3)
+
+    def titles(self, prefix):
+        response = self.client.get(reverse('api_song_suggest'), {'prefix': prefix})
+        return [song['title'] for song in json.loads(response.content)['results']]
+
+    def test_prefix_matches(self):
+        # Titles starting with the prefix first, then titles with a word starting with it
+        self.assertEqual(self.titles('maw'), ['MAWU NA', 'KAFU MAWU'])
+        self.assertEqual(self.titles('Kafù m'), ['KAFU MAWU'])
+        self.assertEqual(self.titles('zz'), [])
+        self.assertEqual(self.titles(''), ['KAFU MAWU', 'MAWU NA', 'AMEN'])
+
+    @override_settings(SONG_SUGGEST_CHECK_INTERVAL=3600)
+    def test_song_added_in_this_process(self):
+        self.assertEqual(self.titles('ame'), ['AMEN'])
+        Song.objects.create(title='AMENOU', order=4)
+        self.assertEqual(self.titles('ame'), ['AMEN', 'AMENOU'])
+
+    @override_settings(SONG_SUGGEST_CHECK_INTERVAL=0)
+    def test_song_added_by_another_process(self):
+        self.assertEqual(self.titles('ame'), ['AMEN'])
+        # bulk_create sends no signal, like a write from another process
+        Song.objects.bulk_create([Song(title='AMENOU', slug='amenou', order=4)])
+        self.assertEqual(self.titles('ame'), ['AMEN', 'AMENOU'])
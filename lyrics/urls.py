@@ -1,9 +1,16 @@
 """
 URL configuration for lyrics app.
 """
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Live endpoints: async views under ASGI, sync views under WSGI
+if settings.ASYNC_LIVE_VIEWS:
+    from . import async_views as live_views
+else:
+    live_views = views
+
 urlpatterns = [
     # Public pages
     path('', views.setlist_view, name='setlist'),
@@ -11,17 +18,30 @@ urlpatterns = [
     path('song/<slug:slug>/', views.song_detail_view, name='song_detail'),
     path('programme/', views.program_view, name='program'),
     path('programme/download/', views.download_program_view, name='download_program'),
+    path('sw.js', views.service_worker_view, name='service_worker'),
     
     # Projection
     path('screen/', views.screen_view, name='screen'),
     
     # Control
     path('control/', views.control_view, name='control'),
-    path('control/set-song/<int:song_id>/', views.control_set_song_view, name='control_set_song'),
-    path('control/next/', views.control_next_view, name='control_next'),
-    path('control/prev/', views.control_prev_view, name='control_prev'),
+    path('control/set-song/<int:song_id>/', live_views.control_set_song_view, name='control_set_song'),
+    path('control/next/', live_views.control_next_view, name='control_next'),
+    path('control/prev/', live_views.control_prev_view, name='control_prev'),
+    path('control/commands/', views.control_commands_view, name='control_commands'),
     
     # API
-    path('api/state/', views.api_state_view, name='api_state'),
-    path('api/song/<int:song_id>/lyrics/', views.api_song_lyrics_view, name='api_song_lyrics'),
+    path('api/state/', live_views.api_state_view, name='api_state'),
+    path('api/state/stream/', live_views.api_state_stream_view, name='api_state_stream'),
+    path('api/song/<int:song_id>/lyrics/', views.api_song_lyrics_redirect_view, name='api_song_lyrics'),
+    path(
+        'api/song/<int:song_id>/lyrics/<str:lyrics_version>/',
+        views.api_song_lyrics_view,
+        name='api_song_lyrics_version'
+    ),
+    path('api/search/', views.api_search_view, name='api_search'),
+    path('api/songs/suggest/', views.api_song_suggest_view, name='api_song_suggest'),
+    path('api/songs/bundle/', views.api_song_bundle_view, name='api_song_bundle'),
+    path('api/songs/bundle/<str:bundle_hash>/', views.api_song_bundle_view, name='api_song_bundle_version'),
+    path('api/cache/stats/', views.api_cache_stats_view, name='api_cache_stats'),
 ]
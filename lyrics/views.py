@@ -2,100 +2,198 @@
 Views for the lyrics system.
 """
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, FileResponse, Http404
-from django.views.decorators.http import require_http_methods
+from django.http import HttpResponse, JsonResponse, FileResponse, StreamingHttpResponse, Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_http_methods, condition
 from django.views.decorators.csrf import csrf_exempt
-from .models import Song, LiveState
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from django.utils.http import content_disposition_header, http_date
+from .models import Song, LiveState, ControlCommand, compute_content_hash, compute_lyrics_version
+from .middleware import accepted_encodings, body_cache
+from . import bundle, filecache, images, live, pagecache, search, suggest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import quote
+import json
 import os
+import re
+import time
 
 
+# Partners/Sponsors list - names of people and organizations that supported the concert
+# Format: {'name': 'Name', 'role': 'Role/Activity'}
+PARTNERS = [
+    {
+        'name': 'MR ADIMADO KOSSI AIMÉ',
+        'role': 'Directeur ECADIF SARL U Spécialisé dans la vente de motos et pièces détachées d\'Evame et Apsonic'
+    },
+    {
+        'name': 'MR MAGLOIRE',
+        'role': 'Directeur Evame Togo'
+    },
+    {
+        'name': 'MR AFOUTOU KOMI',
+        'role': 'Directeur Commercial ECADIF SARL U'
+    },
+    {
+        'name': 'ADIMADO KODZO JOSUE',
+        'role': 'Responsable IT & Gestion des Stocks, ECADIF Sarl U · Fondateur, The Creative Branders Ltd'
+    },
+    {
+        'name': 'ADIMADO MAKAFUI',
+        'role': 'Auditeur Interne à ECADIF SARL U'
+    },
+    {
+        'name': 'AFFO CEDRIC',
+        'role': 'Auditeur à GCAS'
+    },
+    {
+        'name': 'AFOUTOU AKOUVI',
+        'role': 'Couturière'
+    },
+    {
+        'name': 'AHAMA SOKÉ',
+        'role': ''
+    },
+    {
+        'name': 'AHAMA LUCRÈCE',
+        'role': 'Couturière'
+    },
+    {
+        'name': 'KPETEMEY KOKOUVI PEDRO',
+        'role': 'Auditeur Spécialité Fiscalité Comptabilité'
+    },
+    {
+        'name': 'AMEDJODEKA ELOM',
+        'role': 'Responsable RH PAM Togo'
+    },
+    {
+        'name': 'ATIVI-GADZEZO EMMANUEL',
+        'role': 'Responsable Qualité · Directeur du cabinet SQUALITY'
+    },
+    {
+        'name': 'ADAMA OLIVIA',
+        'role': ''
+    },
+    {
+        'name': 'AGBENOWOKO KOMI',
+        'role': 'Transitaire'
+    },
+    {
+        'name': 'MALONNUI ADJOVI',
+        'role': 'Revendeuse de pagnes au grand marché'
+    },
+    {
+        'name': 'MME AMEY BODIVIANE',
+        'role': 'Responsable RH'
+    },
+    {
+        'name': 'AFOGNON BONAVENTURE',
+        'role': 'Menuisier'
+    },
+    {
+        'name': 'ADOH ÉLODIE',
+        'role': ''
+    },
+    {
+        'name': 'MR ADODOKPO DOMINIQUE',
+        'role': 'Transitaire à Lomé'
+    },
+    {
+        'name': 'MME ADODOKPO CHRISTIANE',
+        'role': 'Grande Commerçante à Lomé'
+    },
+    {
+        'name': 'SR EKOÉ SITSOFE',
+        'role': ''
+    },
+    {
+        'name': 'SR EKOÉ ESSI',
+        'role': ''
+    },
+    {
+        'name': 'MR EKOÉ AMÉLI',
+        'role': ''
+    },
+    {
+        'name': 'MR ADAMA HENOC',
+        'role': ''
+    },
+    {
+        'name': 'MR AHLIN MICHEL',
+        'role': 'Carreleur à Lomé'
+    },
+    {
+        'name': 'WOTONEGNON VICTOIRE',
+        'role': ''
+    },
+    {
+        'name': 'FR FREDDY',
+        'role': ''
+    },
+    {
+        'name': 'MME AGBASSAGBÉ DÉDÉ',
+        'role': ''
+    },
+    {
+        'name': 'MR AGBASSAGBÉ EMMANUEL',
+        'role': ''
+    },
+    {
+        'name': 'MR AKAKPO AMAH',
+        'role': ''
+    },
+    {
+        'name': 'FAMILLE LAWSON',
+        'role': ''
+    },
+    {
+        'name': 'MR AFOUTOU KOMLAN',
+        'role': 'Directeur Logistique & Transport à ECADIF SARL U'
+    },
+    {
+        'name': 'FAMILLE HOUESSOU',
+        'role': ''
+    },
+    {
+        'name': 'MANOTTI',
+        'role': ''
+    },
+    {
+        'name': 'DAVID FATCHAO',
+        'role': 'Commerçant au grand marché de Lomé'
+    },
+    {
+        'name': 'HOUESSOU CHRISTINE',
+        'role': ''
+    },
+    {
+        'name': 'ADIMADO BAYI',
+        'role': ''
+    },
+]
+
+
+def _setlist_page_key(request):
+    # The page embeds its absolute URL (QR code) and the manifest images
+    return f'setlist:{request.scheme}:{request.get_host()}:{images.get_manifest().version}'
+
+
+@pagecache.cached_page(_setlist_page_key)
 def setlist_view(request):
     """
     Home page showing the setlist (list of all songs).
     This is what the QR code should point to.
     """
-    # Optimized: Cache image detection to avoid scanning on every request
-    import os
-    from django.core.cache import cache
-    from django.conf import settings
-    
-    # Cache key for image paths
-    cache_key = 'setlist_images'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data is None:
-        # Find available images from the choir (only if not cached)
-        static_images_dir = os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'images')
-        
-        # Get all image files
-        available_images = []
-        program_image = None
-        
-        if os.path.exists(static_images_dir):
-            # Priority: look for the specific program image first
-            program_keywords = [
-                'program origina',  # Specific program image
-                'program original',
-                'whatsapp image 2026-01-02 at 11.31.38',  # Specific program image
-                'program', 'programme', 'poster', 'affiche', 
-                'ft', 'gtt', 'gsrz', 'fghft'
-            ]
-            
-            # First pass: look for specific program image or keywords
-            for filename in os.listdir(static_images_dir):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                    full_path = f'lyrics/images/{filename}'
-                    available_images.append(full_path)
-                    
-                    filename_lower = filename.lower()
-                    # Check for specific program image first
-                    if 'program origina' in filename_lower or 'program original' in filename_lower:
-                        program_image = full_path
-                    elif not program_image and 'whatsapp image 2026-01-02 at 11.31.38' in filename_lower:
-                        program_image = full_path
-                    elif not program_image and any(keyword in filename_lower for keyword in program_keywords[3:]):
-                        program_image = full_path
-            
-            # Second pass: if no program found, use first non-large image or skip size check
-            if not program_image and available_images:
-                # Skip large images (likely photos) - prefer smaller ones
-                # Just use the first image that's not obviously a photo
-                for img_path in available_images:
-                    filename = os.path.basename(img_path).lower()
-                    # Skip obvious photo filenames
-                    if not any(photo_indicator in filename for photo_indicator in ['dsc_', 'photo', 'img_']):
-                        program_image = img_path
-                        break
-                # If still no program image, just use the first one
-                if not program_image:
-                    program_image = available_images[0]
-            
-            # Cache for 1 hour (3600 seconds)
-            cached_data = {
-                'available_images': available_images,
-                'program_image': program_image
-            }
-            cache.set(cache_key, cached_data, 3600)
-        else:
-            cached_data = {'available_images': [], 'program_image': None}
-    
-    available_images = cached_data['available_images']
-    program_image = cached_data['program_image']
-    
-    # Use a different image as hero background (not the program)
-    # Include all images - lazy loading in template will handle large files
-    hero_image = None
-    for img in available_images:
-        if img != program_image:
-            hero_image = img
-            break
-    
-    # Gallery: exclude program and hero images
-    gallery_images = [img for img in available_images if img != hero_image and img != program_image][:4]
-    
-    # Slider images: exclude program image (include all others, even large ones)
-    # Lazy loading in template will handle the large files efficiently
-    slider_images = [img for img in available_images if img != program_image]
+    # Image roles come from the shared manifest, so no folder scan here;
+    # photos are served as resized variants (srcset) when they were built
+    manifest = images.get_manifest()
+    program = manifest.first('program')
+    hero = manifest.first('hero')
+    program_image = program['path'] if program else None
+    hero_image = manifest.responsive(hero) if hero else None
+    gallery_images = [manifest.responsive(image) for image in manifest.role('gallery')]
+    slider_images = [manifest.responsive(image) for image in manifest.role('slider')]
     
     # Get the full URL for QR code generation (will be done client-side)
     # QR code should point to the songs list page
@@ -104,169 +202,21 @@ def setlist_view(request):
     request_host = request.get_host()
     page_url = f"{request_scheme}://{request_host}{reverse('songs_list')}"
     
-    # Partners/Sponsors list - names of people and organizations that supported the concert
-    # Format: {'name': 'Name', 'role': 'Role/Activity'}
-    partners = [
-        {
-            'name': 'MR ADIMADO KOSSI AIMÉ',
-            'role': 'Directeur ECADIF SARL U Spécialisé dans la vente de motos et pièces détachées d\'Evame et Apsonic'
-        },
-        {
-            'name': 'MR MAGLOIRE',
-            'role': 'Directeur Evame Togo'
-        },
-        {
-            'name': 'MR AFOUTOU KOMI',
-            'role': 'Directeur Commercial ECADIF SARL U'
-        },
-        {
-            'name': 'ADIMADO KODZO JOSUE',
-            'role': 'Responsable IT & Gestion des Stocks, ECADIF Sarl U · Fondateur, The Creative Branders Ltd'
-        },
-        {
-            'name': 'ADIMADO MAKAFUI',
-            'role': 'Auditeur Interne à ECADIF SARL U'
-        },
-        {
-            'name': 'AFFO CEDRIC',
-            'role': 'Auditeur à GCAS'
-        },
-        {
-            'name': 'AFOUTOU AKOUVI',
-            'role': 'Couturière'
-        },
-        {
-            'name': 'AHAMA SOKÉ',
-            'role': ''
-        },
-        {
-            'name': 'AHAMA LUCRÈCE',
-            'role': 'Couturière'
-        },
-        {
-            'name': 'KPETEMEY KOKOUVI PEDRO',
-            'role': 'Auditeur Spécialité Fiscalité Comptabilité'
-        },
-        {
-            'name': 'AMEDJODEKA ELOM',
-            'role': 'Responsable RH PAM Togo'
-        },
-        {
-            'name': 'ATIVI-GADZEZO EMMANUEL',
-            'role': 'Responsable Qualité · Directeur du cabinet SQUALITY'
-        },
-        {
-            'name': 'ADAMA OLIVIA',
-            'role': ''
-        },
-        {
-            'name': 'AGBENOWOKO KOMI',
-            'role': 'Transitaire'
-        },
-        {
-            'name': 'MALONNUI ADJOVI',
-            'role': 'Revendeuse de pagnes au grand marché'
-        },
-        {
-            'name': 'MME AMEY BODIVIANE',
-            'role': 'Responsable RH'
-        },
-        {
-            'name': 'AFOGNON BONAVENTURE',
-            'role': 'Menuisier'
-        },
-        {
-            'name': 'ADOH ÉLODIE',
-            'role': ''
-        },
-        {
-            'name': 'MR ADODOKPO DOMINIQUE',
-            'role': 'Transitaire à Lomé'
-        },
-        {
-            'name': 'MME ADODOKPO CHRISTIANE',
-            'role': 'Grande Commerçante à Lomé'
-        },
-        {
-            'name': 'SR EKOÉ SITSOFE',
-            'role': ''
-        },
-        {
-            'name': 'SR EKOÉ ESSI',
-            'role': ''
-        },
-        {
-            'name': 'MR EKOÉ AMÉLI',
-            'role': ''
-        },
-        {
-            'name': 'MR ADAMA HENOC',
-            'role': ''
-        },
-        {
-            'name': 'MR AHLIN MICHEL',
-            'role': 'Carreleur à Lomé'
-        },
-        {
-            'name': 'WOTONEGNON VICTOIRE',
-            'role': ''
-        },
-        {
-            'name': 'FR FREDDY',
-            'role': ''
-        },
-        {
-            'name': 'MME AGBASSAGBÉ DÉDÉ',
-            'role': ''
-        },
-        {
-            'name': 'MR AGBASSAGBÉ EMMANUEL',
-            'role': ''
-        },
-        {
-            'name': 'MR AKAKPO AMAH',
-            'role': ''
-        },
-        {
-            'name': 'FAMILLE LAWSON',
-            'role': ''
-        },
-        {
-            'name': 'MR AFOUTOU KOMLAN',
-            'role': 'Directeur Logistique & Transport à ECADIF SARL U'
-        },
-        {
-            'name': 'FAMILLE HOUESSOU',
-            'role': ''
-        },
-        {
-            'name': 'MANOTTI',
-            'role': ''
-        },
-        {
-            'name': 'DAVID FATCHAO',
-            'role': 'Commerçant au grand marché de Lomé'
-        },
-        {
-            'name': 'HOUESSOU CHRISTINE',
-            'role': ''
-        },
-        {
-            'name': 'ADIMADO BAYI',
-            'role': ''
-        },
-    ]
-    
     return render(request, 'lyrics/setlist.html', {
         'hero_image': hero_image,
         'program_image': program_image,
         'gallery_images': gallery_images,
         'slider_images': slider_images,
         'page_url': page_url,
-        'partners': partners
+        'partners': PARTNERS
     })
 
 
+def _songs_list_page_key(request):
+    return f'songs:{pagecache.songs_stamp()}:' + pagecache.versions('songs')[0]
+
+
+@pagecache.cached_page(_songs_list_page_key)
 def songs_list_view(request):
     """
     Page displaying the list of all songs with links to lyrics.
@@ -277,6 +227,12 @@ def songs_list_view(request):
     })
 
 
+def _song_page_key(request, slug):
+    versions = pagecache.versions('songs', pagecache.song_scope(slug))
+    return f'song:{slug}:{pagecache.songs_stamp()}:' + ':'.join(versions)
+
+
+@pagecache.cached_page(_song_page_key)
 def song_detail_view(request, slug):
     """
     Full lyrics page for a specific song (mobile-friendly).
@@ -289,277 +245,324 @@ def song_detail_view(request, slug):
     })
 
 
+def _parse_program_text(data):
+    # Pre-split once per file version, not on every page view
+    if not isinstance(data, dict):
+        raise ValueError('program_text.json is not an object')
+    text = data.get('text') or None
+    if text is not None and not isinstance(text, str):
+        raise ValueError('program_text.json "text" is not a string')
+    return {'text': text, 'lines': text.split('\n') if text else None}
+
+
+# Parsed program_text.json (written by extract_program_text)
+program_text_cache = filecache.json_cache(
+    'program_text', _parse_program_text, default={'text': None, 'lines': None}
+)
+
+
 def program_view(request):
     """
     Display the concert program (poster/image).
     """
-    import os
-    import json
-    from django.core.cache import cache
     from django.conf import settings
-    from django.http import Http404
     
-    # Use cached image data from setlist_view
-    cache_key = 'setlist_images'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        program_image = cached_data.get('program_image')
-    else:
-        # Fallback: quick scan if cache miss
-        static_images_dir = os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'images')
-        program_image = None
-        
-        if os.path.exists(static_images_dir):
-            # Quick scan for program image
-            for filename in os.listdir(static_images_dir):
-                filename_lower = filename.lower()
-                if filename_lower.endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                    if 'program origina' in filename_lower or 'program original' in filename_lower:
-                        program_image = f'lyrics/images/{filename}'
-                        break
-                    elif 'whatsapp image 2026-01-02 at 11.31.38' in filename_lower:
-                        program_image = f'lyrics/images/{filename}'
-                        break
-    
-    program_text = None
-    
-    # Try to load extracted text
-    program_text_file = os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'program_text.json')
-    program_text_lines = None
-    if os.path.exists(program_text_file):
-        try:
-            with open(program_text_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                program_text = data.get('text', '')
-                # Split text into lines for better formatting
-                if program_text:
-                    program_text_lines = program_text.split('\n')
-        except (json.JSONDecodeError, IOError, Exception) as e:
-            # Silently fail if text file can't be read
-            program_text = None
-            program_text_lines = None
+    program = images.get_manifest().first('program')
+    program_image = program['path'] if program else None
     
     if not program_image:
         raise Http404("Programme non trouvé")
     
+    # Extracted text, from memory once loaded (see lyrics.filecache)
+    program_text = program_text_cache.get(
+        os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'program_text.json')
+    )
+    
     return render(request, 'lyrics/program.html', {
         'program_image': program_image,
-        'program_text': program_text,
-        'program_text_lines': program_text_lines
+        'program_text': program_text['text'],
+        'program_text_lines': program_text['lines']
     })
 
 
-def download_program_view(request):
+def _program_image(request):
     """
-    Download the concert program image.
+    The program image of the manifest and its os.stat(), or (None, None).
+    Resolved once per request; the one stat() also notices a program file
+    replaced in place, which rebuilds the manifest (and its hash).
     """
-    from django.conf import settings
-    
-    static_images_dir = os.path.join(settings.BASE_DIR, 'lyrics', 'static', 'lyrics', 'images')
-    program_file = None
-    
-    if os.path.exists(static_images_dir):
-        # Look for the specific program image first
-        for filename in os.listdir(static_images_dir):
-            filename_lower = filename.lower()
-            if filename_lower.endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                # Check for specific program image - priority to "Program Origina"
-                if 'program origina' in filename_lower or 'program original' in filename_lower:
-                    program_file = os.path.join(static_images_dir, filename)
-                    break
-                elif 'whatsapp image 2026-01-02 at 11.31.38' in filename_lower:
-                    program_file = os.path.join(static_images_dir, filename)
-                    break
-        
-        # If not found, try other keywords
-        if not program_file:
-            program_keywords = ['program', 'programme', 'poster', 'affiche', 'ft', 'gtt', 'gsrz', 'fghft']
-            for filename in os.listdir(static_images_dir):
-                filename_lower = filename.lower()
-                if filename_lower.endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                    if any(keyword in filename_lower for keyword in program_keywords):
-                        program_file = os.path.join(static_images_dir, filename)
-                        break
-        
-        # If still not found, use largest file
-        if not program_file:
+    if not hasattr(request, '_program_image'):
+        program, stat = images.get_manifest().first('program'), None
+        if program:
             try:
-                image_files = []
-                for filename in os.listdir(static_images_dir):
-                    if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                        img_file = os.path.join(static_images_dir, filename)
-                        if os.path.exists(img_file):
-                            size = os.path.getsize(img_file)
-                            image_files.append((size, img_file))
-                if image_files:
-                    image_files.sort(reverse=True)
-                    program_file = image_files[0][1]
-            except:
+                stat = os.stat(images.image_file(program))
+            except FileNotFoundError:
                 pass
-    
-    if not program_file or not os.path.exists(program_file):
+            if stat is None or (stat.st_size, stat.st_mtime_ns) != (program['size'], program['mtime']):
+                program, stat = images.get_manifest(rebuild=True).first('program'), None
+                if program:
+                    try:
+                        stat = os.stat(images.image_file(program))
+                    except FileNotFoundError:
+                        program = None
+        request._program_image = (program, stat)
+    return request._program_image
+
+
+def _program_etag(request):
+    program, stat = _program_image(request)
+    return f'"program-{program["hash"][:32]}"' if program else None
+
+
+def _program_last_modified(request):
+    program, stat = _program_image(request)
+    return datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc) if program else None
+
+
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _byte_range(request, size, etag, last_modified):
+    """
+    The (start, end) bytes asked by a single-range Range header, None to
+    send the whole file (no, invalid or multiple ranges, or an If-Range
+    that no longer matches), or False when the range is unsatisfiable.
+    """
+    match = BYTE_RANGE.match(request.META.get('HTTP_RANGE', '').replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range not in (etag, http_date(last_modified.timestamp())):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            return False
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length, block_size=FileResponse.block_size):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(block_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_http_methods(["GET", "HEAD"])
+@condition(etag_func=_program_etag, last_modified_func=_program_last_modified)
+def download_program_view(request):
+    """
+    Download the concert program image.
+    Unchanged files are answered with an empty 304 and byte ranges with a 206;
+    with PROGRAM_DOWNLOAD_SENDFILE the front proxy sends the file itself.
+    """
+    program, stat = _program_image(request)
+    if not program:
         raise Http404("Programme non trouvé")
     
-    # Determine content type based on file extension
-    filename = os.path.basename(program_file)
-    if filename.lower().endswith('.png'):
-        content_type = 'image/png'
-    elif filename.lower().endswith('.gif'):
-        content_type = 'image/gif'
-    else:
-        content_type = 'image/jpeg'
-    
-    response = FileResponse(
-        open(program_file, 'rb'),
-        content_type=content_type
+    from django.conf import settings
+    path = images.image_file(program)
+    size = stat.st_size
+    sendfile = getattr(settings, 'PROGRAM_DOWNLOAD_SENDFILE', '')
+    byte_range = None if sendfile else _byte_range(
+        request, size, _program_etag(request), _program_last_modified(request)
     )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    if sendfile:
+        # The proxy handles Range itself; Django only sends headers
+        response = HttpResponse(content_type=program['content_type'])
+        if sendfile == 'x-accel-redirect':
+            prefix = getattr(settings, 'PROGRAM_DOWNLOAD_ACCEL_PREFIX', '/protected/images/')
+            response['X-Accel-Redirect'] = prefix + quote(program['name'])
+        else:
+            response['X-Sendfile'] = path
+    elif byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(path, start, end - start + 1),
+            status=206,
+            content_type=program['content_type']
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        try:
+            program_file = open(path, 'rb')
+        except FileNotFoundError:
+            raise Http404("Programme non trouvé")
+        response = FileResponse(
+            program_file,
+            content_type=program['content_type']
+        )
+    
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(True, program['name'])
+    patch_cache_control(response, public=True, no_cache=True)
     return response
 
 
+SCREEN_TRANSPORTS = ('sse', 'long-poll', 'poll')
+
+
+def screen_transport():
+    """
+    How the projector screen follows the live state (LIVE_SCREEN_TRANSPORT).
+    'auto' picks SSE only under ASGI: under WSGI every open stream or
+    long-poll holds a worker thread, so screens poll instead.
+    """
+    from django.conf import settings
+
+    transport = getattr(settings, 'LIVE_SCREEN_TRANSPORT', 'auto')
+    if transport in SCREEN_TRANSPORTS:
+        return transport
+    return 'sse' if getattr(settings, 'ASYNC_LIVE_VIEWS', False) else 'poll'
+
+
 def screen_view(request):
     """
     Projector screen view - displays current lyrics in large text.
-    Auto-refreshes via polling.
+    Auto-refreshes via SSE, long-polling or polling (see screen_transport).
     """
-    return render(request, 'lyrics/screen.html')
+    return render(request, 'lyrics/screen.html', {'transport': screen_transport()})
 
 
 def control_view(request):
     """
     Controller page - allows operator to select songs and advance lyrics.
     """
-    songs = Song.objects.all()
+    # Songs are looked up as the operator types (see api_song_suggest_view)
     live_state = LiveState.get_current()
     return render(request, 'lyrics/control.html', {
-        'songs': songs,
         'live_state': live_state
     })
 
 
+def _state_etag(request):
+    if 'since' in request.GET:
+        return None  # Long-poll requests wait instead of answering 304
+    return live.get_snapshot().etag
+
+
 @require_http_methods(["GET"])
+@condition(etag_func=_state_etag)
 def api_state_view(request):
     """
     API endpoint that returns the current live state as JSON.
     Polled by the projector screen every ~800ms.
+    Served from the in-memory snapshot (see lyrics.live), not the database;
+    unchanged states are answered with an empty 304.
+
+    Long-poll mode: with ?since=<version>, blocks until the state version
+    differs from `since` (or LIVE_STATE_LONG_POLL_TIMEOUT passes, capped by
+    LIVE_STATE_SYNC_MAX_HOLD, giving an empty 204).
     """
-    live_state = LiveState.get_current()
-    
-    if not live_state.active_song:
-        return JsonResponse({
-            'active': False,
-            'song': None,
-            'index': 0,
-            'start': 0,
-            'lines': [],
-            'total': 0,
-            'updated_at': live_state.updated_at.isoformat()
-        })
-    
-    song = live_state.active_song
-    all_lines = list(song.lines.all())
-    
-    # Split long lines into multiple slides (max ~80 characters per slide)
-    MAX_CHARS_PER_SLIDE = 80
-    
-    def split_long_line(line, max_chars=MAX_CHARS_PER_SLIDE):
-        """Split a long line into multiple parts for better display."""
-        line = line.strip()
-        if not line:
-            return [""]
-        if len(line) <= max_chars:
-            return [line]
-        
-        # Try to split at natural break points (commas, spaces, etc.)
-        parts = []
-        current_part = ""
-        
-        # Split by common separators first
-        segments = line.replace(',', ' ,').replace('.', ' .').replace(';', ' ;').split()
-        
-        for segment in segments:
-            if len(current_part) + len(segment) + 1 <= max_chars:
-                current_part += (" " if current_part else "") + segment
-            else:
-                if current_part:
-                    parts.append(current_part.strip())
-                current_part = segment
-        
-        if current_part:
-            parts.append(current_part.strip())
-        
-        # If still too long, force split
-        if not parts or any(len(p) > max_chars * 1.5 for p in parts):
-            parts = []
-            for i in range(0, len(line), max_chars):
-                parts.append(line[i:i+max_chars].strip())
-        
-        return parts
-    
-    # Expand all lines into virtual slides (long lines become multiple slides)
-    virtual_slides = []
-    line_to_slide_mapping = {}  # Maps virtual slide index to original line index
-    
-    for line_idx, line_obj in enumerate(all_lines):
-        line_text = line_obj.text.strip()
-        if not line_text:
-            # Empty line becomes one empty slide
-            virtual_slides.append("")
-            line_to_slide_mapping[len(virtual_slides) - 1] = line_idx
-        else:
-            # Split long lines into multiple slides
-            parts = split_long_line(line_text, MAX_CHARS_PER_SLIDE)
-            for part in parts:
-                virtual_slides.append(part)
-                line_to_slide_mapping[len(virtual_slides) - 1] = line_idx
-    
-    total_virtual_slides = len(virtual_slides)
-    total_original_lines = len(all_lines)
-    
-    # Use the active_index as the virtual slide index
-    current_virtual_index = live_state.active_index
-    
-    # Ensure index is within bounds
-    if current_virtual_index < 0:
-        current_virtual_index = 0
-    if current_virtual_index >= total_virtual_slides:
-        current_virtual_index = max(0, total_virtual_slides - 1)
-    
-    # Get the current slide
-    current_slide = virtual_slides[current_virtual_index] if current_virtual_index < total_virtual_slides else ""
-    
-    # Get the next slide if available (for preview)
-    next_slide = ""
-    if current_virtual_index + 1 < total_virtual_slides:
-        next_slide = virtual_slides[current_virtual_index + 1]
-    
-    # Build window lines
-    window_lines = []
-    if current_slide.strip():
-        window_lines.append(current_slide)
-    if next_slide.strip():
-        window_lines.append(next_slide)
-    
-    # Find which original line this virtual slide belongs to
-    original_line_index = line_to_slide_mapping.get(current_virtual_index, 0)
-    
-    current_line_index_in_window = 0
-    
-    return JsonResponse({
-        'active': True,
-        'song': {
-            'title': song.title,
-            'slug': song.slug
-        },
-        'index': current_virtual_index,  # Virtual slide index
-        'original_line_index': original_line_index,  # Original line index
-        'lines': window_lines,
-        'current_line_index': current_line_index_in_window,
-        'total': total_virtual_slides,  # Total virtual slides
-        'total_original_lines': total_original_lines,  # Total original lines
-        'updated_at': live_state.updated_at.isoformat()
-    })
+    from django.conf import settings
+
+    since = request.GET.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Paramètre since invalide'}, status=400)
+        timeout = sync_hold(getattr(settings, 'LIVE_STATE_LONG_POLL_TIMEOUT', 25))
+        snapshot = live.wait_for_change(since, timeout)
+    else:
+        snapshot = live.get_snapshot()
+    return state_response(snapshot)
+
+
+def sync_hold(seconds):
+    """Cap how long a sync view holds its worker thread (LIVE_STATE_SYNC_MAX_HOLD)."""
+    from django.conf import settings
+
+    return min(seconds, getattr(settings, 'LIVE_STATE_SYNC_MAX_HOLD', 10))
+
+
+def state_response(snapshot):
+    """
+    Response for a live-state snapshot: the pre-serialized body with its
+    ETag, or an empty 204 when a long-poll timed out (snapshot is None).
+    """
+    if snapshot is None:
+        response = HttpResponse(status=204)
+    else:
+        response = HttpResponse(snapshot.body, content_type='application/json')
+        response['ETag'] = snapshot.etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def state_event(snapshot):
+    """Format a live-state snapshot as a Server-Sent Event."""
+    return f'id: {snapshot.version}\nevent: state\ndata: {snapshot.body.decode("utf-8")}\n\n'
+
+
+def stream_response(events):
+    """Wrap an (async) iterator of Server-Sent Events in a streaming response."""
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+
+def last_event_version(request):
+    """Version the SSE client already has (Last-Event-ID), or None."""
+    last_event_id = request.headers.get('Last-Event-ID', request.GET.get('last_event_id'))
+    try:
+        return int(last_event_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _state_events(last_version):
+    """
+    Yield Server-Sent Events for the live state: one `state` event per new
+    version, heartbeat comments while idle. The stream ends after
+    LIVE_STATE_STREAM_MAX_AGE seconds (at most LIVE_STATE_SYNC_MAX_HOLD) to
+    free the worker; EventSource then reconnects with Last-Event-ID.
+    """
+    from django.conf import settings
+
+    heartbeat = getattr(settings, 'LIVE_STATE_STREAM_HEARTBEAT', 15)
+    max_age = sync_hold(getattr(settings, 'LIVE_STATE_STREAM_MAX_AGE', 300))
+    deadline = time.monotonic() + max_age
+
+    yield 'retry: 1000\n\n'
+    while time.monotonic() < deadline:
+        timeout = min(heartbeat, max(0, deadline - time.monotonic()))
+        snapshot = live.wait_for_change(last_version, timeout)
+        if snapshot is None:
+            yield ': heartbeat\n\n'
+            continue
+        last_version = snapshot.version
+        yield state_event(snapshot)
+
+
+@require_http_methods(["GET"])
+def api_state_stream_view(request):
+    """
+    Server-Sent Events stream of the live state (used by the projector screen).
+    Pushes an event only when the state changes; resumes from Last-Event-ID.
+    """
+    # Without Last-Event-ID the current state is sent straight away
+    return stream_response(_state_events(last_event_version(request)))
 
 
 @require_http_methods(["POST"])
@@ -569,66 +572,288 @@ def control_set_song_view(request, song_id):
     Set the active song and reset index to 0.
     """
     song = get_object_or_404(Song, pk=song_id)
-    live_state = LiveState.get_current()
-    live_state.active_song = song
-    live_state.active_index = 0
-    live_state.save()
+    live.set_active_song(song)
     
     return JsonResponse({'success': True, 'message': f'Chant "{song.title}" mis en direct'})
 
 
+def navigation_response(live_state, moved, edge_message):
+    """JSON response shared by the next/previous control endpoints."""
+    if live_state is None:
+        return JsonResponse({'success': False, 'message': 'Aucun chant actif'}, status=400)
+    if moved:
+        return JsonResponse({'success': True, 'index': live_state.active_index})
+    return JsonResponse({'success': False, 'message': edge_message})
+
+
 @require_http_methods(["POST"])
 @csrf_exempt
 def control_next_view(request):
     """
     Advance to the next line.
     """
-    live_state = LiveState.get_current()
-    
-    if not live_state.active_song:
-        return JsonResponse({'success': False, 'message': 'Aucun chant actif'}, status=400)
-    
-    # Calculate total virtual slides (with long lines split)
-    all_lines = list(live_state.active_song.lines.all())
-    MAX_CHARS_PER_SLIDE = 80
-    
-    def count_slides(line_text):
-        """Count how many virtual slides a line will create."""
-        line_text = line_text.strip()
-        if not line_text:
-            return 1
-        if len(line_text) <= MAX_CHARS_PER_SLIDE:
-            return 1
-        # Estimate: divide by max chars
-        return max(1, (len(line_text) + MAX_CHARS_PER_SLIDE - 1) // MAX_CHARS_PER_SLIDE)
-    
-    total_virtual_slides = sum(count_slides(line.text) for line in all_lines)
-    
-    if live_state.active_index < total_virtual_slides - 1:
-        live_state.active_index += 1
-        live_state.save()
-        return JsonResponse({'success': True, 'index': live_state.active_index})
-    
-    return JsonResponse({'success': False, 'message': 'Déjà à la dernière ligne'})
+    live_state, moved = live.move(1)
+    return navigation_response(live_state, moved, 'Déjà à la dernière ligne')
+
+
+class InvalidCommand(Exception):
+    """A malformed command in a /control/commands/ batch."""
+
+
+# Largest song id / slide index accepted in a command (fits the database integers)
+MAX_COMMAND_INT = 2 ** 31 - 1
+
+EDGE_MESSAGES = {
+    'next': 'Déjà à la dernière ligne',
+    'prev': 'Déjà à la première ligne',
+    'goto': 'Slide hors limites',
+}
+
+
+def _apply_command(command):
+    """Apply one command of a batch and return its result."""
+    kind = command.get('type')
+    if kind == 'set_song':
+        song_id = command.get('song_id')
+        if not isinstance(song_id, int) or isinstance(song_id, bool) or not 0 < song_id <= MAX_COMMAND_INT:
+            raise InvalidCommand('Identifiant de chant invalide')
+        song = Song.objects.filter(pk=song_id).first()
+        if song is None:
+            raise InvalidCommand('Chant non trouvé')
+        live.set_active_song(song)
+        return {'success': True, 'index': 0, 'message': f'Chant "{song.title}" mis en direct'}
+
+    if kind in ('next', 'prev'):
+        live_state, moved = live.move(1 if kind == 'next' else -1)
+    elif kind == 'goto':
+        index = command.get('index')
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index <= MAX_COMMAND_INT:
+            raise InvalidCommand('Index de slide invalide')
+        live_state, moved = live.goto(index)
+    else:
+        raise InvalidCommand(f'Commande inconnue : {kind}')
+
+    if live_state is None:
+        return {'success': False, 'message': 'Aucun chant actif'}
+    result = {'success': moved, 'index': live_state.active_index}
+    if not moved:
+        result['message'] = EDGE_MESSAGES[kind]
+    return result
+
+
+def _apply_commands(commands):
+    from django.conf import settings
+
+    key_ttl = getattr(settings, 'CONTROL_COMMAND_KEY_TTL', 86400)
+    results = []
+    with transaction.atomic():
+        ControlCommand.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=key_ttl)).delete()
+        for command in commands:
+            if not isinstance(command, dict):
+                raise InvalidCommand('Commande invalide')
+            key = command.get('key')
+            if key is not None and (
+                not isinstance(key, str) or len(key) > ControlCommand._meta.get_field('key').max_length
+            ):
+                raise InvalidCommand('Clé de commande invalide')
+            if key:
+                applied = ControlCommand.objects.filter(key=key).first()
+                if applied:
+                    results.append({**applied.result, 'replayed': True})
+                    continue
+            result = {'type': command.get('type'), 'key': key, **_apply_command(command)}
+            if key:
+                ControlCommand.objects.create(key=key, result=result)
+            results.append(result)
+    return results
+
+
+@require_http_methods(["POST"])
+@csrf_exempt
+def control_commands_view(request):
+    """
+    Apply an ordered batch of operator commands in one transaction and
+    return the resulting live state, so each gesture is one round trip.
+
+    Body: {"commands": [{"type": "set_song", "song_id": 3, "key": "..."},
+                        {"type": "next" | "prev", "key": "..."},
+                        {"type": "goto", "index": 5, "key": "..."}]}
+
+    Commands carrying an idempotency key that was already applied are not
+    applied again (their stored result is returned), so retries are safe.
+    """
+    try:
+        commands = json.loads(request.body)['commands']
+        if not isinstance(commands, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'message': 'Requête invalide'}, status=400)
+
+    try:
+        try:
+            results = _apply_commands(commands)
+        except IntegrityError:
+            # A concurrent retry stored the same key first: replay the batch
+            results = _apply_commands(commands)
+    except InvalidCommand as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'state': live.get_snapshot().payload
+    })
 
 
 @require_http_methods(["GET"])
-def api_song_lyrics_view(request, song_id):
+def api_search_view(request):
     """
-    API endpoint that returns all lyrics lines for a song.
+    Accent-insensitive lyrics search: /api/search/?q=...&limit=...
+    Returns the best matching line of each song, best first, highlighted.
     """
-    song = get_object_or_404(Song, pk=song_id)
-    lines = song.lines.all()
-    
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', search.DEFAULT_LIMIT))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Paramètre limit invalide'}, status=400)
+    limit = max(1, min(limit, search.MAX_LIMIT))
+
+    results = search.search(query, limit)
     return JsonResponse({
+        'success': True,
+        'query': query,
+        'results': results,
+        'count': len(results)
+    })
+
+
+@require_http_methods(["GET"])
+def api_song_suggest_view(request):
+    """
+    Song title typeahead for the control page: /api/songs/suggest/?prefix=...
+    Served from the in-memory title index (lyrics.suggest).
+    """
+    try:
+        limit = int(request.GET.get('limit', suggest.DEFAULT_LIMIT))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Paramètre limit invalide'}, status=400)
+    limit = max(1, min(limit, suggest.MAX_LIMIT))
+
+    prefix = request.GET.get('prefix', '')
+    return JsonResponse({
+        'success': True,
+        'prefix': prefix,
+        'results': suggest.index.suggest(prefix, limit)
+    })
+
+
+@require_http_methods(["GET"])
+def api_cache_stats_view(request):
+    """
+    API endpoint with the hit/miss counters of the in-memory file caches,
+    the page cache and the compressed bodies cache, for monitoring.
+    """
+    response = JsonResponse({
+        'success': True,
+        'caches': filecache.stats(),
+        'pages': pagecache.stats(),
+        'compression': body_cache.stats()
+    })
+    patch_cache_control(response, no_store=True)
+    return response
+
+
+@require_http_methods(["GET"])
+def api_song_bundle_view(request, bundle_hash=None):
+    """
+    API endpoint with every song and its lines in one JSON document, for
+    offline use. /api/songs/bundle/ redirects to the current
+    /api/songs/bundle/<hash>/, which never changes and is cached forever;
+    it is sent brotli- or gzip-compressed, as precomputed by lyrics.bundle.
+    """
+    songbook = bundle.get_bundle()
+    if bundle_hash != songbook.hash:
+        response = redirect('api_song_bundle_version', bundle_hash=songbook.hash)
+        patch_cache_control(response, no_cache=True)
+        return response
+    
+    accepted = accepted_encodings(request)
+    encoding = next((name for name in ('br', 'gzip') if name in songbook.encodings and name in accepted), None)
+    response = HttpResponse(
+        songbook.encodings[encoding] if encoding else songbook.body,
+        content_type='application/json'
+    )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    # One strong validator per representation
+    response['ETag'] = f'"bundle-{songbook.hash}-{encoding or "identity"}"'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, max_age=31536000, immutable=True)
+    return response
+
+
+def service_worker_view(request):
+    """
+    Service worker keeping the songbook available offline. Served from the
+    site root so that it can handle the song pages.
+    """
+    response = render(request, 'lyrics/sw.js', content_type='application/javascript')
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _song_lyrics_redirect(song):
+    response = redirect('api_song_lyrics_version', song_id=song.pk, lyrics_version=song.lyrics_version)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_http_methods(["GET"])
+def api_song_lyrics_redirect_view(request, song_id):
+    """
+    Redirect to the current content-addressed lyrics URL of a song.
+    """
+    song = get_object_or_404(Song.objects.only('content_hash', 'title', 'slug'), pk=song_id)
+    return _song_lyrics_redirect(song)
+
+
+def _song_lyrics_etag(request, song_id, lyrics_version):
+    # The content at a versioned URL never changes: no query needed
+    return f'"lyrics-{song_id}-{lyrics_version}"'
+
+
+@require_http_methods(["GET"])
+@condition(etag_func=_song_lyrics_etag)
+def api_song_lyrics_view(request, song_id, lyrics_version):
+    """
+    API endpoint that returns all lyrics lines for a song.
+    The URL carries the song's lyrics_version, so the response never changes
+    and is cached forever; an outdated version redirects to the current one.
+    Cached copies are revalidated with an empty 304.
+    """
+    # The version is computed from the lines actually served, read together
+    # with the song, so an edit in between is never cached under an old URL
+    with transaction.atomic():
+        song = get_object_or_404(Song.objects.only('title', 'slug'), pk=song_id)
+        lines = list(song.lines.order_by('order').values_list('order', 'text'))
+    current_version = compute_lyrics_version(compute_content_hash(lines), song.title, song.slug)
+    if lyrics_version != current_version:
+        response = redirect('api_song_lyrics_version', song_id=song.pk, lyrics_version=current_version)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    response = JsonResponse({
         'song': {
             'id': song.id,
             'title': song.title,
             'slug': song.slug
         },
-        'lines': [{'order': line.order, 'text': line.text} for line in lines],
-        'total': lines.count()
+        'version': current_version,
+        'lines': [{'order': order, 'text': text} for order, text in lines],
+        'total': len(lines)
     })
+    patch_cache_control(response, public=True, max_age=31536000, immutable=True)
+    return response
 
 
 @require_http_methods(["POST"])
@@ -637,14 +862,5 @@ def control_prev_view(request):
     """
     Go back to the previous slide (virtual slide, so long lines are split).
     """
-    live_state = LiveState.get_current()
-    
-    if not live_state.active_song:
-        return JsonResponse({'success': False, 'message': 'Aucun chant actif'}, status=400)
-    
-    if live_state.active_index > 0:
-        live_state.active_index -= 1
-        live_state.save()
-        return JsonResponse({'success': True, 'index': live_state.active_index})
-    
-    return JsonResponse({'success': False, 'message': 'Déjà à la première ligne'})
+    live_state, moved = live.move(-1)
+    return navigation_response(live_state, moved, 'Déjà à la première ligne')